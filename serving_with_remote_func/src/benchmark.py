@@ -0,0 +1,399 @@
+"""
+Benchmarks of the NY taxi feature pipeline (`data_prep.py`) and the serving steps (`serving.py`).
+
+Each benchmark runs on synthetic NY taxi data of the given sizes, and reports its best time, throughput (rows per
+second), peak RSS during the run and peak Python / NumPy allocations (traced by `tracemalloc`). The results can be saved
+as a baseline file and later runs compared against it, failing on regressions larger than the threshold. Everything runs
+offline, the peak RSS is read from `/proc` (Linux).
+
+For example:
+    python benchmark.py --rows 1000 100000 --save-baseline baseline.json
+    python benchmark.py --rows 1000 100000 --baseline baseline.json --threshold 0.2
+"""
+
+from typing import Callable, Dict, List
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data_prep
+import serving
+
+# The maximum amount of events to run through the per event serving benchmarks (they run in a Python loop)
+MAX_SERVING_EVENTS = 10_000
+
+
+def make_taxi_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Generate a synthetic NY taxi dataset frame, in the layout of the original dataset
+
+    About 1% of the rows have a zero coordinate and 1% a missing one, to be cleaned. The timestamps are drawn from a
+    pool of up to a million unique values, as in the real data timestamps repeat heavily.
+
+    :param rows: the amount of rows
+    :param seed: the random seed
+
+    :return the dataset dataframe
+    """
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 6 * 365 * 86400, min(rows, 1_000_000))
+    timestamps = (
+        pd.Timestamp("2009-01-01") + pd.to_timedelta(seconds, unit="s")
+    ).strftime(data_prep.DATETIME_FORMAT)
+    pickup_datetime = np.asarray(timestamps, dtype=object)[
+        rng.integers(0, len(timestamps), rows)
+    ]
+    df = pd.DataFrame(
+        {
+            "key": pickup_datetime,
+            "fare_amount": rng.uniform(-5, 80, rows).round(2),
+            "pickup_datetime": pickup_datetime,
+            "pickup_longitude": rng.uniform(-74.3, -73.7, rows),
+            "pickup_latitude": rng.uniform(40.5, 41.0, rows),
+            "dropoff_longitude": rng.uniform(-74.3, -73.7, rows),
+            "dropoff_latitude": rng.uniform(40.5, 41.0, rows),
+            "passenger_count": rng.integers(0, 7, rows),
+        }
+    )
+    df.loc[rng.random(rows) < 0.01, "pickup_longitude"] = 0
+    df.loc[rng.random(rows) < 0.01, "dropoff_latitude"] = np.nan
+    return df
+
+
+def make_events(df: pd.DataFrame) -> List[Dict]:
+    """Convert the dataset rows to serving events (the request bodies of the serving graph)
+
+    :param df: the dataset dataframe
+
+    :return the events
+    """
+    df = data_prep.clean_df(df, dropna=True).head(MAX_SERVING_EVENTS)
+    events = df.drop(columns=["fare_amount"]).to_dict("records")
+    for event in events:
+        event["passenger_count"] = int(event["passenger_count"])
+    return events
+
+
+def add_datetime_parts(event: Dict) -> Dict:
+    """The per event datetime parts of the serving graph (the graph uses MLRun's `DateExtractor`)"""
+    timestamp = pd.Timestamp(event["pickup_datetime"].replace(" UTC", ""))
+    event["pickup_datetime_hour"] = timestamp.hour
+    event["pickup_datetime_day"] = timestamp.day
+    event["pickup_datetime_month"] = timestamp.month
+    event["pickup_datetime_day_of_week"] = timestamp.dayofweek
+    event["pickup_datetime_year"] = timestamp.year
+    return event
+
+
+def serving_pipeline(event: Dict) -> Dict:
+    """Run an event through the serving graph steps, with the model's response faked"""
+    event = serving.sphere_dist_step(
+        serving.sphere_dist_bear_step(
+            serving.radian_conv_step(serving.add_airport_dist(event))
+        )
+    )
+    body = serving.preprocess(add_datetime_parts(event))
+    return serving.postprocess({"outputs": [float(len(body["inputs"][0]))]})
+
+
+def get_benchmarks() -> Dict[str, Dict]:
+    """Get the benchmarks, by their name
+
+    Each benchmark has a "setup" function, preparing the arguments of a run from the dataset frame and the events (not
+    timed), a "run" function, running on the prepared arguments (timed), and an "items" function counting the rows
+    processed by a run.
+    """
+    frame_items = lambda df, events: len(df)
+    events_items = lambda df, events: len(events)
+    copy_frame = lambda df, events: df.copy()
+    clean_frame = lambda df, events: data_prep.clean_df(df, dropna=True)
+    prepared_frame = lambda df, events: data_prep.prepare_features(df).drop(
+        columns=["key", "pickup_datetime"]
+    )
+    copy_events = lambda df, events: [dict(event) for event in events]
+
+    def per_event(step: Callable) -> Callable:
+        return lambda events: [step(event) for event in events]
+
+    def events_after(*steps: Callable) -> Callable:
+        def setup(df, events):
+            events = copy_events(df, events)
+            for step in steps:
+                events = [step(event) for event in events]
+            return events
+
+        return setup
+
+    geo_steps = [
+        serving.add_airport_dist,
+        serving.radian_conv_step,
+        serving.sphere_dist_bear_step,
+        serving.sphere_dist_step,
+    ]
+    return {
+        # The data preparation steps:
+        "data_prep.clean_df": dict(
+            setup=copy_frame,
+            run=lambda df: data_prep.clean_df(df, dropna=True),
+            items=frame_items,
+        ),
+        "data_prep.geo_features_step": dict(
+            setup=clean_frame, run=data_prep.geo_features_step, items=frame_items
+        ),
+        "data_prep.add_datetime_info": dict(
+            setup=clean_frame, run=data_prep.add_datetime_info, items=frame_items
+        ),
+        "data_prep.downcast_features": dict(
+            setup=prepared_frame, run=data_prep.downcast_features, items=frame_items
+        ),
+        "data_prep.prepare_features": dict(
+            setup=copy_frame, run=data_prep.prepare_features, items=frame_items
+        ),
+        "data_prep.data_preparation": dict(
+            setup=copy_frame, run=data_prep.data_preparation, items=frame_items
+        ),
+        # The serving steps, per event:
+        "serving.add_airport_dist": dict(
+            setup=events_after(), run=per_event(geo_steps[0]), items=events_items
+        ),
+        "serving.radian_conv_step": dict(
+            setup=events_after(*geo_steps[:1]),
+            run=per_event(geo_steps[1]),
+            items=events_items,
+        ),
+        "serving.sphere_dist_bear_step": dict(
+            setup=events_after(*geo_steps[:2]),
+            run=per_event(geo_steps[2]),
+            items=events_items,
+        ),
+        "serving.sphere_dist_step": dict(
+            setup=events_after(*geo_steps[:3]),
+            run=per_event(geo_steps[3]),
+            items=events_items,
+        ),
+        "serving.preprocess": dict(
+            setup=events_after(*geo_steps, add_datetime_parts),
+            run=per_event(serving.preprocess),
+            items=events_items,
+        ),
+        "serving.postprocess": dict(
+            setup=lambda df, events: [{"outputs": [12.5]} for _ in events],
+            run=per_event(serving.postprocess),
+            items=events_items,
+        ),
+        "serving.pipeline": dict(
+            setup=copy_events, run=per_event(serving_pipeline), items=events_items
+        ),
+        # The serving steps, on a batch of events (see `serving.MicroBatchPredict`):
+        "serving.batch_preprocess": dict(
+            setup=copy_events, run=serving.batch_preprocess, items=events_items
+        ),
+    }
+
+
+def measure(
+    benchmark: Dict, df: pd.DataFrame, events: List[Dict], repeats: int
+) -> Dict:
+    """Measure a benchmark
+
+    :param benchmark: the benchmark (see `get_benchmarks`)
+    :param df: the dataset dataframe
+    :param events: the serving events
+    :param repeats: the amount of timed runs
+
+    :return the measurements: the amount of items, the best and median seconds, the throughput (items per second), the
+            peak RSS in MB during a run and the peak traced allocations in MB of a run
+    """
+    items = benchmark["items"](df, events)
+
+    # Time the runs (the setup is not timed):
+    durations = []
+    for _ in range(repeats):
+        arguments = benchmark["setup"](df, events)
+        start = time.perf_counter()
+        benchmark["run"](arguments)
+        durations.append(time.perf_counter() - start)
+
+    # Measure the peak RSS of a run:
+    arguments = benchmark["setup"](df, events)
+    _reset_peak_rss()
+    benchmark["run"](arguments)
+    peak_rss = _get_peak_rss()
+
+    # Measure the peak allocations of a run (separately, as tracing slows the run down):
+    arguments = benchmark["setup"](df, events)
+    tracemalloc.start()
+    benchmark["run"](arguments)
+    _, peak_allocations = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(durations)
+    return {
+        "items": items,
+        "best_seconds": best,
+        "median_seconds": float(np.median(durations)),
+        "throughput": items / best if best > 0 else float("inf"),
+        "peak_rss_mb": peak_rss / 1024**2 if peak_rss is not None else None,
+        "peak_allocations_mb": peak_allocations / 1024**2,
+    }
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float
+) -> List[str]:
+    """Compare results to a baseline
+
+    A regression is a throughput lower by more than the threshold, or peak allocations higher by more than the
+    threshold, than the baseline's.
+
+    :param results: the results, by benchmark and size
+    :param baseline: the baseline results, by benchmark and size
+    :param threshold: the allowed relative change (for example 0.2 for 20%)
+
+    :return the regressions descriptions
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if result["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{key}: throughput {result['throughput']:,.0f}/s is "
+                f"{1 - result['throughput'] / base['throughput']:.0%} lower than the baseline's "
+                f"{base['throughput']:,.0f}/s"
+            )
+        if (
+            result["peak_allocations_mb"]
+            > base["peak_allocations_mb"] * (1 + threshold) + 1
+        ):
+            regressions.append(
+                f"{key}: peak allocations {result['peak_allocations_mb']:,.1f}MB are higher than the baseline's "
+                f"{base['peak_allocations_mb']:,.1f}MB"
+            )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the NY taxi feature pipeline and serving steps"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[1_000, 100_000],
+        help="the dataset sizes to benchmark",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="the amount of timed runs of each benchmark",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        default=None,
+        help="the benchmarks to run (prefixes of their names), default: all",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="the random seed of the synthetic data"
+    )
+    parser.add_argument(
+        "--output", default=None, help="a path to save the results JSON to"
+    )
+    parser.add_argument(
+        "--baseline", default=None, help="a baseline results JSON to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="the allowed relative regression from the baseline",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        default=None,
+        help="a path to save the results as the new baseline",
+    )
+    flags = parser.parse_args(argv)
+
+    benchmarks = {
+        name: benchmark
+        for name, benchmark in get_benchmarks().items()
+        if flags.benchmarks is None
+        or any(name.startswith(prefix) for prefix in flags.benchmarks)
+    }
+
+    # Run the benchmarks:
+    results = {}
+    print(
+        f"{'benchmark':<40}{'rows':>12}{'best (s)':>12}{'rows/s':>15}{'peak RSS (MB)':>15}{'allocs (MB)':>13}"
+    )
+    for rows in flags.rows:
+        df = make_taxi_frame(rows=rows, seed=flags.seed)
+        events = make_events(df)
+        for name, benchmark in benchmarks.items():
+            result = measure(
+                benchmark=benchmark, df=df, events=events, repeats=flags.repeats
+            )
+            results[f"{name}@{rows}"] = result
+            peak_rss = (
+                f"{result['peak_rss_mb']:,.1f}"
+                if result["peak_rss_mb"] is not None
+                else "-"
+            )
+            print(
+                f"{name:<40}{result['items']:>12,}{result['best_seconds']:>12.4f}{result['throughput']:>15,.0f}"
+                f"{peak_rss:>15}{result['peak_allocations_mb']:>13,.1f}"
+            )
+
+    # Save the results:
+    for path in [flags.output, flags.save_baseline]:
+        if path is not None:
+            with open(path, "w") as results_file:
+                json.dump(results, results_file, indent=2)
+
+    # Compare to the baseline:
+    if flags.baseline is not None:
+        with open(flags.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(
+            results=results, baseline=baseline, threshold=flags.threshold
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions larger than {flags.threshold:.0%} from the baseline")
+    return 0
+
+
+def _reset_peak_rss():
+    # Writing "5" to clear_refs resets the process' peak RSS (Linux 4.0+):
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _get_peak_rss() -> int:
+    # The peak RSS ("VmHWM") in bytes, or None if not available:
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
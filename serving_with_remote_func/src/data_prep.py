@@ -1,61 +1,280 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import mlrun
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sklearn.model_selection import train_test_split
 
 
 @mlrun.handler(
-    outputs=["train_dataset:dataset", "test_dataset:dataset", "label_column"]
+    outputs=[
+        "train_dataset:dataset",
+        "test_dataset:dataset",
+        "label_column",
+        "bytes_saved",
+    ]
 )
-def data_preparation(dataset: pd.DataFrame, test_size=0.2):
+def data_preparation(
+    dataset: pd.DataFrame, test_size=0.2, workers=1, backend="threads"
+):
     """A function which preparation the NY taxi dataset
 
     :param dataset: input dataset dataframe
     :param test_size: the amount (%) of data to use for test
+    :param workers: the amount of cores to prepare the features with (see `prepare_features`)
+    :param backend: "threads" or "processes" (see `prepare_features`)
 
-    :return train_dataset, test_dataset, label_column
+    :return train_dataset, test_dataset, label_column, bytes_saved (by the compact features dtypes)
     """
 
     # preform all the steps on the dataset
-    dataset = clean_df(dataset)
-    dataset = add_datetime_info(
-        sphere_dist_step(
-            sphere_dist_bear_step(
-                radian_conv_step(
-                    add_airport_dist(dataset.dropna(how="any", axis="rows"))
-                )
-            )
-        )
-    ).drop(columns=["key", "pickup_datetime"])
+    dataset = prepare_features(dataset, workers=workers, backend=backend).drop(
+        columns=["key", "pickup_datetime"]
+    )
+    dataset, bytes_saved = downcast_features(dataset)
     if test_size != 0:
         train, test = train_test_split(dataset, test_size=test_size)
     else:
         train, test = dataset, dataset
-    return train, test, "fare_amount"
+    return train, test, "fare_amount", bytes_saved
 
 
-# ---- STEPS -------
-def clean_df(df):
-    if "fare_amount" in df.columns:
-        return df[
-            (df.fare_amount > 0)
-            & (df.fare_amount <= 500)
-            & (
-                (df.pickup_longitude != 0)
-                & (df.pickup_latitude != 0)
-                & (df.dropoff_longitude != 0)
-                & (df.dropoff_latitude != 0)
+def data_preparation_streaming(
+    context, dataset: mlrun.DataItem, test_size=0.2, chunksize=1_000_000
+):
+    """A function which preparation the NY taxi dataset chunk by chunk, for datasets larger than the memory
+
+    The dataset (CSV or Parquet) is read in chunks of `chunksize` rows, each chunk is prepared and split, and appended
+    to the train and test Parquet files, so the peak memory is set by the chunk size and not by the dataset size. The
+    split is a deterministic hash of each row's key (instead of `train_test_split`) so it does not depend on the
+    chunking, and rerunning gives the same split.
+
+    :param context: MLRun context
+    :param dataset: input dataset (CSV or Parquet)
+    :param test_size: the amount (%) of data to use for test
+    :param chunksize: the amount of rows to read and prepare at once
+
+    logs train_dataset, test_dataset (Parquet files), label_column and bytes_saved (by the compact features dtypes)
+    """
+    output_dir = tempfile.mkdtemp()
+    train_path = os.path.join(output_dir, "train_dataset.parquet")
+    test_path = os.path.join(output_dir, "test_dataset.parquet")
+
+    # Prepare and write each chunk:
+    writers = {}
+    rows = {"train": 0, "test": 0}
+    bytes_saved = 0
+    try:
+        for train, test in prepare_chunks(
+            chunks=read_chunks(path=dataset.local(), chunksize=chunksize),
+            test_size=test_size,
+        ):
+            for name, split, path in [
+                ("train", train, train_path),
+                ("test", test, test_path),
+            ]:
+                if len(split) == 0:
+                    continue
+                split, split_bytes_saved = downcast_features(split)
+                bytes_saved += split_bytes_saved
+                table = pa.Table.from_pandas(split, preserve_index=False)
+                if name not in writers:
+                    writers[name] = pq.ParquetWriter(path, schema=table.schema)
+                writers[name].write_table(table.cast(writers[name].schema))
+                rows[name] += len(split)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    context.logger.info(
+        f"prepared {rows['train']} train rows and {rows['test']} test rows"
+    )
+    context.log_artifact("train_dataset", local_path=train_path)
+    context.log_artifact("test_dataset", local_path=test_path)
+    context.log_result("label_column", "fare_amount")
+    context.log_result("bytes_saved", bytes_saved)
+
+
+def prepare_features(dataset, workers=1, backend="threads"):
+    """Clean the dataset and add all the features by all the steps
+
+    Each row's features are independent of the other rows, so the work can be split into row blocks over multiple
+    cores:
+
+    * "threads" - only the geo kernel runs on row blocks in a threads pool, NumPy releases the GIL in its ufuncs so the
+      threads run in parallel. The blocks are views of the same column arrays and each thread writes its block of a
+      single preallocated features array, so there are no copies and the order is kept. The cleaning and the datetime
+      parsing still run on a single core, which limits the speedup to the geo kernel's share of the time.
+    * "processes" - the whole pipeline runs on row blocks in a processes pool and the results are concatenated in
+      order. This parallelizes the pandas steps as well, but each block is pickled to its process and back (about
+      twice the dataset's size copied through pipes), which pays off only for large datasets on many cores.
+
+    :param dataset: input dataset dataframe
+    :param workers: the amount of threads or processes to use (None for all the cores)
+    :param backend: "threads" or "processes"
+
+    :return the prepared dataframe (still with the "key" and "pickup_datetime" columns)
+    """
+    workers = workers or os.cpu_count()
+    if backend not in ["threads", "processes"]:
+        raise ValueError(
+            f"backend must be 'threads' or 'processes', given: '{backend}'"
+        )
+
+    # Run the whole pipeline on row blocks in processes:
+    if workers > 1 and backend == "processes":
+        blocks = np.array_split(np.arange(len(dataset)), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return pd.concat(
+                executor.map(
+                    prepare_features, [dataset.iloc[block] for block in blocks]
+                )
             )
-        ]
+
+    # the geo steps are fused into a single pass, see `geo_features_step`
+    dataset = clean_df(dataset, dropna=True)
+    return add_datetime_info(geo_features_step(dataset, workers=workers))
+
+
+def downcast_features(dataset):
+    """Cast the prepared features to the compact dtypes of `FEATURES_DTYPES` (float32 geo features, small integer
+    calendar features and passenger count)
+
+    :param dataset: the prepared dataset dataframe
+
+    :return the downcast dataframe and the amount of bytes saved
+    """
+    memory_usage = dataset.memory_usage(deep=True).sum()
+    dataset = dataset.astype(
+        {
+            column: dtype
+            for column, dtype in FEATURES_DTYPES.items()
+            if column in dataset.columns
+        }
+    )
+    return dataset, int(memory_usage - dataset.memory_usage(deep=True).sum())
+
+
+def prepare_chunks(chunks, test_size=0.2):
+    """Prepare and split each of the given dataset chunks
+
+    A row is in the test split if the hash of its key falls in the lowest `test_size` fraction of the hash range. If
+    `test_size` is 0, all rows are in both splits (like `data_preparation`).
+
+    :param chunks: an iterable of the dataset dataframe chunks
+    :param test_size: the amount (%) of data to use for test
+
+    :return a generator of a (train, test) dataframes tuple per chunk
+    """
+    for chunk in chunks:
+        chunk = prepare_features(chunk)
+        if test_size != 0:
+            key_hash = pd.util.hash_pandas_object(chunk["key"], index=False).to_numpy()
+            is_test = key_hash < np.uint64(test_size * np.iinfo(np.uint64).max)
+        chunk = chunk.drop(columns=["key", "pickup_datetime"])
+        if test_size != 0:
+            yield chunk[~is_test], chunk[is_test]
+        else:
+            yield chunk, chunk
+
+
+def read_chunks(path, chunksize=1_000_000):
+    """Read a CSV or Parquet dataset file in chunks
+
+    :param path: the local path of the dataset file (Parquet if it ends with ".parquet" or ".pq", otherwise CSV)
+    :param chunksize: the amount of rows in each chunk
+
+    :return a generator of the dataset dataframe chunks
+    """
+    if path.endswith((".parquet", ".pq")):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
     else:
-        return df[
-            (
-                (df.pickup_longitude != 0)
-                & (df.pickup_latitude != 0)
-                & (df.dropoff_longitude != 0)
-                & (df.dropoff_latitude != 0)
-            )
-        ]
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+# ---- CONSTANTS -------
+# Earth radius (km)
+R_EARTH = 6371
+
+# Airports (and landmarks) coordinates, the features are the distance of the ride through each of them
+AIRPORTS_COORDS = {
+    "jfk": (40.639722, -73.778889),  # John F. Kennedy International Airport
+    "ewr": (40.6925, -74.168611),  # Newark Liberty International Airport
+    "lga": (40.77725, -73.872611),  # LaGuardia Airport
+    "sol": (40.6892, -74.0445),  # Statue of Liberty
+    "nyc": (40.7141667, -74.0063889),  # Newyork Central
+}
+
+# The columns produced by the geo steps, in the order the steps produce them
+GEO_FEATURES = [
+    "pickup_latitude",
+    "pickup_longitude",
+    "dropoff_latitude",
+    "dropoff_longitude",
+    *[f"{airport}_dist" for airport in AIRPORTS_COORDS],
+    "bearing",
+    "distance",
+]
+
+
+# The compact dtypes of the prepared features (see `downcast_features`), the rest of the columns are kept as is
+FEATURES_DTYPES = {
+    **{feature: np.float32 for feature in GEO_FEATURES},
+    "pickup_datetime_hour": np.int8,
+    "pickup_datetime_day": np.int8,
+    "pickup_datetime_month": np.int8,
+    "pickup_datetime_weekday": np.int8,
+    "pickup_datetime_year": np.int16,
+    "passenger_count": np.int16,
+}
+
+# The layout of the dataset's timestamps, and the same layout as a bytes template of the digits and literals positions
+# (ending with a null byte, as the timestamps are read one byte longer to reject longer values)
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+DATETIME_TEMPLATE = "0000-00-00 00:00:00 UTC"
+DATETIME_TEMPLATE_BYTES = np.frombuffer(
+    DATETIME_TEMPLATE.encode() + b"\0", dtype=np.uint8
+)
+DATETIME_DIGITS = np.flatnonzero(DATETIME_TEMPLATE_BYTES == ord("0"))
+DATETIME_LITERALS = np.flatnonzero(DATETIME_TEMPLATE_BYTES != ord("0"))
+
+# The amount of days in each month (by the month number) of a non leap year
+DAYS_IN_MONTH = np.array(
+    [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int16
+)
+
+# The months offsets of Sakamoto's day of week method
+SAKAMOTO_OFFSETS = np.array([0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4], dtype=np.int16)
+
+
+# ---- STEPS -------
+def clean_df(df, dropna=False):
+    """
+    Drop the rows with an invalid fare (if there is a fare column) or a zero coordinate, and with any missing value if
+    `dropna` is True. All the conditions are combined in place into a single NumPy mask, so the dataframe is copied only
+    once by the final selection.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if "fare_amount" in df.columns:
+        fare_amount = df["fare_amount"].to_numpy()
+        mask &= fare_amount > 0
+        mask &= fare_amount <= 500
+    for column in [
+        "pickup_longitude",
+        "pickup_latitude",
+        "dropoff_longitude",
+        "dropoff_latitude",
+    ]:
+        mask &= df[column].to_numpy() != 0
+    if dropna:
+        for column in df.columns:
+            mask &= df[column].notna().to_numpy()
+    return df[mask]
 
 
 def add_airport_dist(df):
@@ -99,18 +318,120 @@ def add_airport_dist(df):
 
 
 def add_datetime_info(df):
-    # Convert to datetime format
-    df["pickup_datetime"] = pd.to_datetime(
-        df["pickup_datetime"], format="%Y-%m-%d %H:%M:%S UTC"
-    )
-    df["pickup_datetime_hour"] = df.pickup_datetime.dt.hour
-    df["pickup_datetime_day"] = df.pickup_datetime.dt.day
-    df["pickup_datetime_month"] = df.pickup_datetime.dt.month
-    df["pickup_datetime_weekday"] = df.pickup_datetime.dt.weekday
-    df["pickup_datetime_year"] = df.pickup_datetime.dt.year
+    """
+    Add the pickup hour, day, month, weekday and year columns (int8, and int16 for the year).
+
+    Timestamps in the dataset's fixed width layout "YYYY-MM-DD HH:MM:SS UTC" are parsed directly from their bytes (see
+    `parse_datetime_bytes`). Any other values fall back to `parse_datetime_unique`. The "pickup_datetime" column itself
+    is left as is.
+    """
+    parts = parse_datetime_bytes(df["pickup_datetime"])
+    if parts is None:
+        parts = parse_datetime_unique(df["pickup_datetime"])
+    for part, values in parts.items():
+        df[f"pickup_datetime_{part}"] = values
     return df
 
 
+def parse_datetime_bytes(timestamps):
+    """
+    Parse "YYYY-MM-DD HH:MM:SS UTC" timestamps with vectorized integer arithmetic on their bytes, computing all the
+    calendar parts in a single pass without creating datetime objects. The weekday is calculated with Sakamoto's
+    method.
+
+    :param timestamps: The timestamps series.
+
+    :return: A dictionary of the "hour", "day", "month", "weekday" and "year" arrays, or None if any of the timestamps
+             is not a valid timestamp of this layout.
+    """
+    if not pd.api.types.is_string_dtype(timestamps.dtype):
+        return None
+
+    # Get the timestamps as fixed width byte strings, one byte longer than the layout to detect longer values
+    try:
+        raw = timestamps.to_numpy(dtype=f"S{len(DATETIME_TEMPLATE_BYTES)}")
+    except (TypeError, ValueError):
+        return None
+    chars = raw.view(np.uint8).reshape(len(raw), len(DATETIME_TEMPLATE_BYTES))
+
+    # Validate the layout: the separators, the " UTC" suffix and the ending null byte are in place and the rest are
+    # digits
+    if not (
+        (
+            chars[:, DATETIME_LITERALS] == DATETIME_TEMPLATE_BYTES[DATETIME_LITERALS]
+        ).all()
+        and ((chars[:, DATETIME_DIGITS] - np.uint8(ord("0"))) <= 9).all()
+    ):
+        return None
+
+    # Combine the digits into the numbers
+    digits = (chars[:, DATETIME_DIGITS] - ord("0")).astype(np.int16).T
+    year = digits[0] * 1000 + digits[1] * 100 + digits[2] * 10 + digits[3]
+    month = digits[4] * 10 + digits[5]
+    day = digits[6] * 10 + digits[7]
+    hour = digits[8] * 10 + digits[9]
+    minute = digits[10] * 10 + digits[11]
+    second = digits[12] * 10 + digits[13]
+
+    # Validate the ranges (out of bounds values are left for `pd.to_datetime` to reject)
+    if not (
+        ((year >= 1678) & (year <= 2261)).all()
+        and ((month >= 1) & (month <= 12)).all()
+        and (hour <= 23).all()
+        and (minute <= 59).all()
+        and (second <= 59).all()
+    ):
+        return None
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    if not (
+        (day >= 1) & (day <= DAYS_IN_MONTH[month] + (is_leap & (month == 2)))
+    ).all():
+        return None
+
+    # Sakamoto's day of week (0 is Sunday), shifted to pandas' weekday (0 is Monday)
+    y = year - (month < 3)
+    weekday = (
+        y + y // 4 - y // 100 + y // 400 + SAKAMOTO_OFFSETS[month - 1] + day + 6
+    ) % 7
+
+    return {
+        "hour": hour.astype(np.int8),
+        "day": day.astype(np.int8),
+        "month": month.astype(np.int8),
+        "weekday": weekday.astype(np.int8),
+        "year": year,
+    }
+
+
+def parse_datetime_unique(timestamps):
+    """
+    Parse the timestamps with `pd.to_datetime` once per unique value (taxi timestamps repeat heavily) and map the
+    calendar parts back to the rows.
+
+    :param timestamps: The timestamps series.
+
+    :return: A dictionary of the "hour", "day", "month", "weekday" and "year" arrays (compact integers unless there
+             are missing timestamps).
+    """
+    codes, uniques = pd.factorize(timestamps)
+    uniques = pd.DatetimeIndex(pd.to_datetime(uniques, format=DATETIME_FORMAT))
+    parts = {}
+    for part, dtype in [
+        ("hour", np.int8),
+        ("day", np.int8),
+        ("month", np.int8),
+        ("weekday", np.int8),
+        ("year", np.int16),
+    ]:
+        values = getattr(uniques, part).to_numpy()
+        if (codes == -1).any():
+            # missing values have the code -1, taking the appended NaN
+            parts[part] = np.append(values.astype(np.float64), np.nan)[codes]
+        else:
+            parts[part] = values.astype(dtype)[codes]
+    return parts
+
+
 def radian_conv_step(df):
     features = [
         "pickup_latitude",
@@ -143,6 +464,154 @@ def sphere_dist_step(df):
     return df
 
 
+def geo_features_step(df, dtype=np.float64, workers=1):
+    """
+    Fused replacement of the chain `add_airport_dist` -> `radian_conv_step` -> `sphere_dist_bear_step` ->
+    `sphere_dist_step`, computing all their columns in a single pass with `geo_features_kernel`.
+
+    :param df:      The dataframe with the pickup and dropoff coordinates (degrees).
+    :param dtype:   The dtype of the produced columns (float64 or float32).
+    :param workers: The amount of threads to split the rows between.
+    """
+    coordinates = [
+        df[column].to_numpy(dtype=np.float64)
+        for column in [
+            "pickup_latitude",
+            "pickup_longitude",
+            "dropoff_latitude",
+            "dropoff_longitude",
+        ]
+    ]
+    features = np.empty((len(GEO_FEATURES), len(df)), dtype=dtype)
+
+    # Each block's thread reads views of the coordinates and writes its columns of the preallocated features
+    blocks = [
+        block
+        for block in np.array_split(np.arange(len(df)), max(workers, 1))
+        if len(block)
+    ]
+    with ThreadPoolExecutor(max_workers=max(len(blocks), 1)) as executor:
+        list(
+            executor.map(
+                lambda block: geo_features_kernel(
+                    *[values[block[0] : block[-1] + 1] for values in coordinates],
+                    out=features[:, block[0] : block[-1] + 1],
+                ),
+                blocks,
+            )
+        )
+    for feature, values in zip(GEO_FEATURES, features):
+        df[feature] = values
+    return df
+
+
+def geo_features_kernel(
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon, out=None, dtype=np.float64
+):
+    """
+    Compute all the geo features of the step functions at once, returning them as the rows of a single preallocated
+    array in the order of `GEO_FEATURES`.
+
+    The trig terms of the coordinates are computed once and reused by all the airports distances, using the difference
+    identities sin((a - b) / 2) = sin(a / 2)cos(b / 2) - cos(a / 2)sin(b / 2) (the airports terms are constants). The
+    results match the step functions, including the bearing and distance being calculated on the coordinates after
+    they were converted to radians twice (as `radian_conv_step` converts them before `sphere_dist_bear_step` and
+    `sphere_dist_step` convert them again).
+
+    :param pickup_lat:  The pickup latitudes (degrees).
+    :param pickup_lon:  The pickup longitudes (degrees).
+    :param dropoff_lat: The dropoff latitudes (degrees).
+    :param dropoff_lon: The dropoff longitudes (degrees).
+    :param out:         A preallocated array of shape (len(GEO_FEATURES), rows) to write the features to.
+    :param dtype:       The dtype of the returned array if `out` is not given.
+
+    :return: The features array of shape (len(GEO_FEATURES), rows).
+    """
+    if out is None:
+        out = np.empty((len(GEO_FEATURES), len(pickup_lat)), dtype=dtype)
+    coordinates_out, airports_out, bearing_out, distance_out = (
+        out[:4],
+        out[4 : 4 + len(AIRPORTS_COORDS)],
+        out[-2],
+        out[-1],
+    )
+
+    # Convert to radians once (these are the values `radian_conv_step` leaves in the coordinates columns)
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon = map(
+        np.radians, [pickup_lat, pickup_lon, dropoff_lat, dropoff_lon]
+    )
+    coordinates_out[:] = pickup_lat, pickup_lon, dropoff_lat, dropoff_lon
+
+    # Half angles and latitudes trig terms, shared by all the airports distances
+    sin_half = {}
+    cos_half = {}
+    for name, values in [
+        ("pickup_lat", pickup_lat),
+        ("pickup_lon", pickup_lon),
+        ("dropoff_lat", dropoff_lat),
+        ("dropoff_lon", dropoff_lon),
+    ]:
+        half = values / 2.0
+        sin_half[name] = np.sin(half)
+        cos_half[name] = np.cos(half)
+    cos_pickup_lat = np.cos(pickup_lat)
+    cos_dropoff_lat = np.cos(dropoff_lat)
+
+    # Airports distances: pickup -> airport + airport -> dropoff
+    a = np.empty_like(pickup_lat)
+    term = np.empty_like(pickup_lat)
+    total = np.empty_like(pickup_lat)
+    for airport_out, (airport_lat, airport_lon) in zip(
+        airports_out, AIRPORTS_COORDS.values()
+    ):
+        airport_lat, airport_lon = np.radians(airport_lat), np.radians(airport_lon)
+        sin_lat, cos_lat = np.sin(airport_lat / 2.0), np.cos(airport_lat / 2.0)
+        sin_lon, cos_lon = np.sin(airport_lon / 2.0), np.cos(airport_lon / 2.0)
+        cos_airport_lat = np.cos(airport_lat)
+        total[:] = 0.0
+        for point, cos_point_lat in [
+            ("pickup", cos_pickup_lat),
+            ("dropoff", cos_dropoff_lat),
+        ]:
+            # sin(dlat / 2) ** 2 (the sign of the difference is squared away)
+            np.multiply(sin_half[f"{point}_lat"], cos_lat, out=a)
+            np.multiply(cos_half[f"{point}_lat"], sin_lat, out=term)
+            np.subtract(a, term, out=a)
+            np.square(a, out=a)
+            # + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+            np.multiply(sin_half[f"{point}_lon"], cos_lon, out=term)
+            term -= cos_half[f"{point}_lon"] * sin_lon
+            np.square(term, out=term)
+            term *= cos_point_lat
+            term *= cos_airport_lat
+            a += term
+            # 2 * R * arcsin(sqrt(a)) (the scaling is applied once to the sum of both legs)
+            np.sqrt(a, out=a)
+            np.arcsin(a, out=a)
+            total += a
+        np.multiply(total, 2 * R_EARTH, out=airport_out)
+
+    # Bearing and distance, calculated on the coordinates converted to radians for the second time
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon = map(
+        np.radians, [pickup_lat, pickup_lon, dropoff_lat, dropoff_lon]
+    )
+    sin_pickup_lat, cos_pickup_lat = np.sin(pickup_lat), np.cos(pickup_lat)
+    sin_dropoff_lat, cos_dropoff_lat = np.sin(dropoff_lat), np.cos(dropoff_lat)
+    dlon = pickup_lon - dropoff_lon
+    bearing_out[:] = np.arctan2(
+        np.sin(dlon * cos_dropoff_lat),
+        cos_pickup_lat * sin_dropoff_lat
+        - sin_pickup_lat * cos_dropoff_lat * np.cos(dlon),
+    )
+    a = (
+        np.sin((dropoff_lat - pickup_lat) / 2.0) ** 2
+        + cos_pickup_lat * cos_dropoff_lat * np.sin(-dlon / 2.0) ** 2
+    )
+    distance_out[:] = 2 * R_EARTH * np.arcsin(np.sqrt(a))
+
+    return out
+
+
 # ---- Distance Calculation Formulas -------
 def sphere_dist(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon):
     """
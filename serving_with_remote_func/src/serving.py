@@ -1,7 +1,231 @@
-from typing import Dict, Union
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Union
+import asyncio
+import bisect
+import functools
+import importlib
+import io
+import json
+import math
+import os
+import resource
+import threading
+import time
+
 import numpy as np
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# The async serving engine passes the events through a graph step one at a time, waiting for each to return, so the
+# steps that wait on other events (see `MicroBatchPredict`) are storey's concurrent steps, taking in the next events
+# while the previous ones wait. Without storey (outside of the serving runtime) they are plain classes:
+try:
+    from storey import ConcurrentExecution as ConcurrentStep
+except ImportError:
+    ConcurrentStep = object
+
+# The environment variable choosing where the model runs - "remote" (default) or "local" (see `get_model_client`)
+MODEL_EXECUTION_ENV = "MODEL_EXECUTION"
+
+# The settings of the remote model client, which have no meaning for a model running in process (see
+# `get_model_client`)
+REMOTE_CLIENT_SETTINGS = [
+    "method",
+    "max_in_flight",
+    "timeout",
+    "retries",
+    "hedge_after_ms",
+    "payload",
+]
+
+# The common arguments the serving graph gives its class steps, which are not the model client's settings
+GRAPH_STEP_ARGS = ["input_path", "result_path", "full_event", "graph_step"]
+
+# The content types of the remote model payloads (see `RemoteModelClient`)
+PAYLOAD_CONTENT_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "numpy": "application/x-npy",
+}
+
+# The environment variable adding the steps metrics to the responses when set to "1" or "true" (see `postprocess`)
+SERVING_DEBUG_ENV = "SERVING_DEBUG"
+
+
+class StepsMetrics:
+    """
+    Thread safe per step metrics of the serving graph: the amount of events, the amount of errors and a histogram of
+    the wall time of each step (with Prometheus' cumulative buckets). Recording an event takes a couple of
+    microseconds.
+    """
+
+    # The upper bounds in seconds of the wall time histogram buckets (the last bucket is +Inf):
+    BUCKETS = (
+        0.00001,
+        0.00005,
+        0.0001,
+        0.0005,
+        0.001,
+        0.005,
+        0.01,
+        0.05,
+        0.1,
+        0.5,
+        1.0,
+        5.0,
+    )
+
+    def __init__(self):
+        self._steps = {}
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float, error: bool = False):
+        """
+        Record a step's event.
+
+        :param step:    The step name.
+        :param seconds: The wall time of the step in seconds.
+        :param error:   Whether the step raised an error.
+        """
+        with self._lock:
+            metrics = self._steps.get(step)
+            if metrics is None:
+                metrics = self._steps[step] = {
+                    "events": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "buckets": [0] * (len(self.BUCKETS) + 1),
+                }
+            metrics["events"] += 1
+            metrics["errors"] += error
+            metrics["seconds"] += seconds
+            metrics["buckets"][bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """
+        Get the metrics of each step - its events, errors, total and mean wall time and the non cumulative histogram
+        buckets counts by their upper bounds.
+        """
+        with self._lock:
+            return {
+                step: {
+                    "events": metrics["events"],
+                    "errors": metrics["errors"],
+                    "seconds": metrics["seconds"],
+                    "mean_seconds": metrics["seconds"] / metrics["events"],
+                    "buckets": dict(
+                        zip([*map(str, self.BUCKETS), "+Inf"], metrics["buckets"])
+                    ),
+                }
+                for step, metrics in self._steps.items()
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Get the metrics in the Prometheus text exposition format, with the process' peak RSS.
+        """
+        lines = [
+            "# HELP serving_step_duration_seconds The wall time of the serving graph steps.",
+            "# TYPE serving_step_duration_seconds histogram",
+        ]
+        events = ["# TYPE serving_step_events_total counter"]
+        errors = ["# TYPE serving_step_errors_total counter"]
+        with self._lock:
+            for step, metrics in self._steps.items():
+                cumulative = 0
+                for bound, count in zip(
+                    [*map(str, self.BUCKETS), "+Inf"], metrics["buckets"]
+                ):
+                    cumulative += count
+                    lines.append(
+                        f'serving_step_duration_seconds_bucket{{step="{step}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'serving_step_duration_seconds_sum{{step="{step}"}} {metrics["seconds"]}'
+                )
+                lines.append(
+                    f'serving_step_duration_seconds_count{{step="{step}"}} {metrics["events"]}'
+                )
+                events.append(
+                    f'serving_step_events_total{{step="{step}"}} {metrics["events"]}'
+                )
+                errors.append(
+                    f'serving_step_errors_total{{step="{step}"}} {metrics["errors"]}'
+                )
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return "\n".join(
+            lines
+            + events
+            + errors
+            + [
+                "# TYPE serving_process_max_rss_bytes gauge",
+                f"serving_process_max_rss_bytes {max_rss}",
+                "",
+            ]
+        )
+
+    def reset(self):
+        with self._lock:
+            self._steps.clear()
+
+
+# The metrics of this process' steps:
+STEPS_METRICS = StepsMetrics()
+
 
+def timed_step(step: str = None):
+    """A decorator recording the wall time and errors of a step function or method (sync or async) in `STEPS_METRICS`
+
+    :param step: the step name, default: the function's name
+    """
+
+    def decorator(function):
+        name = step or function.__name__
+
+        if asyncio.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await function(*args, **kwargs)
+                except Exception:
+                    STEPS_METRICS.record(name, time.perf_counter() - start, error=True)
+                    raise
+                STEPS_METRICS.record(name, time.perf_counter() - start)
+                return result
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    STEPS_METRICS.record(name, time.perf_counter() - start, error=True)
+                    raise
+                STEPS_METRICS.record(name, time.perf_counter() - start)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def dump_metrics() -> str:
+    """Get the serving steps metrics as a Prometheus style text dump"""
+    return STEPS_METRICS.to_prometheus()
+
+
+@timed_step()
 def preprocess(vector: Union[Dict]) -> Dict:
     """Converting a simple text into a structured body for the serving function
 
@@ -12,18 +236,770 @@ def preprocess(vector: Union[Dict]) -> Dict:
     return {"inputs": [[*vector.values()]]}
 
 
+@timed_step()
 def postprocess(model_response: Dict) -> Dict:
     """Transfering the prediction to the gradio interface.
 
     :param model_response: A dict with the model output
     """
-    return {
+    response = {
         "result": model_response["outputs"][0],
         "result_str": f'predicted fare amount is {model_response["outputs"][0]}',
     }
+    # Pass the prediction cache's metadata (see `ModelStep`):
+    if "cache" in model_response:
+        response["cache"] = model_response["cache"]
+    # Add the steps metrics in debug mode:
+    if os.environ.get(SERVING_DEBUG_ENV, "").lower() in ["1", "true"]:
+        response["metrics"] = STEPS_METRICS.to_dict()
+    return response
+
+
+class MicroBatchPredict(ConcurrentStep):
+    """
+    A serving graph step replacing the chain of the feature steps -> `preprocess` -> `$remote`, that gathers the
+    events arriving concurrently into micro batches of up to `max_batch_size` events (or whatever arrived within
+    `max_wait_ms` of the first one), runs the vectorized feature steps once on the whole batch and sends a single multi
+    rows `inputs` request to the remote model. Each event gets its own row of the outputs back, as `{"outputs": [...]}`
+    so `postprocess` stays the same.
+
+    In the serving runtime the step is a storey `ConcurrentExecution` step, so the async engine keeps handing it events
+    while the previous ones wait for their batch - up to `max_batch_size` times `max_batches_in_flight` events, and up
+    to `max_batches_in_flight` batches are sent to the model at once.
+
+    For example:
+        graph.to(
+            class_name="MicroBatchPredict", name="predict", url=f"{remote_addr}v2/models/lgbm_ny_taxi/infer"
+        ).to(handler="postprocess", name="postprocess").respond()
+    """
+
+    def __init__(
+        self,
+        context=None,
+        name: str = None,
+        url: str = None,
+        method: str = None,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+        max_batches_in_flight: int = 4,
+        timeout: float = None,
+        **kwargs,
+    ):
+        """
+        Initialize the step.
+
+        :param context:               The serving context.
+        :param name:                  The step name.
+        :param url:                   The remote model's infer url.
+        :param method:                The HTTP method of the remote model's infer requests. Default: The client's
+                                      ("PUT").
+        :param max_batch_size:        The maximum amount of events in a batch. Default: 64.
+        :param max_wait_ms:           The maximum time in milliseconds to wait for a batch to fill up. Default: 5.
+        :param max_batches_in_flight: The maximum amount of batches sent to the model at once. Default: 4.
+        :param timeout:               The remote model's request timeout in seconds. Default: The client's (10).
+        :param kwargs:                The rest of the model client's settings (see `get_model_client`).
+        """
+        for arg in GRAPH_STEP_ARGS:
+            kwargs.pop(arg, None)
+        if ConcurrentStep is not object:
+            super().__init__(
+                event_processor=self.do,
+                context=context,
+                name=name,
+                max_in_flight=max_batch_size * max_batches_in_flight,
+            )
+        self.context = context
+        self.name = name
+        self.url = url
+        self.method = method
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_batches_in_flight = max_batches_in_flight
+        self.timeout = timeout
+
+        # The model's client - a pooled keep-alive client of the remote model or the model loaded in process (the rest
+        # of the keyword arguments are its settings, see `get_model_client`), and the threads sending the batches:
+        self._client = get_model_client(
+            context=context, url=url, method=method, timeout=timeout, **kwargs
+        )
+        self._batches_executor = ThreadPoolExecutor(max_workers=max_batches_in_flight)
+
+        # The events waiting for the current batch to be sent, as (event body, future) pairs:
+        self._pending = []
+        self._flush_timer = None
+
+    @timed_step("MicroBatchPredict")
+    async def do(self, event: Dict) -> Dict:
+        """
+        Add the event to the current batch and wait for its prediction.
+
+        :param event: The event body - a dictionary of the raw ride features.
+
+        :returns: The event's model response - `{"outputs": [prediction]}`.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((event, future))
+
+        # Send the batch once it is full, or once the first event waited for `max_wait_ms`:
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return {"outputs": [await future]}
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch=batch))
+
+    async def _send(self, batch: List):
+        try:
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                self._batches_executor, self.predict, [event for event, _ in batch]
+            )
+        except Exception as exception:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+
+    def predict(self, events: List[Dict]) -> List:
+        """
+        Predict a batch of events with a single request to the model.
+
+        :param events: The events bodies.
+
+        :returns: The predictions, one per event.
+        """
+        outputs = list(self._client.invoke(batch_preprocess(events))["outputs"])
+        if len(outputs) != len(events):
+            raise ValueError(
+                f"The model returned {len(outputs)} outputs for a batch of {len(events)} events"
+            )
+        return outputs
+
+
+class ModelStep(ConcurrentStep):
+    """
+    A serving graph step invoking the model, in place of `$remote`. By default, the model is invoked remotely through a
+    `RemoteModelClient` - a pool of keep-alive connections with bounded concurrency, timeouts, hedged retries and
+    optional binary payloads. Setting the `MODEL_EXECUTION` environment variable of the function to "local" (or passing
+    `mode="local"`) runs the model server in process instead (see `LocalModelClient`), without changing the graph as
+    long as it sets none of the remote client's settings (they raise an error in the "local" mode).
+
+    In the serving runtime the step is a storey `ConcurrentExecution` step, so the async engine keeps handing it events
+    while the previous ones wait for the model - up to the remote client's `max_in_flight` (or 8 in the "local" mode)
+    events at once, and the model is invoked without blocking the event loop.
+
+    Optionally, the predictions are cached (see `PredictionCache`) by `cache_size` - rows found in the cache are not
+    sent to the model, and the response includes the cache's hits and misses counters under "cache".
+
+    For example:
+        graph.to(handler="preprocess", name="preprocess").to(
+            class_name="ModelStep", name="model", url=f"{remote_addr}v2/models/lgbm_ny_taxi/infer",
+            model_path=project.get_artifact("lgbm_ny_taxi").uri, max_in_flight=16, timeout=1, hedge_after_ms=50,
+            cache_size=10000, cache_ttl=600, cache_decimals=4,
+        ).to(handler="postprocess", name="postprocess").respond()
+    """
+
+    def __init__(
+        self,
+        context=None,
+        name: str = None,
+        url: str = None,
+        cache_size: int = 0,
+        cache_ttl: float = None,
+        cache_decimals: int = None,
+        cache_key: List[int] = None,
+        **kwargs,
+    ):
+        """
+        Initialize the step.
+
+        :param context:        The serving context.
+        :param name:           The step name.
+        :param url:            The remote model's infer url.
+        :param cache_size:     The maximum amount of cached predictions. Default: 0, meaning no cache.
+        :param cache_ttl:      The time in seconds a cached prediction is valid. Default: None, meaning until evicted.
+        :param cache_decimals: The amount of decimals to round the features to in the cache key, so near repeats
+                               share a key. Default: None, meaning exact values.
+        :param cache_key:      The indices of the features making the cache key, it must cover every feature the
+                               model uses (see `PredictionCache`). Default: None, meaning all.
+        :param kwargs:         The client's settings (see `get_model_client`).
+        """
+        for arg in GRAPH_STEP_ARGS:
+            kwargs.pop(arg, None)
+        self._client = get_model_client(context=context, url=url, **kwargs)
+        if ConcurrentStep is not object:
+            super().__init__(
+                event_processor=self.do,
+                context=context,
+                name=name,
+                max_in_flight=getattr(self._client, "max_in_flight", 8),
+            )
+        self.context = context
+        self.name = name
+        self._cache = (
+            PredictionCache(
+                max_size=cache_size,
+                ttl=cache_ttl,
+                decimals=cache_decimals,
+                key_indices=cache_key,
+            )
+            if cache_size
+            else None
+        )
+
+    @timed_step("ModelStep")
+    async def do(self, event: Dict) -> Dict:
+        """
+        Invoke the model with the event.
+
+        :param event: The model request body - `{"inputs": [[...], ...]}`.
+
+        :returns: The model response body.
+        """
+        if self._cache is None:
+            return await self._client.invoke_async(event)
+
+        # Look for the rows in the cache and send only the missing ones to the model:
+        inputs = event["inputs"]
+        keys = [self._cache.get_key(row=row) for row in inputs]
+        outputs = [self._cache.get(key=key) for key in keys]
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            response = await self._client.invoke_async(
+                {**event, "inputs": [inputs[i] for i in missing]}
+            )
+            for i, output in zip(missing, response["outputs"]):
+                outputs[i] = output
+                self._cache.put(key=keys[i], output=output)
+        else:
+            response = {}
+
+        return {
+            **response,
+            "outputs": outputs,
+            "cache": {
+                "hits": len(inputs) - len(missing),
+                "misses": len(missing),
+                "total_hits": self._cache.hits,
+                "total_misses": self._cache.misses,
+                "size": len(self._cache),
+            },
+        }
+
+
+class PredictionCache:
+    """
+    A thread safe LRU cache of model predictions keyed by the model's input rows, bounded by `max_size` entries and
+    optionally expiring entries after `ttl` seconds.
+
+    The key of a row is its values at the `key_indices` (all by default), with the floats rounded to `decimals` so near
+    repeats (for example the same route from slightly different coordinates) share a prediction. The key must include
+    every feature the model uses - rows differing only in a feature left out of the key (for example the passenger
+    count of `preprocess` rows) would get each other's predictions. Only features that are functions of the key's
+    features (like the distances of the coordinates) can be left out.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float = None,
+        decimals: int = None,
+        key_indices: List[int] = None,
+    ):
+        """
+        Initialize an empty cache.
+
+        :param max_size:    The maximum amount of entries, the least recently used ones are evicted.
+        :param ttl:         The time in seconds an entry is valid. Default: None, meaning until evicted.
+        :param decimals:    The amount of decimals to round the floats of the key to. Default: None, meaning exact.
+        :param key_indices: The indices of the row values making the key. Default: None, meaning all.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self.key_indices = key_indices
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_key(self, row: List) -> tuple:
+        if self.key_indices is not None:
+            row = [row[i] for i in self.key_indices]
+        if self.decimals is not None:
+            row = [
+                round(value, self.decimals) if isinstance(value, float) else value
+                for value in row
+            ]
+        return tuple(row)
+
+    def get(self, key: tuple):
+        """
+        Get the cached prediction of the key, counting a hit or a miss.
+
+        :param key: The row's key (see `get_key`).
+
+        :returns: The cached prediction, or None if it is not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, output):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.ttl if self.ttl is not None else None,
+                output,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class RemoteModelClient:
+    """
+    A client of a remote model server, keeping a pool of keep-alive connections so requests do not pay for a new
+    connection, with up to `max_in_flight` concurrent requests.
+
+    Each request has a timeout. A request that fails with a connection error, a timeout or a 429 / 5xx status is retried
+    up to `retries` times. If `hedge_after_ms` is given, a request that did not respond within that time is hedged - a
+    duplicate request is sent (counted as a retry) and the first successful response of the two wins, cutting the tail
+    latency of slow connections and busy replicas.
+
+    The request body can be sent as JSON, msgpack (requires the `msgpack` package) or the NumPy `.npy` format of the
+    inputs array. The remote model server must decode the binary payloads (see `decode_inputs`).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        method: str = "PUT",
+        max_in_flight: int = 8,
+        timeout: float = 10,
+        retries: int = 2,
+        hedge_after_ms: float = None,
+        payload: str = "json",
+    ):
+        """
+        Initialize the client.
+
+        :param url:            The remote model's infer url.
+        :param method:         The HTTP method of the requests. Default: "PUT".
+        :param max_in_flight:  The maximum amount of concurrent requests (and pooled connections). Default: 8.
+        :param timeout:        The timeout in seconds of each request. Default: 10.
+        :param retries:        The maximum amount of retries (including hedged requests) per request. Default: 2.
+        :param hedge_after_ms: The time in milliseconds after which a request without a response is hedged. Default:
+                               None, meaning requests are not hedged.
+        :param payload:        The request body format - "json", "msgpack" or "numpy". Default: "json".
+
+        :raise ValueError:  If the payload format is unknown.
+        :raise ImportError: If the payload format is "msgpack" and the `msgpack` package is not installed.
+        """
+        if payload not in PAYLOAD_CONTENT_TYPES:
+            raise ValueError(
+                f"payload must be one of {list(PAYLOAD_CONTENT_TYPES)}, given: '{payload}'"
+            )
+        if payload == "msgpack" and msgpack is None:
+            raise ImportError("The 'msgpack' payload requires the 'msgpack' package")
+        self.url = url
+        self.method = method
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge_after_ms = hedge_after_ms
+        self.payload = payload
+
+        # The connections pool, retries are done by the client itself:
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_in_flight, max_retries=0
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+    def invoke(self, body: Dict) -> Dict:
+        """
+        Send the request body to the remote model, retrying and hedging as configured.
+
+        :param body: The request body - `{"inputs": [[...], ...]}`.
+
+        :returns: The response body.
+
+        :raise requests.RequestException: If the request failed (after all the retries).
+        """
+        data = encode_inputs(body=body, payload=self.payload)
+        running = {self._executor.submit(self._request, data)}
+        attempts = 1
+        error = None
+        while running:
+            # Wait for the first response, or until it is time to hedge:
+            done, running = wait(
+                running,
+                timeout=(
+                    self.hedge_after_ms / 1000
+                    if self.hedge_after_ms is not None and attempts <= self.retries
+                    else None
+                ),
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                running.add(self._executor.submit(self._request, data))
+                attempts += 1
+                continue
+
+            # Return the first successful response:
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as exception:
+                    if not self._is_retryable(exception=exception):
+                        raise
+                    error = exception
+
+            # Retry the failed request (unless a hedged request is still running):
+            if not running and attempts <= self.retries:
+                running.add(self._executor.submit(self._request, data))
+                attempts += 1
+        raise error
+
+    async def invoke_async(self, body: Dict) -> Dict:
+        """
+        Send the request body to the remote model like `invoke`, without blocking the event loop - the requests run on
+        the client's pool threads and are awaited.
+
+        :param body: The request body - `{"inputs": [[...], ...]}`.
+
+        :returns: The response body.
+
+        :raise requests.RequestException: If the request failed (after all the retries).
+        """
+        loop = asyncio.get_running_loop()
+        data = encode_inputs(body=body, payload=self.payload)
+
+        def submit() -> asyncio.Future:
+            return asyncio.wrap_future(
+                self._executor.submit(self._request, data), loop=loop
+            )
+
+        running = {submit()}
+        attempts = 1
+        error = None
+        while running:
+            # Wait for the first response, or until it is time to hedge:
+            done, running = await asyncio.wait(
+                running,
+                timeout=(
+                    self.hedge_after_ms / 1000
+                    if self.hedge_after_ms is not None and attempts <= self.retries
+                    else None
+                ),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                running.add(submit())
+                attempts += 1
+                continue
+
+            # Return the first successful response:
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as exception:
+                    if not self._is_retryable(exception=exception):
+                        raise
+                    error = exception
+
+            # Retry the failed request (unless a hedged request is still running):
+            if not running and attempts <= self.retries:
+                running.add(submit())
+                attempts += 1
+        raise error
+
+    def _request(self, data: bytes) -> Dict:
+        response = self._session.request(
+            self.method,
+            self.url,
+            data=data,
+            headers={"Content-Type": PAYLOAD_CONTENT_TYPES[self.payload]},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return decode_outputs(
+            body=response.content,
+            content_type=response.headers.get("Content-Type", ""),
+        )
+
+    @staticmethod
+    def _is_retryable(exception: requests.RequestException) -> bool:
+        if isinstance(exception, requests.HTTPError):
+            return (
+                exception.response.status_code == 429
+                or exception.response.status_code >= 500
+            )
+        return isinstance(exception, (requests.ConnectionError, requests.Timeout))
+
+
+class LocalModelClient:
+    """
+    A client running the model server class in process instead of over the network, with the same `invoke` interface
+    as `RemoteModelClient`.
+
+    The model server is loaded once per worker process and shared by all the steps and threads using the same model
+    with the same server settings (the model is only read by the predictions), and it is warmed up with a prediction right after loading, so the
+    first event does not pay for the lazy initializations.
+    """
+
+    # The loaded model servers of this process, by their class, model path, name and class arguments:
+    _servers = {}
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_path: str,
+        model_class: str = "mlrun.frameworks.lgbm.LGBMModelServer",
+        model_name: str = "model",
+        context=None,
+        warm_up: bool = True,
+        **class_args,
+    ):
+        """
+        Initialize the client, loading the model server if it was not loaded in this process yet.
+
+        :param model_path:  The model's path or store uri.
+        :param model_class: The model server class, or its full import path. Default:
+                            "mlrun.frameworks.lgbm.LGBMModelServer".
+        :param model_name:  The model server's name. Default: "model".
+        :param context:     The serving context.
+        :param warm_up:     Whether to warm the model up with a prediction after loading it. Default: True.
+        :param class_args:  Additional keyword arguments of the model server class.
+        """
+        if isinstance(model_class, str):
+            module_name, class_name = model_class.rsplit(".", 1)
+            model_class = getattr(importlib.import_module(module_name), class_name)
+
+        # The class arguments may not be hashable (for example a dictionary), so they are keyed by their repr:
+        key = (model_class, model_path, model_name, repr(sorted(class_args.items())))
+        with self._lock:
+            if key not in self._servers:
+                server = model_class(
+                    context=context,
+                    name=model_name,
+                    model_path=model_path,
+                    **class_args,
+                )
+                server.load()
+                if warm_up:
+                    self._warm_up(server=server)
+                self._servers[key] = server
+        self._server = self._servers[key]
+
+    def invoke(self, body: Dict) -> Dict:
+        """
+        Predict the request body with the in process model server.
+
+        :param body: The request body - `{"inputs": [[...], ...]}`.
+
+        :returns: The response body - `{"outputs": [...]}`.
+        """
+        return {"outputs": self._server.predict(body)}
+
+    async def invoke_async(self, body: Dict) -> Dict:
+        """
+        Predict the request body like `invoke`, on a worker thread so the event loop is not blocked.
+
+        :param body: The request body - `{"inputs": [[...], ...]}`.
+
+        :returns: The response body - `{"outputs": [...]}`.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.invoke, body)
+
+    @staticmethod
+    def _warm_up(server):
+        # Predict a single row of zeros, if the model's number of features is known:
+        model = server.model
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is None and hasattr(model, "num_feature"):
+            n_features = model.num_feature()
+        if n_features:
+            server.predict({"inputs": [[0.0] * n_features]})
+
+
+def get_model_client(
+    context=None,
+    url: str = None,
+    model_path: str = None,
+    mode: str = None,
+    model_class: str = "mlrun.frameworks.lgbm.LGBMModelServer",
+    model_name: str = "model",
+    **kwargs,
+) -> Union[RemoteModelClient, LocalModelClient]:
+    """Get a client of the model, running remotely or in process by the given mode
+
+    :param context: the serving context
+    :param url: the remote model's infer url (for the "remote" mode)
+    :param model_path: the model's path or store uri (for the "local" mode)
+    :param mode: "remote" or "local", default: the `MODEL_EXECUTION` environment variable, or "remote" if not set
+    :param model_class: the model server class of the "local" mode (see `LocalModelClient`)
+    :param model_name: the model server's name of the "local" mode
+    :param kwargs: the settings of the mode's client - of the "remote" mode (see `RemoteModelClient`), or `warm_up`
+        and the model server class arguments of the "local" mode (see `LocalModelClient`), settings given as None
+        are left to the client's defaults
+
+    :raise ValueError: if the mode is unknown, or remote client settings are given in the "local" mode
+    """
+    mode = mode or os.environ.get(MODEL_EXECUTION_ENV, "remote")
+    kwargs = {name: value for name, value in kwargs.items() if value is not None}
+    if mode == "local":
+        remote_settings = [name for name in kwargs if name in REMOTE_CLIENT_SETTINGS]
+        if remote_settings:
+            raise ValueError(
+                f"The settings {remote_settings} apply only to the 'remote' mode, "
+                "they can't be used in the 'local' mode"
+            )
+        return LocalModelClient(
+            model_path=model_path,
+            model_class=model_class,
+            model_name=model_name,
+            context=context,
+            **kwargs,
+        )
+    if mode == "remote":
+        return RemoteModelClient(url=url, **kwargs)
+    raise ValueError(f"mode must be 'remote' or 'local', given: '{mode}'")
+
+
+def encode_inputs(body: Dict, payload: str = "json") -> bytes:
+    """Encode a model request body
+
+    :param body: The request body - `{"inputs": [[...], ...]}`
+    :param payload: "json", "msgpack" or "numpy" (only the inputs are sent, as a float64 `.npy` array)
+    """
+    if payload == "msgpack":
+        return msgpack.packb(body)
+    if payload == "numpy":
+        buffer = io.BytesIO()
+        np.save(
+            buffer, np.asarray(body["inputs"], dtype=np.float64), allow_pickle=False
+        )
+        return buffer.getvalue()
+    return json.dumps(body).encode()
+
+
+def decode_inputs(body: bytes, content_type: str) -> Dict:
+    """Decode a model request body encoded by `encode_inputs`, for a remote model server receiving binary payloads
+
+    :param body: The raw request body
+    :param content_type: The request's content type
+
+    :return the request body - `{"inputs": ...}` (a NumPy array for the "numpy" payload)
+    """
+    if content_type.startswith(PAYLOAD_CONTENT_TYPES["numpy"]):
+        return {"inputs": np.load(io.BytesIO(body), allow_pickle=False)}
+    if content_type.startswith(PAYLOAD_CONTENT_TYPES["msgpack"]):
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def decode_outputs(body: bytes, content_type: str) -> Dict:
+    """Decode a model response body, in JSON, msgpack or the NumPy `.npy` format of the outputs array
+
+    :param body: The raw response body
+    :param content_type: The response's content type
+
+    :return the response body - `{"outputs": ...}`
+    """
+    if content_type.startswith(PAYLOAD_CONTENT_TYPES["numpy"]):
+        return {"outputs": np.load(io.BytesIO(body), allow_pickle=False)}
+    if content_type.startswith(PAYLOAD_CONTENT_TYPES["msgpack"]):
+        return msgpack.unpackb(body)
+    return json.loads(body)
+
+
+def batch_preprocess(events: List[Dict]) -> Dict:
+    """Run the feature steps on a batch of events at once and structure them as a multi rows body for the model
+
+    The features are the same, and in the same order, as the ones of each event going through the graph steps one by
+    one (`add_airport_dist` -> `radian_conv_step` -> `sphere_dist_bear_step` -> `sphere_dist_step` -> the datetime
+    parts -> `preprocess`).
+
+    :param events: The events bodies
+    """
+    # The steps are called undecorated (`__wrapped__`, see `timed_step`), the batch is timed as a whole by
+    # `MicroBatchPredict` so the graph steps metrics count only the events that went through them:
+    df = pd.DataFrame(events)
+    for step in [
+        add_airport_dist,
+        radian_conv_step,
+        sphere_dist_bear_step,
+        sphere_dist_step,
+    ]:
+        df = step.__wrapped__(df)
+    pickup_datetime = pd.to_datetime(df["pickup_datetime"], format="mixed", utc=True)
+    for part, values in [
+        ("hour", pickup_datetime.dt.hour),
+        ("day", pickup_datetime.dt.day),
+        ("month", pickup_datetime.dt.month),
+        ("day_of_week", pickup_datetime.dt.dayofweek),
+        ("year", pickup_datetime.dt.year),
+    ]:
+        df[f"pickup_datetime_{part}"] = values
+    df = df.drop(columns=["pickup_datetime", "key"])
+    return {"inputs": df.to_numpy().tolist()}
+
+
+# ---- CONSTANTS -------
+# Earth radius (km)
+R_EARTH = 6371
+
+# Airports (and landmarks) coordinates, the features are the distance of the ride through each of them
+AIRPORTS_COORDS = {
+    "jfk": (40.639722, -73.778889),  # John F. Kennedy International Airport
+    "ewr": (40.6925, -74.168611),  # Newark Liberty International Airport
+    "lga": (40.77725, -73.872611),  # LaGuardia Airport
+    "sol": (40.6892, -74.0445),  # Statue of Liberty
+    "nyc": (40.7141667, -74.0063889),  # Newyork Central
+}
+
+# The airports trig terms of the per event distances (see `add_airport_dist_event`): the sine and cosine of the half
+# latitude and half longitude, and the cosine of the latitude (radians)
+AIRPORTS_TRIG = {
+    airport: (
+        math.sin(math.radians(lat) / 2.0),
+        math.cos(math.radians(lat) / 2.0),
+        math.sin(math.radians(lon) / 2.0),
+        math.cos(math.radians(lon) / 2.0),
+        math.cos(math.radians(lat)),
+    )
+    for airport, (lat, lon) in AIRPORTS_COORDS.items()
+}
 
 
 # ---- STEPS -------
+# The steps run on a dataframe, or on a single event's dictionary at serving time, where they use the scalar `math`
+# versions (`*_event` and `*_scalar`) as NumPy's per call overhead on scalars is much larger than the arithmetic. The
+# graph steps record their wall time and errors in `STEPS_METRICS` (see `timed_step`).
 def clean_df(df):
     if "fare_amount" in df.columns:
         return df[
@@ -47,6 +1023,7 @@ def clean_df(df):
         ]
 
 
+@timed_step()
 def add_airport_dist(df):
     """
     Return minumum distance from pickup or dropoff coordinates to each airport.
@@ -56,6 +1033,9 @@ def add_airport_dist(df):
     SOL: Statue of Liberty
     NYC: Newyork Central
     """
+    if isinstance(df, dict):
+        return add_airport_dist_event(df)
+
     jfk_coord = (40.639722, -73.778889)
     ewr_coord = (40.6925, -74.168611)
     lga_coord = (40.77725, -73.872611)
@@ -100,6 +1080,46 @@ def add_datetime_info(df):
     return df
 
 
+def add_airport_dist_event(event):
+    """
+    The per event version of `add_airport_dist`. The coordinates' half angles trig terms are calculated once and reused
+    by all the airports, using the difference identity sin((a - b) / 2) = sin(a / 2)cos(b / 2) - cos(a / 2)sin(b / 2)
+    with the precomputed `AIRPORTS_TRIG`.
+    """
+    points = []
+    for lat, lon in [
+        (event["pickup_latitude"], event["pickup_longitude"]),
+        (event["dropoff_latitude"], event["dropoff_longitude"]),
+    ]:
+        lat, lon = math.radians(lat), math.radians(lon)
+        points.append(
+            (
+                math.sin(lat / 2.0),
+                math.cos(lat / 2.0),
+                math.sin(lon / 2.0),
+                math.cos(lon / 2.0),
+                math.cos(lat),
+            )
+        )
+
+    for airport, (
+        airport_sin_lat,
+        airport_cos_lat,
+        airport_sin_lon,
+        airport_cos_lon,
+        airport_cos,
+    ) in AIRPORTS_TRIG.items():
+        dist = 0.0
+        for sin_lat, cos_lat, sin_lon, cos_lon, cos in points:
+            sin_dlat = sin_lat * airport_cos_lat - cos_lat * airport_sin_lat
+            sin_dlon = sin_lon * airport_cos_lon - cos_lon * airport_sin_lon
+            a = sin_dlat * sin_dlat + cos * airport_cos * sin_dlon * sin_dlon
+            dist += 2 * R_EARTH * math.asin(math.sqrt(a))
+        event[f"{airport}_dist"] = dist
+    return event
+
+
+@timed_step()
 def radian_conv_step(df):
     features = [
         "pickup_latitude",
@@ -107,12 +1127,22 @@ def radian_conv_step(df):
         "dropoff_latitude",
         "dropoff_longitude",
     ]
+    radians = math.radians if isinstance(df, dict) else np.radians
     for feature in features:
-        df[feature] = np.radians(df[feature])
+        df[feature] = radians(df[feature])
     return df
 
 
+@timed_step()
 def sphere_dist_bear_step(df):
+    if isinstance(df, dict):
+        df["bearing"] = sphere_dist_bear_scalar(
+            df["pickup_latitude"],
+            df["pickup_longitude"],
+            df["dropoff_latitude"],
+            df["dropoff_longitude"],
+        )
+        return df
     df["bearing"] = sphere_dist_bear(
         df["pickup_latitude"],
         df["pickup_longitude"],
@@ -122,7 +1152,16 @@ def sphere_dist_bear_step(df):
     return df
 
 
+@timed_step()
 def sphere_dist_step(df):
+    if isinstance(df, dict):
+        df["distance"] = sphere_dist_scalar(
+            df["pickup_latitude"],
+            df["pickup_longitude"],
+            df["dropoff_latitude"],
+            df["dropoff_longitude"],
+        )
+        return df
     df["distance"] = sphere_dist(
         df["pickup_latitude"],
         df["pickup_longitude"],
@@ -171,3 +1210,34 @@ def sphere_dist_bear(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon):
         - np.sin(pickup_lat) * np.cos(dropoff_lat) * np.cos(dlon),
     )
     return a
+
+
+def sphere_dist_scalar(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon):
+    """
+    The scalar version of `sphere_dist`.
+    """
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon = map(
+        math.radians, [pickup_lat, pickup_lon, dropoff_lat, dropoff_lon]
+    )
+    a = (
+        math.sin((dropoff_lat - pickup_lat) / 2.0) ** 2
+        + math.cos(pickup_lat)
+        * math.cos(dropoff_lat)
+        * math.sin((dropoff_lon - pickup_lon) / 2.0) ** 2
+    )
+    return 2 * R_EARTH * math.asin(math.sqrt(a))
+
+
+def sphere_dist_bear_scalar(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon):
+    """
+    The scalar version of `sphere_dist_bear`.
+    """
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon = map(
+        math.radians, [pickup_lat, pickup_lon, dropoff_lat, dropoff_lon]
+    )
+    dlon = pickup_lon - dropoff_lon
+    return math.atan2(
+        math.sin(dlon * math.cos(dropoff_lat)),
+        math.cos(pickup_lat) * math.sin(dropoff_lat)
+        - math.sin(pickup_lat) * math.cos(dropoff_lat) * math.cos(dlon),
+    )
@@ -1,11 +1,35 @@
+import bisect
+import itertools
+import math
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pickle import dumps, load
+
 import lightgbm as lgbm
 
 # [MLRun] Import MLRun:
 import mlrun
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 from mlrun.frameworks.lgbm import apply_mlrun
 from sklearn.model_selection import train_test_split
 
+# The default search space of the hyperparameters sweep:
+SWEEP_SPACE = {
+    "boosting_type": ["gbdt"],
+    "subsample": [0.6, 0.8, 1.0],
+    "min_split_gain": [0.0, 0.5],
+    "min_child_samples": [10, 20, 50],
+}
+
+# The train and validation datasets of a sweep worker process (loaded once per process by `init_sweep_worker`):
+SWEEP_DATASETS = {}
+
 
 @mlrun.handler()
 def train(
@@ -39,3 +63,521 @@ def train(
     model.fit(X=x_train, y=y_train)
 
     return model
+
+
+def train_incremental(
+    context,
+    train_set: mlrun.DataItem,
+    label_column: str = "fare_amount",
+    model_name: str = "lgbm_ny_taxi",
+    valid_set: mlrun.DataItem = None,
+    init_model: str = None,
+    binary_cache: str = None,
+    chunked: bool = True,
+    batch_size: int = 65536,
+    num_boost_round: int = 100,
+    early_stopping_rounds: int = None,
+    boosting_type: str = "gbdt",
+    subsample: float = 0.8,
+    min_split_gain: float = 0.5,
+    min_child_samples: int = 10,
+):
+    """A function which trains the NY taxi LightGBM model out of core, and optionally continues training a previous one
+
+    The LightGBM dataset is built without pandas copies, so the memory is about a single (binned) copy of the features:
+
+    * A LightGBM binary dataset file (".bin") is loaded as is.
+    * A Parquet file is read row group by row group while building the dataset if `chunked` (see `ParquetSequence`).
+    * Otherwise, the file (Parquet or CSV) is read into Arrow column arrays and passed to LightGBM as is.
+
+    For daily retraining, pass the previous model as `init_model` and only the new data as `train_set` - the new trees
+    are boosted on top of the previous model's ones. LightGBM starts from the previous model's predictions of the data,
+    which it can only compute for data in memory, so in this mode the data is always read into Arrow column arrays
+    (`chunked` and `binary_cache` are ignored).
+
+    :param context: MLRun context
+    :param train_set: the train dataset (Parquet, CSV or a LightGBM binary dataset)
+    :param label_column: the label column name
+    :param model_name: the name to log the model with
+    :param valid_set: an optional validation dataset (same formats), for the validation score and early stopping
+    :param init_model: an optional model to continue training - a model store uri or a path to a LightGBM model text
+                       file or a pickled LightGBM model
+    :param binary_cache: an optional path of a LightGBM binary dataset file caching the train set, it is loaded if it
+                         exists and written after building the train set otherwise (the cache is not checked to match
+                         the train set)
+    :param chunked: whether to read Parquet files row group by row group
+    :param batch_size: the amount of rows LightGBM reads at once when building a chunked dataset
+    :param num_boost_round: the amount of boosting rounds (new trees)
+    :param early_stopping_rounds: stop if the validation score did not improve for this amount of rounds
+    :param boosting_type: LightGBM's boosting type
+    :param subsample: LightGBM's subsample (bagging fraction)
+    :param min_split_gain: LightGBM's minimal gain to split
+    :param min_child_samples: LightGBM's minimal amount of samples in a leaf
+
+    logs the model (a pickled `lightgbm.Booster`) and the results num_trees and, with a validation set, valid_l2
+    """
+    params = {
+        "objective": "regression",
+        "boosting_type": boosting_type,
+        "subsample": subsample,
+        "min_split_gain": min_split_gain,
+        "min_child_samples": min_child_samples,
+        "verbosity": -1,
+    }
+
+    # Build (or load) the datasets:
+    if init_model is not None:
+        if binary_cache is not None:
+            context.logger.warn(
+                "the binary dataset cache is ignored when continuing a model training"
+            )
+            binary_cache = None
+        chunked = False
+    if binary_cache is not None and os.path.exists(binary_cache):
+        context.logger.info(f"loading the binary dataset cache '{binary_cache}'")
+        train_dataset = lgbm.Dataset(binary_cache, params=params)
+    else:
+        train_path = train_set.local()
+        if init_model is not None and train_path.endswith(".bin"):
+            raise ValueError(
+                "a model training can not be continued on a LightGBM binary dataset"
+            )
+        train_dataset = load_dataset(
+            path=train_path,
+            label_column=label_column,
+            params=params,
+            chunked=chunked,
+            batch_size=batch_size,
+        )
+        if binary_cache is not None:
+            train_dataset.construct().save_binary(binary_cache)
+    valid_sets = []
+    if valid_set is not None:
+        valid_sets.append(
+            load_dataset(
+                path=valid_set.local(),
+                label_column=label_column,
+                params=params,
+                chunked=chunked,
+                batch_size=batch_size,
+                reference=train_dataset,
+            )
+        )
+
+    # Train (on top of the initial model if given):
+    booster = lgbm.train(
+        params,
+        train_dataset,
+        num_boost_round=num_boost_round,
+        valid_sets=valid_sets,
+        valid_names=["valid"],
+        init_model=load_booster(init_model) if init_model is not None else None,
+        callbacks=(
+            [lgbm.early_stopping(early_stopping_rounds, verbose=False)]
+            if early_stopping_rounds is not None and valid_sets
+            else []
+        ),
+    )
+
+    context.log_result("num_trees", booster.num_trees())
+    if valid_sets:
+        context.log_result("valid_l2", booster.best_score["valid"]["l2"])
+    context.log_model(
+        model_name,
+        body=dumps(booster),
+        model_file=f"{model_name}.pkl",
+        framework="lightgbm",
+        algorithm="Booster",
+    )
+
+
+def sweep(
+    context,
+    train_set: mlrun.DataItem,
+    label_column: str = "fare_amount",
+    model_name: str = "lgbm_ny_taxi",
+    boosting_type: list = None,
+    subsample: list = None,
+    min_split_gain: list = None,
+    min_child_samples: list = None,
+    strategy: str = "grid",
+    max_trials: int = 20,
+    num_boost_round: int = 200,
+    min_boost_round: int = 25,
+    reduction_factor: int = 3,
+    early_stopping_rounds: int = None,
+    workers: int = None,
+    threads: int = None,
+    test_size: float = 0.10,
+    random_state: int = 123,
+    chunked: bool = True,
+    batch_size: int = 65536,
+):
+    """A function which tunes the hyperparameters of `train` in a single run
+
+    The dataset is read, binned and split (like in `train`) once, and saved as LightGBM binary datasets that each
+    worker process loads once. The trials then run in a process pool with successive halving - all the trials are
+    trained for `min_boost_round` rounds, the best 1 / `reduction_factor` of them are trained again for
+    `reduction_factor` times more rounds and so on up to `num_boost_round` rounds. The threads are split between the
+    trials running at once, so the fewer trials of the later rungs get more threads each.
+
+    Each hyperparameter is a list of values to search. `subsample` is applied on every iteration (`subsample_freq` is
+    1, as LightGBM ignores it otherwise).
+
+    :param context: MLRun context
+    :param train_set: the train dataset (Parquet or CSV)
+    :param label_column: the label column name
+    :param model_name: the name to log the best model with
+    :param boosting_type: the boosting types to search
+    :param subsample: the subsample values to search
+    :param min_split_gain: the minimal split gain values to search
+    :param min_child_samples: the minimal child samples values to search
+    :param strategy: "grid" to try all the combinations or "random" to try `max_trials` random ones of them
+    :param max_trials: the amount of trials of a random search
+    :param num_boost_round: the amount of boosting rounds of the last rung
+    :param min_boost_round: the amount of boosting rounds of the first rung
+    :param reduction_factor: the factor to reduce the trials and increase the rounds by on each rung
+    :param early_stopping_rounds: stop a trial if its validation score did not improve for this amount of rounds
+    :param workers: the amount of worker processes (default to the amount of CPUs, up to the amount of trials)
+    :param threads: the amount of threads of each trial (default to the CPUs divided by the trials running at once)
+    :param test_size: the validation set size, as in `train`
+    :param random_state: the split and the random search seed, as in `train`
+    :param chunked: whether to read Parquet files row group by row group
+    :param batch_size: the amount of rows LightGBM reads at once when building a chunked dataset
+
+    logs the trials dataset (a row per trial and rung it was trained in), the best hyperparameters and validation score
+    as results and the best model (a pickled `lightgbm.Booster`)
+    """
+    # Prepare the trials:
+    space = {
+        name: values if values is not None else SWEEP_SPACE[name]
+        for name, values in [
+            ("boosting_type", boosting_type),
+            ("subsample", subsample),
+            ("min_split_gain", min_split_gain),
+            ("min_child_samples", min_child_samples),
+        ]
+    }
+    trials = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    if strategy == "random":
+        trials = random.Random(random_state).sample(
+            trials, min(max_trials, len(trials))
+        )
+    elif strategy != "grid":
+        raise ValueError(f"unknown strategy '{strategy}', expected 'grid' or 'random'")
+    cpus = os.cpu_count() or 1
+    workers = workers or min(cpus, len(trials))
+
+    # The dataset parameters must allow changing the trials parameters without rebuilding the dataset:
+    dataset_params = {"feature_pre_filter": False, "verbosity": -1}
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Bin and split the dataset once, and save it for the workers:
+        dataset = load_dataset(
+            path=train_set.local(),
+            label_column=label_column,
+            params=dataset_params,
+            chunked=chunked,
+            batch_size=batch_size,
+        ).construct()
+        train_indices, valid_indices = train_test_split(
+            np.arange(dataset.num_data()),
+            random_state=random_state,
+            test_size=test_size,
+        )
+        train_path = os.path.join(directory, "train.bin")
+        valid_path = os.path.join(directory, "valid.bin")
+        dataset.subset(np.sort(train_indices)).construct().save_binary(train_path)
+        dataset.subset(np.sort(valid_indices)).construct().save_binary(valid_path)
+        del dataset
+
+        # Run the rungs of the successive halving:
+        results = []
+        rung_trials = list(range(len(trials)))
+        rounds = min(min_boost_round, num_boost_round)
+        rung = 0
+        best_model = None
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_sweep_worker,
+            initargs=(train_path, valid_path, dataset_params),
+        ) as executor:
+            while True:
+                last_rung = rounds >= num_boost_round or len(rung_trials) == 1
+                if last_rung:
+                    rounds = num_boost_round
+                trial_threads = threads or max(
+                    1, cpus // min(workers, len(rung_trials))
+                )
+                context.logger.info(
+                    f"sweep rung {rung}: {len(rung_trials)} trials of {rounds} rounds, {trial_threads} threads each"
+                )
+                futures = [
+                    executor.submit(
+                        run_trial,
+                        {
+                            "objective": "regression",
+                            "subsample_freq": 1,
+                            "seed": random_state,
+                            "num_threads": trial_threads,
+                            "verbosity": -1,
+                            **dataset_params,
+                            **trials[i],
+                        },
+                        rounds,
+                        early_stopping_rounds,
+                        last_rung,
+                    )
+                    for i in rung_trials
+                ]
+                scores = {}
+                for i, future in zip(rung_trials, futures):
+                    score, iterations, model = future.result()
+                    scores[i] = score
+                    results.append(
+                        {
+                            "trial": i,
+                            "rung": rung,
+                            **trials[i],
+                            "rounds": iterations,
+                            "valid_l2": score,
+                        }
+                    )
+                    if model is not None and (
+                        best_model is None or score < best_model[0]
+                    ):
+                        best_model = (score, i, model)
+                if last_rung:
+                    break
+                rung_trials = sorted(rung_trials, key=scores.get)[
+                    : max(1, math.ceil(len(rung_trials) / reduction_factor))
+                ]
+                rounds *= reduction_factor
+                rung += 1
+
+    # Log all the trials and the best one:
+    best_score, best_trial, best_model = best_model
+    context.log_dataset(
+        "trials",
+        df=pd.DataFrame(results).set_index(["trial", "rung"]),
+        format="csv",
+    )
+    context.log_results(
+        {
+            "best_trial": best_trial,
+            "best_valid_l2": best_score,
+            **{f"best_{name}": value for name, value in trials[best_trial].items()},
+        }
+    )
+    context.log_model(
+        model_name,
+        body=dumps(lgbm.Booster(model_str=best_model)),
+        model_file=f"{model_name}.pkl",
+        framework="lightgbm",
+        algorithm="Booster",
+        parameters=trials[best_trial],
+    )
+
+
+def init_sweep_worker(train_path, valid_path, params):
+    """A function which loads the sweep's binary datasets once in a worker process
+
+    :param train_path: the train binary dataset path
+    :param valid_path: the validation binary dataset path
+    :param params: the datasets parameters
+    """
+    train_dataset = lgbm.Dataset(train_path, params=params).construct()
+    SWEEP_DATASETS["train"] = train_dataset
+    SWEEP_DATASETS["valid"] = lgbm.Dataset(
+        valid_path, reference=train_dataset, params=params
+    ).construct()
+
+
+def run_trial(params, num_boost_round, early_stopping_rounds=None, return_model=False):
+    """A function which trains a sweep trial on the worker process' datasets
+
+    :param params: the LightGBM parameters
+    :param num_boost_round: the amount of boosting rounds
+    :param early_stopping_rounds: stop if the validation score did not improve for this amount of rounds
+    :param return_model: whether to return the model
+
+    :return the validation l2 score, the amount of rounds and the model string (if `return_model`, None otherwise)
+    """
+    booster = lgbm.train(
+        params,
+        SWEEP_DATASETS["train"],
+        num_boost_round=num_boost_round,
+        valid_sets=[SWEEP_DATASETS["valid"]],
+        valid_names=["valid"],
+        callbacks=(
+            [lgbm.early_stopping(early_stopping_rounds, verbose=False)]
+            if early_stopping_rounds is not None
+            else []
+        ),
+    )
+    iterations = booster.best_iteration or booster.current_iteration()
+    return (
+        booster.best_score["valid"]["l2"],
+        iterations,
+        booster.model_to_string(num_iteration=iterations) if return_model else None,
+    )
+
+
+def load_dataset(
+    path, label_column, params=None, chunked=True, batch_size=65536, reference=None
+):
+    """Build a LightGBM dataset of a file without pandas copies
+
+    :param path: the local path of the dataset file - a LightGBM binary dataset (".bin"), Parquet (".parquet" or ".pq")
+                 or CSV
+    :param label_column: the label column name
+    :param params: the LightGBM parameters
+    :param chunked: whether to read Parquet files row group by row group (see `ParquetSequence`)
+    :param batch_size: the amount of rows LightGBM reads at once when building a chunked dataset
+    :param reference: the train dataset, if this is a validation dataset (to share its bins)
+
+    :return the LightGBM dataset (constructed lazily by LightGBM)
+    """
+    if path.endswith(".bin"):
+        return lgbm.Dataset(path, params=params, reference=reference)
+
+    # Read the Parquet file row group by row group:
+    is_parquet = path.endswith((".parquet", ".pq"))
+    if is_parquet and chunked:
+        features = ParquetSequence(
+            path=path, exclude_columns=[label_column], batch_size=batch_size
+        )
+        label = pq.read_table(path, columns=[label_column]).column(label_column)
+        return lgbm.Dataset(
+            features,
+            label=label.to_numpy(),
+            feature_name=features.columns,
+            params=params,
+            reference=reference,
+        )
+
+    # Read the file into Arrow column arrays (LightGBM supports only numeric columns, so categorical ones are decoded):
+    table = pq.read_table(path) if is_parquet else pa_csv.read_csv(path)
+    label = table.column(label_column)
+    table = table.drop_columns([label_column] + get_index_columns(table.schema))
+    table = pa.table(
+        [
+            (
+                column.cast(column.type.value_type)
+                if pa.types.is_dictionary(column.type)
+                else column
+            )
+            for column in table.columns
+        ],
+        names=table.column_names,
+    )
+    return lgbm.Dataset(table, label=label, params=params, reference=reference)
+
+
+def get_index_columns(schema: pa.Schema) -> list:
+    """A function which gets the columns of a pandas index stored with the data (pandas writes a non range index, like
+    the one left after cleaning rows, as "__index_level_<n>__" columns), which are not features
+
+    :param schema: the Arrow schema of the file
+
+    :return the index columns names
+    """
+    index_columns = [
+        column
+        for column in (schema.pandas_metadata or {}).get("index_columns", [])
+        # A range index is stored as metadata only:
+        if isinstance(column, str)
+    ]
+    return index_columns + [
+        column
+        for column in schema.names
+        if column.startswith("__index_level_") and column not in index_columns
+    ]
+
+
+def load_booster(model):
+    """Load a LightGBM booster to continue training
+
+    :param model: a model store uri, or a path to a LightGBM model text file or a pickled LightGBM model (a booster or a
+                  scikit-learn API model)
+
+    :return the booster
+    """
+    if model.startswith("store://"):
+        model, _, _ = mlrun.artifacts.get_model(model)
+    if model.endswith(".txt"):
+        return lgbm.Booster(model_file=model)
+    with open(model, "rb") as model_file:
+        model = load(model_file)
+    return model.booster_ if isinstance(model, lgbm.LGBMModel) else model
+
+
+class ParquetSequence(lgbm.Sequence):
+    """
+    A LightGBM sequence of the features of a Parquet file, read one row group at a time. LightGBM reads the rows in
+    order (first a sorted sample of them to find the bins, then all of them in batches), so each row group is read at
+    most twice and only a single row group is in memory.
+    """
+
+    def __init__(self, path, exclude_columns=None, batch_size=65536):
+        """
+        :param path:            The Parquet file path.
+        :param exclude_columns: Columns to exclude from the features (for example the label), the pandas index
+                                columns are always excluded.
+        :param batch_size:      The amount of rows LightGBM reads at once.
+        """
+        self._file = pq.ParquetFile(path)
+        exclude_columns = (exclude_columns or []) + get_index_columns(
+            self._file.schema_arrow
+        )
+        self.columns = [
+            column
+            for column in self._file.schema_arrow.names
+            if column not in exclude_columns
+        ]
+        self.batch_size = batch_size
+
+        # The first row of each row group:
+        self._offsets = [0]
+        for i in range(self._file.num_row_groups):
+            self._offsets.append(
+                self._offsets[-1] + self._file.metadata.row_group(i).num_rows
+            )
+        self._cached_index = None
+        self._cached_rows = None
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self))
+            parts = []
+            while start < stop:
+                row_group = bisect.bisect_right(self._offsets, start) - 1
+                end = min(stop, self._offsets[row_group + 1])
+                rows = self._read_row_group(row_group)
+                parts.append(
+                    rows[
+                        start
+                        - self._offsets[row_group] : end
+                        - self._offsets[row_group]
+                    ]
+                )
+                start = end
+            return parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if isinstance(idx, list):
+            return np.array([self[i] for i in idx])
+        row_group = bisect.bisect_right(self._offsets, idx) - 1
+        return self._read_row_group(row_group)[idx - self._offsets[row_group]]
+
+    def _read_row_group(self, index):
+        if self._cached_index != index:
+            table = self._file.read_row_group(index, columns=self.columns)
+            rows = np.empty((table.num_rows, len(self.columns)), dtype=np.float64)
+            for i, column in enumerate(table.columns):
+                if pa.types.is_dictionary(column.type):
+                    column = column.cast(column.type.value_type)
+                rows[:, i] = column.to_numpy()
+            self._cached_index, self._cached_rows = index, rows
+        return self._cached_rows
@@ -0,0 +1,642 @@
+from pickle import load
+from typing import Dict, List, Tuple, Union
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import mlrun
+import numpy as np
+from mlrun.serving.v2_serving import V2ModelServer
+
+# The flat trees file layout: the magic, the header length (little endian uint64), the JSON header and the arrays, each
+# aligned to `FLAT_TREES_ALIGNMENT` bytes (see `save_flat_trees`):
+FLAT_TREES_MAGIC = b"FLATTREE"
+FLAT_TREES_ALIGNMENT = 64
+
+# The flat trees file suffix:
+FLAT_TREES_SUFFIX = ".trees"
+
+# The node decision flags (the same as LightGBM's decision type) - the first bit marks a categorical split, the second
+# marks missing values going left and the next 2 bits are the missing values type:
+CATEGORICAL_FLAG = 1
+DEFAULT_LEFT_FLAG = 2
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+
+# LightGBM's threshold of the zero missing type:
+ZERO_THRESHOLD = 1e-35
+
+# The LightGBM objectives predicting the raw scores (unless trained with `reg_sqrt`, see `flatten_lightgbm`):
+LIGHTGBM_IDENTITY_OBJECTIVES = [
+    "regression",
+    "regression_l1",
+    "huber",
+    "fair",
+    "quantile",
+    "mape",
+    "lambdarank",
+    "rank_xendcg",
+    "custom",
+]
+
+
+class FlatTreeEnsemble:
+    """
+    A tree ensemble (LightGBM, or scikit-learn's gradient boosting) as flat NumPy arrays of its nodes, with a vectorized
+    NumPy predictor. The arrays are memory mapped from the flat trees file with no copies, so loading takes a few
+    milliseconds, needs neither LightGBM nor scikit-learn, and the replicas on the same node share the model's pages.
+
+    The predictions go down all the trees of a chunk of rows at once, one tree level per step, with the same decisions
+    as LightGBM.
+    """
+
+    # The amount of (row, tree) pairs to predict at once, bounding the prediction's temporary memory:
+    CHUNK_SIZE = 1 << 18
+
+    def __init__(
+        self, arrays: Dict[str, np.ndarray], meta: dict, buffer: mmap.mmap = None
+    ):
+        """
+        Initialize the ensemble of the given arrays.
+
+        :param arrays: The nodes arrays:
+
+                       * feature - The split feature of each node (int64, like all the indices, for NumPy's indexing).
+                       * threshold - The split threshold of each node, or its categories bitset index (float64).
+                       * decision - The decision flags of each node (uint8).
+                       * children - The left and right child of each node, both the node itself for leaves (int64).
+                       * value - The value of each leaf (float64).
+                       * roots - The root node of each tree (int64), the trees of class `k` are `k, k + num_class, ...`.
+                       * cat_boundaries - The start of each categories bitset in `cat_threshold` (int32).
+                       * cat_threshold - The categories bitsets (uint32).
+        :param meta:   The ensemble's metadata - num_class, feature_names, max_depth, base_score, link (identity,
+                       sigmoid, softmax, exp, softplus or square), sigmoid, average_output, input_dtype and optionally
+                       pandas_categorical and classes.
+        :param buffer: The memory map the arrays are of, kept open as long as the ensemble.
+        """
+        self.arrays = arrays
+        self.meta = meta
+        self._buffer = buffer
+
+        self._feature = arrays["feature"]
+        self._threshold = arrays["threshold"]
+        self._decision = arrays["decision"]
+        self._children = arrays["children"]
+        self._value = arrays["value"]
+        self._roots = arrays["roots"]
+        self._cat_boundaries = arrays["cat_boundaries"]
+        self._cat_threshold = arrays["cat_threshold"]
+
+        # Precompute the decisions of each node (not saved, as they are cheap to compute and only used in memory):
+        self._is_leaf = self._children[:, 0] == np.arange(len(self._children))
+        self._is_categorical = (self._decision & CATEGORICAL_FLAG) != 0
+        default_right = (self._decision & DEFAULT_LEFT_FLAG) == 0
+        missing_type = self._decision >> 2
+        # Missing values are zeros for the None type, and go the default way for the others:
+        self._nan_go_right = np.where(
+            missing_type == MISSING_TYPES["None"], self._threshold < 0.0, default_right
+        )
+        # Zeros go the default way for the Zero type:
+        self._zero_nodes = (
+            missing_type == MISSING_TYPES["Zero"]
+        ) & ~self._is_categorical
+        self._zero_go_right = default_right
+        self._has_zero = bool(self._zero_nodes.any())
+        self._has_categorical = bool(self._is_categorical.any())
+
+    @classmethod
+    def load(cls, path: str) -> "FlatTreeEnsemble":
+        """
+        Load a flat trees file (see `save_flat_trees`), memory mapping its arrays.
+
+        :param path: The flat trees file path.
+
+        :returns: The ensemble.
+        """
+        with open(path, "rb") as flat_trees_file:
+            buffer = mmap.mmap(flat_trees_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[: len(FLAT_TREES_MAGIC)] != FLAT_TREES_MAGIC:
+            buffer.close()
+            raise ValueError(f"'{path}' is not a flat trees file")
+        (header_length,) = struct.unpack_from("<Q", buffer, len(FLAT_TREES_MAGIC))
+        header_start = len(FLAT_TREES_MAGIC) + 8
+        header = json.loads(bytes(buffer[header_start : header_start + header_length]))
+        data_start = align(header_start + header_length)
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            if count == 0:
+                arrays[name] = np.empty(spec["shape"], dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+        return cls(arrays=arrays, meta=header["meta"], buffer=buffer)
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.meta["feature_names"]
+
+    def num_feature(self) -> int:
+        return len(self.meta["feature_names"])
+
+    def num_trees(self) -> int:
+        return len(self._roots)
+
+    def predict(self, inputs, raw_score: bool = False) -> np.ndarray:
+        """
+        Predict the given rows, like LightGBM's `Booster.predict`.
+
+        :param inputs:    The rows - a 2D array or a list of rows of the features in order, or a DataFrame (its
+                          columns are reordered by the feature names, and its categorical columns are converted to
+                          the training's categories codes, like LightGBM does).
+        :param raw_score: Whether to return the raw scores, before the link function. Default: False.
+
+        :returns: The predictions - a value per row, or a row of probabilities per row for multiclass models.
+        """
+        inputs = self._to_array(inputs=inputs)
+        num_class = self.meta["num_class"]
+        num_trees = len(self._roots)
+
+        scores = np.empty((len(inputs), num_class), dtype=np.float64)
+        chunk_size = max(1, self.CHUNK_SIZE // max(1, num_trees))
+        for start in range(0, len(inputs), chunk_size):
+            rows = inputs[start : start + chunk_size]
+            leaves = self._find_leaves(rows=rows)
+            scores[start : start + chunk_size] = (
+                self._value[leaves].reshape(len(rows), -1, num_class).sum(axis=1)
+            )
+
+        scores += self.meta["base_score"]
+        if self.meta["average_output"]:
+            scores /= num_trees // num_class
+        if not raw_score:
+            scores = self._link(scores=scores)
+        return scores[:, 0] if num_class == 1 else scores
+
+    def _to_array(self, inputs) -> np.ndarray:
+        if hasattr(inputs, "columns"):
+            columns = []
+            categories = iter(self.meta.get("pandas_categorical") or [])
+            for name in self.meta["feature_names"]:
+                column = inputs[name]
+                if column.dtype.name == "category":
+                    codes = column.cat.set_categories(
+                        next(categories)
+                    ).cat.codes.to_numpy(dtype=np.float64)
+                    codes[codes < 0] = np.nan
+                    columns.append(codes)
+                else:
+                    columns.append(column.to_numpy(dtype=np.float64, na_value=np.nan))
+            inputs = np.column_stack(columns) if columns else np.empty((len(inputs), 0))
+        inputs = np.asarray(inputs, dtype=self.meta["input_dtype"])
+        if inputs.ndim == 1:
+            inputs = inputs[np.newaxis, :]
+        return inputs.astype(np.float64, copy=False)
+
+    def _find_leaves(self, rows: np.ndarray) -> np.ndarray:
+        # Go down all the trees of all the rows at once, one level per step, dropping the (row, tree) pairs that reached
+        # their leaf (the flat rows are indexed by the row's start and the feature):
+        values = rows.ravel()
+        leaves = np.tile(self._roots, len(rows))
+        pairs = np.flatnonzero(~self._is_leaf[leaves])
+        nodes = leaves[pairs]
+        row_starts = pairs // len(self._roots) * rows.shape[1]
+        has_nan = bool(np.isnan(values).any())
+        while len(nodes):
+            node_values = values[row_starts + self._feature[nodes]]
+            go_right = node_values > self._threshold[nodes]
+            if has_nan:
+                is_nan = np.isnan(node_values)
+                go_right[is_nan] = self._nan_go_right[nodes[is_nan]]
+            if self._has_zero:
+                is_zero = (np.abs(node_values) <= ZERO_THRESHOLD) & self._zero_nodes[
+                    nodes
+                ]
+                go_right[is_zero] = self._zero_go_right[nodes[is_zero]]
+            if self._has_categorical:
+                is_categorical = self._is_categorical[nodes]
+                go_right[is_categorical] = ~self._in_categories(
+                    values=node_values[is_categorical],
+                    bitsets=self._threshold[nodes[is_categorical]].astype(np.int64),
+                )
+            nodes = self._children[nodes, go_right.view(np.uint8)]
+            is_leaf = self._is_leaf[nodes]
+            if is_leaf.any():
+                leaves[pairs[is_leaf]] = nodes[is_leaf]
+                is_inner = ~is_leaf
+                pairs, nodes, row_starts = (
+                    pairs[is_inner],
+                    nodes[is_inner],
+                    row_starts[is_inner],
+                )
+        return leaves
+
+    def _in_categories(self, values: np.ndarray, bitsets: np.ndarray) -> np.ndarray:
+        # Negative and missing categories are never in the split's categories:
+        categories = np.where(np.isnan(values), -1, values).astype(np.int64)
+        start = self._cat_boundaries[bitsets]
+        words = categories // 32
+        valid = (categories >= 0) & (words < self._cat_boundaries[bitsets + 1] - start)
+        bits = self._cat_threshold[np.where(valid, start + words, 0)] >> (
+            categories % 32
+        ).astype(np.uint32)
+        return valid & ((bits & 1) == 1)
+
+    def _link(self, scores: np.ndarray) -> np.ndarray:
+        link = self.meta["link"]
+        if link == "sigmoid":
+            return 1.0 / (1.0 + np.exp(-self.meta["sigmoid"] * scores))
+        if link == "softmax":
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        if link == "exp":
+            return np.exp(scores)
+        if link == "softplus":
+            return np.log1p(np.exp(scores))
+        if link == "square":
+            return np.sign(scores) * scores * scores
+        return scores
+
+
+class FlatTreeModelServer(V2ModelServer):
+    """
+    A model server of a flat trees model (see `export_model`), predicting with NumPy only, so the serving image does
+    not need LightGBM or scikit-learn and a cold start only memory maps the model.
+    """
+
+    def load(self):
+        model_file, _ = self.get_model(suffix=FLAT_TREES_SUFFIX)
+        self.model = FlatTreeEnsemble.load(path=model_file)
+
+    def predict(self, request: dict) -> list:
+        return self.model.predict(
+            inputs=np.asarray(request["inputs"], dtype=np.float64)
+        ).tolist()
+
+
+def export_model(
+    context,
+    model: str,
+    model_name: str = None,
+    sample_set: mlrun.DataItem = None,
+    label_column: str = "fare_amount",
+    tolerance: float = 1e-6,
+):
+    """A function which exports a tree ensemble model to a flat trees file for `FlatTreeModelServer`
+
+    :param context: MLRun context
+    :param model: the model store uri - a pickled LightGBM model (a booster or a scikit-learn API model, as logged by
+                  `trainer_lgbm`) or a scikit-learn gradient boosting model
+    :param model_name: the name to log the exported model with, default: the model's name with a "_trees" suffix
+    :param sample_set: an optional dataset to check the exported model's predictions match the model's predictions on
+    :param label_column: the sample set's label column, dropped before predicting
+    :param tolerance: the maximal absolute difference allowed between the predictions
+
+    logs the flat trees model and the results num_trees, num_nodes, max_depth, model_size (bytes) and, with a sample
+    set, max_abs_diff
+    """
+    model_file, model_spec, _ = mlrun.artifacts.get_model(model)
+    source_name = (
+        model_spec.key
+        if model_spec is not None
+        else os.path.splitext(os.path.basename(model_file))[0]
+    )
+    with open(model_file, "rb") as pickled_model:
+        model_object = load(pickled_model)
+    arrays, meta = flatten_model(model=model_object)
+
+    with tempfile.TemporaryDirectory() as directory:
+        flat_trees_path = os.path.join(directory, f"model{FLAT_TREES_SUFFIX}")
+        save_flat_trees(path=flat_trees_path, arrays=arrays, meta=meta)
+        context.log_result("num_trees", len(arrays["roots"]))
+        context.log_result("num_nodes", len(arrays["feature"]))
+        context.log_result("max_depth", meta["max_depth"])
+        context.log_result("model_size", os.path.getsize(flat_trees_path))
+
+        # Check the exported model predicts like the model:
+        if sample_set is not None:
+            sample = sample_set.as_df()
+            sample = sample.drop(columns=[label_column], errors="ignore")
+            flat_trees = FlatTreeEnsemble.load(path=flat_trees_path)
+            differences = flat_trees.predict(inputs=sample) - predict_original(
+                model_object, sample
+            )
+            max_abs_diff = float(np.max(np.abs(differences)))
+            context.log_result("max_abs_diff", max_abs_diff)
+            if max_abs_diff > tolerance:
+                raise ValueError(
+                    f"the exported model's predictions differ from the model's by up to {max_abs_diff}, more than the "
+                    f"tolerance {tolerance}"
+                )
+
+        context.log_model(
+            model_name or f"{source_name}_trees",
+            model_file=flat_trees_path,
+            framework="numpy",
+            algorithm=meta["algorithm"],
+            labels={"source_model": source_name},
+        )
+
+
+def save_flat_trees(path: str, arrays: Dict[str, np.ndarray], meta: dict):
+    """A function which writes a flat trees file, to be memory mapped by `FlatTreeEnsemble.load`
+
+    :param path: the file path
+    :param arrays: the ensemble's arrays (see `FlatTreeEnsemble`)
+    :param meta: the ensemble's metadata (see `FlatTreeEnsemble`)
+    """
+    # The arrays offsets are relative to the data, which starts at the first aligned offset after the header:
+    specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = align(offset)
+        specs[name] = {
+            "dtype": array.dtype.newbyteorder("<").str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += array.nbytes
+    header = json.dumps({"meta": meta, "arrays": specs}).encode()
+    data_start = align(len(FLAT_TREES_MAGIC) + 8 + len(header))
+
+    with open(path, "wb") as flat_trees_file:
+        flat_trees_file.write(FLAT_TREES_MAGIC)
+        flat_trees_file.write(struct.pack("<Q", len(header)))
+        flat_trees_file.write(header)
+        for name, array in arrays.items():
+            flat_trees_file.write(
+                b"\0" * (data_start + specs[name]["offset"] - flat_trees_file.tell())
+            )
+            flat_trees_file.write(
+                np.ascontiguousarray(
+                    array, dtype=array.dtype.newbyteorder("<")
+                ).tobytes()
+            )
+
+
+def align(offset: int) -> int:
+    """A function which rounds an offset up to the flat trees file alignment
+
+    :param offset: the offset in bytes
+
+    :return the aligned offset
+    """
+    return -(-offset // FLAT_TREES_ALIGNMENT) * FLAT_TREES_ALIGNMENT
+
+
+def flatten_model(model) -> Tuple[Dict[str, np.ndarray], dict]:
+    """A function which converts a tree ensemble model to flat arrays
+
+    :param model: a LightGBM booster or scikit-learn API model, or a scikit-learn gradient boosting model
+
+    :return the ensemble's arrays and metadata (see `FlatTreeEnsemble`)
+    """
+    module = type(model).__module__
+    if module.startswith("lightgbm"):
+        return flatten_lightgbm(booster=getattr(model, "booster_", model))
+    if module.startswith("sklearn.ensemble"):
+        return flatten_gradient_boosting(model=model)
+    raise TypeError(
+        f"can not export a model of type {type(model).__name__}, expected LightGBM or scikit-learn's GB"
+    )
+
+
+def flatten_lightgbm(booster) -> Tuple[Dict[str, np.ndarray], dict]:
+    """A function which converts a LightGBM booster to flat arrays
+
+    :param booster: the LightGBM booster
+
+    :return the ensemble's arrays and metadata (see `FlatTreeEnsemble`)
+    """
+    dump = booster.dump_model()
+    nodes = NodesBuilder()
+    for tree in dump["tree_info"]:
+        nodes.add_lightgbm_tree(tree=tree["tree_structure"])
+
+    # The link function of the objective (as in LightGBM's `ConvertOutput`), a model trained with a custom objective
+    # has no objective in its dump and predicts the raw scores:
+    objective, *objective_params = dump.get("objective", "custom").split()
+    objective_params = dict(
+        param.split(":", 1) if ":" in param else (param, True)
+        for param in objective_params
+    )
+    link, sigmoid = "identity", 1.0
+    if objective in ["binary", "multiclassova"]:
+        link, sigmoid = "sigmoid", float(objective_params.get("sigmoid", 1.0))
+    elif objective in ["cross_entropy", "xentropy"]:
+        link = "sigmoid"
+    elif objective in ["cross_entropy_lambda", "xentlambda"]:
+        link = "softplus"
+    elif objective in ["multiclass", "softmax"]:
+        link = "softmax"
+    elif objective in ["poisson", "gamma", "tweedie"]:
+        link = "exp"
+    elif objective in LIGHTGBM_IDENTITY_OBJECTIVES:
+        # The regression objectives trained on the square root of the label (`reg_sqrt`) predict the signed square:
+        if objective_params.get("sqrt"):
+            link = "square"
+    else:
+        raise ValueError(f"Unsupported LightGBM objective '{objective}'")
+
+    return nodes.to_arrays(), {
+        "algorithm": "lightgbm",
+        "num_class": dump["num_tree_per_iteration"],
+        "feature_names": dump["feature_names"],
+        "max_depth": nodes.max_depth,
+        "base_score": [0.0] * dump["num_tree_per_iteration"],
+        "link": link,
+        "sigmoid": sigmoid,
+        "average_output": bool(dump.get("average_output", False)),
+        "input_dtype": "float64",
+        "pandas_categorical": dump.get("pandas_categorical"),
+    }
+
+
+def flatten_gradient_boosting(model) -> Tuple[Dict[str, np.ndarray], dict]:
+    """A function which converts a scikit-learn gradient boosting model to flat arrays
+
+    :param model: the `GradientBoostingRegressor` or `GradientBoostingClassifier`
+
+    :return the ensemble's arrays and metadata (see `FlatTreeEnsemble`)
+    """
+    # Import scikit-learn only when exporting (it is not needed for predicting):
+    from sklearn.ensemble import GradientBoostingClassifier, GradientBoostingRegressor
+
+    if not isinstance(model, (GradientBoostingClassifier, GradientBoostingRegressor)):
+        raise TypeError(
+            f"can not export a model of type {type(model).__name__}, expected a gradient boosting model"
+        )
+
+    # The trees are ordered by stage and then by class, the learning rate is applied to the leaves:
+    nodes = NodesBuilder()
+    for stage in model.estimators_:
+        for estimator in stage:
+            nodes.add_sklearn_tree(tree=estimator.tree_, scale=model.learning_rate)
+    num_class = model.estimators_.shape[1]
+
+    link, sigmoid = "identity", 1.0
+    if isinstance(model, GradientBoostingClassifier):
+        link = "softmax" if num_class > 1 else "sigmoid"
+        sigmoid = 2.0 if model.loss == "exponential" else 1.0
+    meta = {
+        "algorithm": type(model).__name__,
+        "num_class": num_class,
+        "feature_names": [
+            str(name)
+            for name in getattr(model, "feature_names_in_", range(model.n_features_in_))
+        ],
+        "max_depth": nodes.max_depth,
+        "base_score": [0.0] * num_class,
+        "link": link,
+        "sigmoid": sigmoid,
+        "average_output": False,
+        # Scikit-learn's trees split on float32 values:
+        "input_dtype": "float32",
+    }
+    if isinstance(model, GradientBoostingClassifier):
+        meta["classes"] = model.classes_.tolist()
+    arrays = nodes.to_arrays()
+
+    # The initial raw prediction is the model's raw prediction without the trees (checked on a row of zeros):
+    zeros = np.zeros((1, model.n_features_in_))
+    raw = (
+        model.decision_function(zeros)
+        if isinstance(model, GradientBoostingClassifier)
+        else model.predict(zeros)
+    )
+    trees_raw = FlatTreeEnsemble(arrays=arrays, meta=meta).predict(
+        inputs=zeros, raw_score=True
+    )
+    meta["base_score"] = (np.reshape(raw, -1) - np.reshape(trees_raw, -1)).tolist()
+    return arrays, meta
+
+
+def predict_original(model, inputs) -> np.ndarray:
+    """A function which predicts with the original model, the way `FlatTreeEnsemble.predict` does
+
+    :param model: the model given to `flatten_model`
+    :param inputs: the rows to predict
+
+    :return the predictions
+    """
+    if type(model).__module__.startswith("lightgbm"):
+        return getattr(model, "booster_", model).predict(inputs)
+    if hasattr(model, "predict_proba"):
+        probabilities = model.predict_proba(inputs)
+        return probabilities[:, 1] if probabilities.shape[1] == 2 else probabilities
+    return model.predict(inputs)
+
+
+class NodesBuilder:
+    """
+    Collect the nodes of trees into the flat arrays of `FlatTreeEnsemble`.
+    """
+
+    def __init__(self):
+        self.feature = []
+        self.threshold = []
+        self.decision = []
+        self.children = []
+        self.value = []
+        self.roots = []
+        self.cat_boundaries = [0]
+        self.cat_threshold = []
+        self.max_depth = 0
+
+    def add_lightgbm_tree(self, tree: dict):
+        """
+        Add a tree of LightGBM's `Booster.dump_model`.
+
+        :param tree: The tree's structure.
+        """
+        self.roots.append(len(self.feature))
+        stack = [(tree, None, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            index = self._add_node(parent=parent)
+            self.max_depth = max(self.max_depth, depth)
+            if "leaf_value" in node:
+                self.value[index] = node["leaf_value"]
+                continue
+            self.feature[index] = node["split_feature"]
+            decision = MISSING_TYPES[node["missing_type"]] << 2
+            if node["default_left"]:
+                decision |= DEFAULT_LEFT_FLAG
+            if node["decision_type"] == "==":
+                decision |= CATEGORICAL_FLAG
+                self.threshold[index] = self._add_categories(
+                    categories=[
+                        int(category) for category in str(node["threshold"]).split("||")
+                    ]
+                )
+            else:
+                self.threshold[index] = node["threshold"]
+            self.decision[index] = decision
+            # The right child is pushed first, so the left one is added first:
+            stack.append((node["right_child"], (index, 1), depth + 1))
+            stack.append((node["left_child"], (index, 0), depth + 1))
+
+    def add_sklearn_tree(self, tree, scale: float = 1.0):
+        """
+        Add a scikit-learn tree.
+
+        :param tree:  The tree's `tree_` attribute.
+        :param scale: A factor of the leaves values (the learning rate of gradient boosting).
+        """
+        offset = len(self.feature)
+        self.roots.append(offset)
+        is_leaf = tree.children_left == -1
+        indices = np.arange(tree.node_count)
+        self.feature.extend(np.where(is_leaf, 0, tree.feature).tolist())
+        self.threshold.extend(np.where(is_leaf, 0.0, tree.threshold).tolist())
+        self.decision.extend([0] * tree.node_count)
+        self.children.extend(
+            (
+                np.column_stack(
+                    [
+                        np.where(is_leaf, indices, tree.children_left),
+                        np.where(is_leaf, indices, tree.children_right),
+                    ]
+                )
+                + offset
+            ).tolist()
+        )
+        self.value.extend(np.where(is_leaf, tree.value[:, 0, 0] * scale, 0.0).tolist())
+        self.max_depth = max(self.max_depth, tree.max_depth)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "feature": np.array(self.feature, dtype=np.int64),
+            "threshold": np.array(self.threshold, dtype=np.float64),
+            "decision": np.array(self.decision, dtype=np.uint8),
+            "children": np.array(self.children, dtype=np.int64).reshape(-1, 2),
+            "value": np.array(self.value, dtype=np.float64),
+            "roots": np.array(self.roots, dtype=np.int64),
+            "cat_boundaries": np.array(self.cat_boundaries, dtype=np.int32),
+            "cat_threshold": np.array(self.cat_threshold, dtype=np.uint32),
+        }
+
+    def _add_node(self, parent: Union[Tuple[int, int], None]) -> int:
+        # Add a leaf (pointing to itself) and link it to its parent:
+        index = len(self.feature)
+        self.feature.append(0)
+        self.threshold.append(0.0)
+        self.decision.append(0)
+        self.children.append([index, index])
+        self.value.append(0.0)
+        if parent is not None:
+            self.children[parent[0]][parent[1]] = index
+        return index
+
+    def _add_categories(self, categories: List[int]) -> int:
+        # Add the categories bitset and return its index:
+        bitset = [0] * (max(categories) // 32 + 1)
+        for category in categories:
+            bitset[category // 32] |= 1 << (category % 32)
+        self.cat_threshold.extend(bitset)
+        self.cat_boundaries.append(len(self.cat_threshold))
+        return len(self.cat_boundaries) - 2
@@ -0,0 +1,59 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+# The functions' sources are deployed as single files, import them as top level modules:
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+class Logger:
+    def __init__(self):
+        self.messages = []
+
+    def info(self, message):
+        self.messages.append(message)
+
+    warn = warning = info
+
+
+class Context:
+    """
+    A minimal MLRun context, keeping the logged results, datasets and models.
+    """
+
+    def __init__(self):
+        self.logger = Logger()
+        self.results = {}
+        self.datasets = {}
+        self.models = {}
+
+    def log_result(self, key, value):
+        self.results[key] = value
+
+    def log_results(self, results):
+        self.results.update(results)
+
+    def log_dataset(self, key, df, **kwargs):
+        self.datasets[key] = df
+
+    def log_model(self, key, body=None, model_file=None, **kwargs):
+        self.models[key] = pickle.loads(body) if body is not None else model_file
+
+
+class DataItem:
+    """
+    A minimal MLRun data item of a local file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def local(self):
+        return self.path
+
+
+@pytest.fixture
+def context():
+    return Context()
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("mlrun")
+
+import data_prep  # noqa: E402
+
+
+def make_coordinates_frame(rows=1000, seed=0):
+    # Synthetic rides - mostly around New York, a few anywhere on the globe and a few starting and ending at the same
+    # point:
+    random = np.random.default_rng(seed)
+    pickup_lat = random.uniform(40.5, 41.0, rows)
+    pickup_lon = random.uniform(-74.3, -73.7, rows)
+    dropoff_lat = random.uniform(40.5, 41.0, rows)
+    dropoff_lon = random.uniform(-74.3, -73.7, rows)
+    pickup_lat[:10] = random.uniform(-90, 90, 10)
+    pickup_lon[:10] = random.uniform(-180, 180, 10)
+    dropoff_lat[10:20], dropoff_lon[10:20] = pickup_lat[10:20], pickup_lon[10:20]
+    return pd.DataFrame(
+        {
+            "key": [f"key_{i}" for i in range(rows)],
+            "pickup_longitude": pickup_lon,
+            "pickup_latitude": pickup_lat,
+            "dropoff_longitude": dropoff_lon,
+            "dropoff_latitude": dropoff_lat,
+            "passenger_count": random.integers(1, 6, rows),
+        },
+        index=np.arange(rows) * 2,
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_geo_features_step_parity(workers):
+    # The fused step reproduces the chain of the step functions, including the twice converted radians of the bearing
+    # and the distance:
+    df = make_coordinates_frame()
+    expected = df.copy()
+    for step in [
+        data_prep.add_airport_dist,
+        data_prep.radian_conv_step,
+        data_prep.sphere_dist_bear_step,
+        data_prep.sphere_dist_step,
+    ]:
+        expected = step(expected)
+    result = data_prep.geo_features_step(df.copy(), workers=workers)
+
+    assert sorted(result.columns) == sorted(expected.columns)
+    assert result.index.equals(expected.index)
+    for column in expected.columns:
+        if not pd.api.types.is_numeric_dtype(expected[column]):
+            assert result[column].equals(expected[column])
+        else:
+            np.testing.assert_allclose(
+                result[column].to_numpy(),
+                expected[column].to_numpy(),
+                rtol=1e-9,
+                atol=1e-12,
+                err_msg=column,
+            )
+
+
+def test_geo_features_kernel_parity():
+    df = make_coordinates_frame(rows=100, seed=1)
+    features = data_prep.geo_features_kernel(
+        df["pickup_latitude"].to_numpy(),
+        df["pickup_longitude"].to_numpy(),
+        df["dropoff_latitude"].to_numpy(),
+        df["dropoff_longitude"].to_numpy(),
+    )
+    expected = data_prep.sphere_dist_step(
+        data_prep.sphere_dist_bear_step(
+            data_prep.radian_conv_step(data_prep.add_airport_dist(df.copy()))
+        )
+    )
+    assert features.shape == (len(data_prep.GEO_FEATURES), len(df))
+    for feature, values in zip(data_prep.GEO_FEATURES, features):
+        np.testing.assert_allclose(
+            values, expected[feature].to_numpy(), rtol=1e-9, atol=1e-12, err_msg=feature
+        )
@@ -0,0 +1,415 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import serving
+
+
+def make_events(rows):
+    # The sample events are made by `benchmark`, which imports `data_prep` and so mlrun:
+    pytest.importorskip("mlrun")
+    import benchmark
+
+    return benchmark.make_events(benchmark.make_taxi_frame(rows=rows))
+
+
+def test_batch_preprocess_metrics():
+    # The batch is timed by `MicroBatchPredict` alone, the graph steps count only the events that went through them:
+    serving.STEPS_METRICS.reset()
+    events = make_events(rows=10)
+    body = serving.batch_preprocess(events)
+    assert len(body["inputs"]) == len(events)
+    assert serving.STEPS_METRICS.to_dict() == {}
+
+    serving.radian_conv_step(serving.add_airport_dist(events[0]))
+    metrics = serving.STEPS_METRICS.to_dict()
+    assert {step: step_metrics["events"] for step, step_metrics in metrics.items()} == {
+        "add_airport_dist": 1,
+        "radian_conv_step": 1,
+    }
+
+
+# Sample events of the parity tests - a typical Manhattan ride, a ride to JFK, a ride starting and ending at the same
+# point, and far away coordinates:
+SAMPLE_EVENTS = [
+    (40.7614, -73.9776, 40.7484, -73.9857),
+    (40.7580, -73.9855, 40.6413, -73.7781),
+    (40.7128, -74.0060, 40.7128, -74.0060),
+    (-33.8688, 151.2093, 51.5074, -0.1278),
+]
+
+
+@pytest.mark.parametrize("coordinates", SAMPLE_EVENTS)
+def test_event_steps_parity(coordinates):
+    # The per event (scalar) steps produce the same features as the dataframe steps, including the bearing and the
+    # distance being calculated on the coordinates converted to radians twice (`radian_conv_step` then the formulas):
+    pickup_lat, pickup_lon, dropoff_lat, dropoff_lon = coordinates
+    event = {
+        "key": "2015-01-27 13:08:24.0000002",
+        "pickup_datetime": "2015-01-27 13:08:24 UTC",
+        "pickup_longitude": pickup_lon,
+        "pickup_latitude": pickup_lat,
+        "dropoff_longitude": dropoff_lon,
+        "dropoff_latitude": dropoff_lat,
+        "passenger_count": 1,
+    }
+    df = pd.DataFrame([event])
+    for step in [
+        serving.add_airport_dist,
+        serving.radian_conv_step,
+        serving.sphere_dist_bear_step,
+        serving.sphere_dist_step,
+    ]:
+        event = step(event)
+        df = step(df)
+    assert list(event) == list(df.columns)
+    for column in [
+        "pickup_longitude",
+        "pickup_latitude",
+        "dropoff_longitude",
+        "dropoff_latitude",
+        "jfk_dist",
+        "ewr_dist",
+        "lga_dist",
+        "sol_dist",
+        "nyc_dist",
+        "bearing",
+        "distance",
+    ]:
+        assert np.allclose(event[column], df[column].iloc[0], rtol=1e-9, atol=1e-12)
+
+    # The scalar formulas on their own:
+    assert np.allclose(
+        serving.sphere_dist_scalar(*coordinates),
+        serving.sphere_dist(*map(np.float64, coordinates)),
+    )
+    assert np.allclose(
+        serving.sphere_dist_bear_scalar(*coordinates),
+        serving.sphere_dist_bear(*map(np.float64, coordinates)),
+    )
+
+
+class ModelServer:
+    # A model server class of the "local" mode, predicting its `bias`:
+    def __init__(self, context, name, model_path, bias=0.0):
+        self.bias = bias
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        self.model = None
+
+    def predict(self, body):
+        self.requests.append(body["inputs"])
+        return [self.bias + i for i in range(len(body["inputs"]))]
+
+    # The requests bodies' inputs the model servers got:
+    requests = []
+
+
+def test_get_model_client_local():
+    client = serving.get_model_client(
+        url="http://model/infer",
+        model_path="model_a",
+        mode="local",
+        model_class=ModelServer,
+        warm_up=False,
+        bias=1.5,
+        timeout=None,
+    )
+    assert client.invoke({"inputs": [[0.0], [1.0]]}) == {"outputs": [1.5, 2.5]}
+
+    with pytest.raises(ValueError, match="hedge_after_ms"):
+        serving.get_model_client(
+            model_path="model_b",
+            mode="local",
+            model_class=ModelServer,
+            hedge_after_ms=50,
+        )
+
+
+def test_local_model_client_servers():
+    # Clients of the same model with the same server settings share the loaded server, other settings load another:
+    client = serving.LocalModelClient(
+        model_path="model_d", model_class=ModelServer, warm_up=False, bias=1.0
+    )
+    same_client = serving.LocalModelClient(
+        model_path="model_d", model_class=ModelServer, warm_up=False, bias=1.0
+    )
+    other_client = serving.LocalModelClient(
+        model_path="model_d", model_class=ModelServer, warm_up=False, bias=2.0
+    )
+    other_name_client = serving.LocalModelClient(
+        model_path="model_d",
+        model_class=ModelServer,
+        model_name="other",
+        warm_up=False,
+        bias=1.0,
+    )
+    assert same_client._server is client._server
+    assert other_client._server is not client._server
+    assert other_name_client._server is not client._server
+    assert client.invoke({"inputs": [[0.0]]}) == {"outputs": [1.0]}
+    assert other_client.invoke({"inputs": [[0.0]]}) == {"outputs": [2.0]}
+
+
+def test_micro_batch_predict_local(monkeypatch):
+    monkeypatch.setenv(serving.MODEL_EXECUTION_ENV, "local")
+    step = serving.MicroBatchPredict(
+        url="http://model/infer", model_path="model_c", model_class=ModelServer
+    )
+    assert isinstance(step._client, serving.LocalModelClient)
+    with pytest.raises(ValueError, match="timeout"):
+        serving.MicroBatchPredict(
+            model_path="model_d", model_class=ModelServer, timeout=1
+        )
+
+
+def test_micro_batch_predict_concurrent_events():
+    # Events reaching the step concurrently are sent to the model as a single multi rows request:
+    events = make_events(rows=20)
+    step = serving.MicroBatchPredict(
+        model_path="model_e",
+        mode="local",
+        model_class=ModelServer,
+        max_batch_size=len(events),
+        max_wait_ms=1000,
+    )
+    ModelServer.requests.clear()
+
+    async def predict():
+        return await asyncio.gather(*[step.do(event) for event in events])
+
+    responses = asyncio.run(predict())
+    assert len(ModelServer.requests) == 1
+    assert ModelServer.requests[0] == serving.batch_preprocess(events)["inputs"]
+    assert responses == [{"outputs": [float(i)]} for i in range(len(events))]
+
+
+def test_micro_batch_predict_flow():
+    # In a storey flow, the events emitted concurrently are taken in while the previous ones wait for their batch:
+    storey = pytest.importorskip("storey")
+    events = make_events(rows=20)
+    step = serving.MicroBatchPredict(
+        model_path="model_f",
+        mode="local",
+        model_class=ModelServer,
+        max_batch_size=8,
+        max_wait_ms=1000,
+    )
+    ModelServer.requests.clear()
+
+    async def run_flow():
+        controller = storey.build_flow(
+            [storey.AsyncEmitSource(), step, storey.Complete()]
+        ).run()
+        responses = await asyncio.gather(*[controller.emit(event) for event in events])
+        await controller.terminate()
+        await controller.await_termination()
+        return responses
+
+    responses = asyncio.run(run_flow())
+    assert [len(inputs) for inputs in ModelServer.requests] == [8, 8, len(events) - 16]
+    assert responses == [{"outputs": [float(i % 8)]} for i in range(len(events))]
+
+
+class ModelRequestHandler(BaseHTTPRequestHandler):
+    # A stub remote model, answering each request with the next of the server's `responses` (a status and a delay in
+    # seconds, 200 right away once they run out) and the sums of the inputs rows in the request's payload format:
+    def do_PUT(self):
+        content_type = self.headers["Content-Type"]
+        body = serving.decode_inputs(
+            body=self.rfile.read(int(self.headers["Content-Length"])),
+            content_type=content_type,
+        )
+        with self.server.lock:
+            self.server.requests.append(body)
+            status, delay = (
+                self.server.responses.pop(0) if self.server.responses else (200, 0)
+            )
+        time.sleep(delay)
+        outputs = np.asarray(body["inputs"], dtype=np.float64).sum(axis=1)
+        if content_type == serving.PAYLOAD_CONTENT_TYPES["numpy"]:
+            data = serving.encode_inputs(body={"inputs": outputs}, payload="numpy")
+        elif content_type == serving.PAYLOAD_CONTENT_TYPES["msgpack"]:
+            data = serving.encode_inputs(
+                body={"outputs": outputs.tolist()}, payload="msgpack"
+            )
+        else:
+            data = serving.encode_inputs(body={"outputs": outputs.tolist()})
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def model_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ModelRequestHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.responses = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v2/models/model/infer"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def invoke(client, body, use_async):
+    if use_async:
+        return asyncio.run(client.invoke_async(body))
+    return client.invoke(body)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+@pytest.mark.parametrize("payload", ["json", "numpy", "msgpack"])
+def test_remote_model_client_payloads(model_server, payload, use_async):
+    if payload == "msgpack" and serving.msgpack is None:
+        pytest.skip("msgpack is not installed")
+    client = serving.RemoteModelClient(url=model_server.url, payload=payload)
+    response = invoke(client, {"inputs": [[1.0, 2.0], [3.5, 4.5]]}, use_async)
+    assert list(response["outputs"]) == [3.0, 8.0]
+    np.testing.assert_array_equal(
+        model_server.requests[0]["inputs"], [[1.0, 2.0], [3.5, 4.5]]
+    )
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_remote_model_client_hedging(model_server, use_async):
+    # The first request is slow, the hedged one sent after 50ms answers first:
+    model_server.responses = [(200, 2.0)]
+    client = serving.RemoteModelClient(
+        url=model_server.url, hedge_after_ms=50, retries=1
+    )
+    start = time.perf_counter()
+    response = invoke(client, {"inputs": [[1.0, 2.0]]}, use_async)
+    assert time.perf_counter() - start < 1.0
+    assert response["outputs"] == [3.0]
+    assert len(model_server.requests) == 2
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_remote_model_client_retries(model_server, use_async):
+    model_server.responses = [(503, 0), (503, 0)]
+    client = serving.RemoteModelClient(url=model_server.url, retries=2)
+    assert invoke(client, {"inputs": [[1.0, 2.0]]}, use_async)["outputs"] == [3.0]
+    assert len(model_server.requests) == 3
+
+    # Failing more than the retries raises the last error:
+    model_server.requests.clear()
+    model_server.responses = [(503, 0), (503, 0), (503, 0)]
+    with pytest.raises(requests.HTTPError, match="503"):
+        invoke(client, {"inputs": [[1.0, 2.0]]}, use_async)
+    assert len(model_server.requests) == 3
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_remote_model_client_client_error(model_server, use_async):
+    # A 4xx error is not retried:
+    model_server.responses = [(400, 0)]
+    client = serving.RemoteModelClient(url=model_server.url, retries=2)
+    with pytest.raises(requests.HTTPError, match="400"):
+        invoke(client, {"inputs": [[1.0, 2.0]]}, use_async)
+    assert len(model_server.requests) == 1
+
+
+def test_model_step_concurrent_events(model_server):
+    # The step's `do` doesn't block the event loop, so the events are sent to the model concurrently:
+    model_server.responses = [(200, 0.5)] * 4
+    step = serving.ModelStep(url=model_server.url, mode="remote", max_in_flight=4)
+
+    async def predict():
+        return await asyncio.gather(
+            *[step.do({"inputs": [[float(i), 1.0]]}) for i in range(4)]
+        )
+
+    start = time.perf_counter()
+    responses = asyncio.run(predict())
+    assert time.perf_counter() - start < 1.5
+    assert [response["outputs"] for response in responses] == [
+        [1.0],
+        [2.0],
+        [3.0],
+        [4.0],
+    ]
+
+
+def test_prediction_cache_lru():
+    cache = serving.PredictionCache(max_size=2)
+    cache.put(key=("a",), output=1.0)
+    cache.put(key=("b",), output=2.0)
+    # Getting "a" makes "b" the least recently used, so it is evicted by "c":
+    assert cache.get(key=("a",)) == 1.0
+    cache.put(key=("c",), output=3.0)
+    assert len(cache) == 2
+    assert cache.get(key=("b",)) is None
+    assert cache.get(key=("a",)) == 1.0
+    assert cache.get(key=("c",)) == 3.0
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_prediction_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(serving.time, "monotonic", lambda: now[0])
+    cache = serving.PredictionCache(max_size=10, ttl=5)
+    cache.put(key=("a",), output=1.0)
+    now[0] += 4.9
+    assert cache.get(key=("a",)) == 1.0
+    # Expired entries are a miss and are removed:
+    now[0] += 0.2
+    assert cache.get(key=("a",)) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_prediction_cache_key():
+    cache = serving.PredictionCache(max_size=10, decimals=2, key_indices=[0, 2])
+    # Only the floats are rounded, and only the key indices are used:
+    assert cache.get_key([40.71234, "x", 3, 7.0]) == (40.71, 3)
+    assert cache.get_key([40.71234, "y", 3]) == cache.get_key([40.70999, "z", 3])
+    assert cache.get_key([40.71234, "x", 3]) != cache.get_key([40.71834, "x", 3])
+    assert serving.PredictionCache(max_size=10).get_key([1.23456, 2]) == (1.23456, 2)
+
+
+def test_model_step_cache(model_server):
+    # The stub model predicts the rows sums, so the cached predictions can be told apart:
+    step = serving.ModelStep(
+        url=model_server.url, mode="remote", cache_size=10, cache_decimals=1
+    )
+    response = asyncio.run(step.do({"inputs": [[1.0, 2.0], [3.0, 4.0]]}))
+    assert response["outputs"] == [3.0, 7.0]
+    assert response["cache"] == {
+        "hits": 0,
+        "misses": 2,
+        "total_hits": 0,
+        "total_misses": 2,
+        "size": 2,
+    }
+
+    # Only the missing row is sent to the model, near repeats of the cached rows are hits:
+    response = asyncio.run(step.do({"inputs": [[3.01, 4.0], [5.0, 6.0], [1.0, 2.0]]}))
+    assert response["outputs"] == [7.0, 11.0, 3.0]
+    assert response["cache"] == {
+        "hits": 2,
+        "misses": 1,
+        "total_hits": 2,
+        "total_misses": 3,
+        "size": 3,
+    }
+    assert [request["inputs"] for request in model_server.requests] == [
+        [[1.0, 2.0], [3.0, 4.0]],
+        [[5.0, 6.0]],
+    ]
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("mlrun")
+pytest.importorskip("lightgbm")
+
+import benchmark  # noqa: E402
+import data_prep  # noqa: E402
+import serving  # noqa: E402
+import trainer_lgbm  # noqa: E402
+from conftest import DataItem  # noqa: E402
+
+
+def get_serving_features():
+    # The features in the order the serving graph sends them - the columns the geo steps leave in the event and the
+    # datetime parts the graph's `DateExtractor` adds (its "day_of_week" is `data_prep`'s "weekday"):
+    events = pd.DataFrame(benchmark.make_events(benchmark.make_taxi_frame(rows=10)))
+    events = serving.sphere_dist_step(
+        serving.sphere_dist_bear_step(
+            serving.radian_conv_step(serving.add_airport_dist(events))
+        )
+    )
+    return [
+        column for column in events.columns if column not in ["key", "pickup_datetime"]
+    ] + [
+        f"pickup_datetime_{part}"
+        for part in ["hour", "day", "month", "weekday", "year"]
+    ]
+
+
+@pytest.fixture
+def train_set(tmp_path):
+    # Prepared like `data_preparation` - the cleaned rows leave a non range index, which pandas writes as a column:
+    dataset = data_prep.prepare_features(benchmark.make_taxi_frame(rows=5000))
+    dataset, _ = data_prep.downcast_features(
+        dataset.drop(columns=["key", "pickup_datetime"])
+    )
+    parquet_path = str(tmp_path / "train_set.parquet")
+    dataset.to_parquet(parquet_path, row_group_size=1000)
+    csv_path = str(tmp_path / "train_set.csv")
+    dataset.to_csv(csv_path, index=False)
+    return parquet_path, csv_path
+
+
+@pytest.mark.parametrize("chunked", [True, False])
+def test_train_incremental_feature_names(context, train_set, chunked):
+    trainer_lgbm.train_incremental(
+        context, DataItem(train_set[0]), chunked=chunked, num_boost_round=5
+    )
+    assert context.models["lgbm_ny_taxi"].feature_name() == get_serving_features()
+
+
+def test_train_incremental_warm_start(context, train_set, tmp_path):
+    trainer_lgbm.train_incremental(context, DataItem(train_set[0]), num_boost_round=5)
+    model_path = str(tmp_path / "model.txt")
+    context.models["lgbm_ny_taxi"].save_model(model_path)
+
+    # Continue training on the same data, read from CSV:
+    trainer_lgbm.train_incremental(
+        context, DataItem(train_set[1]), init_model=model_path, num_boost_round=5
+    )
+    assert context.results["num_trees"] == 10
+    assert context.models["lgbm_ny_taxi"].feature_name() == get_serving_features()
+
+
+def test_sweep(context, train_set):
+    trainer_lgbm.sweep(
+        context,
+        DataItem(train_set[0]),
+        subsample=[0.8, 1.0],
+        min_split_gain=[0.0],
+        min_child_samples=[10, 20],
+        num_boost_round=20,
+        min_boost_round=5,
+        reduction_factor=2,
+        workers=2,
+    )
+    assert context.models["lgbm_ny_taxi"].feature_name() == get_serving_features()
+
+    # A row per trial and rung - 4 trials of 5 rounds, the best 2 of 10 and the best one of 20:
+    trials = context.datasets["trials"].reset_index()
+    assert trials.groupby("rung")["trial"].count().to_dict() == {0: 4, 1: 2, 2: 1}
+    assert trials.groupby("rung")["rounds"].max().to_dict() == {0: 5, 1: 10, 2: 20}
+    best = trials[trials["rung"] == 2].iloc[0]
+    assert context.results["best_trial"] == best["trial"]
+    assert context.results["best_valid_l2"] == best["valid_l2"]
+
+
+def test_downcast_features_numeric_passenger_count():
+    # Serving sends the raw counts, so they must be trained on as numbers (and not wrapped around or as category codes):
+    dataset = pd.DataFrame({"passenger_count": [0, 1, 6, 208]})
+    downcast, _ = data_prep.downcast_features(dataset)
+    assert pd.api.types.is_integer_dtype(downcast["passenger_count"])
+    assert downcast["passenger_count"].tolist() == [0, 1, 6, 208]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("mlrun")
+lgbm = pytest.importorskip("lightgbm")
+
+import tree_export  # noqa: E402
+
+
+def train_booster(params: dict) -> "lgbm.Booster":
+    rng = np.random.default_rng(0)
+    inputs = rng.normal(size=(500, 4))
+    label = np.abs(inputs[:, 0]) + inputs[:, 1] ** 2 + rng.uniform(size=500)
+    if params["objective"] in ["binary", "cross_entropy_lambda"]:
+        label = (label > np.median(label)).astype(float)
+    elif params["objective"] == "multiclass":
+        label = np.digitize(label, np.quantile(label, [1 / 3, 2 / 3]))
+    return lgbm.train(
+        {**params, "verbose": -1}, lgbm.Dataset(inputs, label), num_boost_round=10
+    )
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"objective": "regression"},
+        {"objective": "regression", "reg_sqrt": True},
+        {"objective": "regression_l1", "reg_sqrt": True},
+        {"objective": "huber"},
+        {"objective": "binary"},
+        {"objective": "cross_entropy_lambda"},
+        {"objective": "multiclass", "num_class": 3},
+        {"objective": "poisson"},
+    ],
+)
+def test_flatten_lightgbm(params):
+    booster = train_booster(params)
+    ensemble = tree_export.FlatTreeEnsemble(*tree_export.flatten_lightgbm(booster))
+    inputs = np.random.default_rng(1).normal(size=(100, 4))
+    np.testing.assert_allclose(
+        ensemble.predict(inputs), booster.predict(inputs), rtol=1e-9, atol=1e-12
+    )
+
+
+def test_flatten_lightgbm_unsupported_objective():
+    booster = train_booster({"objective": "regression"})
+    dump_model = booster.dump_model
+    booster.dump_model = lambda: {**dump_model(), "objective": "unknown"}
+    with pytest.raises(ValueError, match="unknown"):
+        tree_export.flatten_lightgbm(booster)
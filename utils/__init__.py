@@ -1 +1,5 @@
-from .s3_client import S3Client
+from .s3_client import S3Client, S3TransferError
+from .async_s3_client import AsyncS3Client
+from .s3_cache import S3DownloadCache
+from .s3_journal import S3TransferJournal
+from .s3_streams import S3ObjectReader, S3ObjectWriter, S3TextWriter
@@ -0,0 +1,482 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple, Union
+import asyncio
+import functools
+import glob
+import os
+import threading
+import warnings
+from datetime import datetime
+
+from .s3_client import S3Client, S3TransferError
+
+
+class TransferCancelledError(Exception):
+    """
+    Raised inside a running transfer to abort it once the asyncio task awaiting it was cancelled.
+    """
+
+    pass
+
+
+class AsyncS3Client:
+    """
+    An asyncio interface for the `S3Client`, for uploading, downloading, deleting and listing files or directories from
+    within an event loop without blocking it.
+
+    The blocking boto3 calls run on a bounded pool of `max_concurrency` threads shared by all the calls of the client,
+    so hundreds of files can be transferred concurrently from a single event loop without a thread per file. Cancelling
+    an awaiting task aborts its running transfers (at their next transferred chunk) and drops its queued ones.
+    """
+
+    def __init__(self, s3_client: S3Client = None, max_concurrency: int = 10):
+        """
+        Initialize an asyncio S3 client object.
+
+        :param s3_client:       The S3 client to use for the transfers (its boto3 client, credentials and transfer
+                                settings are shared). Default: A new `S3Client` with default settings.
+        :param max_concurrency: The maximum amount of files to transfer concurrently. Default: 10.
+        """
+        self._s3_client = s3_client or S3Client(max_workers=max_concurrency)
+        self._max_concurrency = max_concurrency
+
+        # The threads pool and the concurrency limit are initialized lazily on first use (see `_run`):
+        self._executor = None
+        self._semaphore = None
+
+    async def upload(
+        self,
+        bucket: str,
+        local_path: str,
+        s3_path: str,
+        replace: bool = True,
+        progress_callback: Callable[[str, int], None] = None,
+    ):
+        """
+        Upload a given file or directory to S3.
+
+        :param bucket:            The bucket to upload to.
+        :param local_path:        The path to the local file or directory to upload.
+        :param s3_path:           The path to upload to in the S3 bucket.
+        :param replace:           Whether to replace the files when uploading or skip if they already exist.
+                                  Default: True.
+        :param progress_callback: A callback to call on the event loop with the local file path and the amount of
+                                  bytes transferred each time a chunk of a file is uploaded.
+
+        :raise ValueError:      If the given local path do not exist, or it is a path of an empty directory.
+        :raise S3TransferError: If some of the files of the directory failed to upload.
+
+        Example:
+            >>> s3_client = AsyncS3Client(max_concurrency=50)
+            >>> await s3_client.upload(
+            ...     bucket="my_bucket",
+            ...     local_path="/path/to/a/local/directory",
+            ...     s3_path="path/to/a/s3/directory",
+            ... )
+        """
+        # Check if the given S3 path is starting with a '/':
+        if s3_path[0] == "/":
+            warnings.warn(
+                f"Uploading to S3 with a path starting with a '/' is not recommended. Given S3 path: '{s3_path}'."
+            )
+
+        # Check if path exist:
+        if not os.path.exists(local_path):
+            raise ValueError(f"The given local path '{local_path}' do not exist")
+
+        # Upload a single file:
+        if os.path.isfile(local_path):
+            await self._upload_file(
+                bucket=bucket,
+                local_path=local_path,
+                s3_path=s3_path,
+                replace=replace,
+                progress_callback=progress_callback,
+            )
+            return
+
+        # List all files in directory:
+        files = [
+            path
+            for path in glob.iglob(os.path.join(local_path, "**"), recursive=True)
+            if os.path.isfile(path)
+        ]
+        if len(files) == 0:
+            raise ValueError(
+                f"Found 0 files to upload as the given directory '{local_path}' is empty"
+            )
+
+        # Upload the files:
+        await self._gather(
+            operation="Uploading",
+            tasks={
+                file: self._upload_file(
+                    bucket=bucket,
+                    local_path=file,
+                    s3_path=os.path.join(s3_path, os.path.relpath(file, local_path)),
+                    replace=replace,
+                    progress_callback=progress_callback,
+                )
+                for file in files
+            },
+        )
+
+    async def download(
+        self,
+        bucket: str,
+        local_path: str,
+        s3_path: str,
+        replace: bool = True,
+        progress_callback: Callable[[str, int], None] = None,
+    ):
+        """
+        Download a given file or directory from S3.
+
+        :param bucket:            The bucket to download from.
+        :param local_path:        The path to the local file or directory to download to.
+        :param s3_path:           The path to the file or directory to download in the S3 bucket.
+        :param replace:           Whether to replace the files when downloading or skip if they already exist.
+                                  Default: True.
+        :param progress_callback: A callback to call on the event loop with the S3 file path and the amount of bytes
+                                  transferred each time a chunk of a file is downloaded.
+
+        :raise FileNotFoundError: If the given S3 path do not exist.
+        :raise S3TransferError:   If some of the files of the directory failed to download.
+
+        Example:
+            >>> s3_client = AsyncS3Client(max_concurrency=50)
+            >>> await s3_client.download(
+            ...     bucket="my_bucket",
+            ...     local_path="/path/to/a/local/directory",
+            ...     s3_path="path/to/a/s3/directory",
+            ... )
+        """
+        # Look for all files beginning with the given key (`s3_path`), the files are listed lazily page by page so the
+        # transfers can start on the first page while the rest are still listed:
+        first_files, files = await self._peek_files(bucket=bucket, s3_path=s3_path)
+        if len(first_files) == 0:
+            raise FileNotFoundError(
+                f"There is no file at the bucket '{bucket}' named '{s3_path}'."
+            )
+
+        # Download a single file:
+        if len(first_files) == 1:
+            await self._download_file(
+                bucket=bucket,
+                local_path=local_path,
+                s3_path=s3_path,
+                replace=replace,
+                progress_callback=progress_callback,
+            )
+            return
+
+        # Download the files:
+        await self._gather_as_listed(
+            operation="Downloading",
+            items=files,
+            task=lambda file: self._download_file(
+                bucket=bucket,
+                local_path=os.path.join(local_path, os.path.relpath(file, s3_path)),
+                s3_path=file,
+                replace=replace,
+                progress_callback=progress_callback,
+            ),
+        )
+
+    async def delete(self, bucket: str, s3_path: str):
+        """
+        Delete a given file or directory from S3. A directory is deleted in batches of up to 1000 keys per request.
+
+        :param bucket:  The bucket to delete from.
+        :param s3_path: The path to the file or directory to delete in the S3 bucket.
+
+        :raise FileNotFoundError: If the given S3 path do not exist.
+        :raise S3TransferError:   If some of the files of the directory failed to be deleted.
+
+        Example:
+            >>> s3_client = AsyncS3Client()
+            >>> await s3_client.delete(bucket="my_bucket", s3_path="path/to/a/s3/directory")
+        """
+        # Look for all files beginning with the given key (`s3_path`), the files are listed lazily page by page so the
+        # deletion can start on the first page while the rest are still listed:
+        first_files, files = await self._peek_files(bucket=bucket, s3_path=s3_path)
+        if len(first_files) == 0:
+            raise FileNotFoundError(
+                f"There is no file at the bucket '{bucket}' named '{s3_path}'."
+            )
+
+        # Delete a single file:
+        if len(first_files) == 1:
+            await self._run(
+                S3Client._delete_file,
+                retry_config=self._s3_client._retry_config,
+                s3_client=self._s3_client._get_client(),
+                s3_path=s3_path,
+                bucket=bucket,
+                verbose=False,
+            )
+            return
+
+        # Delete the files in batches:
+        await self._gather_as_listed(
+            operation="Deleting",
+            items=self._split_to_batches(
+                items=files, batch_size=S3Client.DELETE_BATCH_SIZE
+            ),
+            task=lambda batch: self._run(
+                # The retryable keys failed in the batch's response are resubmitted by the batch itself:
+                functools.partial(
+                    S3Client._delete_files_batch,
+                    retry_config=self._s3_client._retry_config,
+                ),
+                retry_config=self._s3_client._retry_config,
+                s3_client=self._s3_client._get_client(),
+                s3_files_paths=batch,
+                bucket=bucket,
+            ),
+        )
+
+    async def list_files(
+        self, bucket: str, s3_path: str
+    ) -> AsyncIterator[Dict[str, Union[str, int, datetime]]]:
+        """
+        List all the files beginning with the given key, yielding them as each page of the listing arrives. Each file
+        is a dictionary with its "Key", "Size", "ETag" and "LastModified".
+
+        :param bucket:  The bucket to list.
+        :param s3_path: The key prefix to list.
+
+        Example:
+            >>> s3_client = AsyncS3Client()
+            >>> async for file in s3_client.list_files(bucket="my_bucket", s3_path="path/to/a/s3/directory"):
+            ...     print(file["Key"], file["Size"])
+        """
+        files = S3Client._iter_files(
+            s3_client=self._s3_client._get_client(), s3_path=s3_path, bucket=bucket
+        )
+        page_size = 1000
+        while True:
+            # Fetch the next page of files on a worker thread:
+            page = await self._run(lambda: list(islice(files, page_size)))
+            for file in page:
+                yield file
+            if len(page) < page_size:
+                return
+
+    async def _upload_file(
+        self,
+        bucket: str,
+        local_path: str,
+        s3_path: str,
+        replace: bool,
+        progress_callback: Callable[[str, int], None],
+    ):
+        await self._run(
+            S3Client._upload_file,
+            retry_config=self._s3_client._retry_config,
+            s3_client=self._s3_client._get_client(),
+            local_path=local_path,
+            s3_path=s3_path,
+            bucket=bucket,
+            replace=replace,
+            verbose=False,
+            transfer_config=self._s3_client._transfer_config,
+            file=local_path,
+            progress_callback=progress_callback,
+        )
+
+    async def _download_file(
+        self,
+        bucket: str,
+        local_path: str,
+        s3_path: str,
+        replace: bool,
+        progress_callback: Callable[[str, int], None],
+    ):
+        await self._run(
+            S3Client._download_file,
+            retry_config=self._s3_client._retry_config,
+            s3_client=self._s3_client._get_client(),
+            local_path=local_path,
+            s3_path=s3_path,
+            bucket=bucket,
+            replace=replace,
+            verbose=False,
+            transfer_config=self._s3_client._transfer_config,
+            cache=self._s3_client._cache,
+            file=s3_path,
+            progress_callback=progress_callback,
+        )
+
+    async def _run(
+        self,
+        function: Callable,
+        file: str = None,
+        progress_callback: Callable[[str, int], None] = None,
+        retry_config: Dict[str, Union[int, float]] = None,
+        **kwargs,
+    ):
+        """
+        Run a blocking function on the client's threads pool, waiting for a free slot out of the `max_concurrency` ones.
+        The function is retried on its thread if it fails on a retryable error (see `S3Client._call_with_retries`).
+
+        If a file is given, the function is a transfer that accepts a boto3 `callback`. The callback streams the
+        transferred bytes to the progress callback (on the event loop) and aborts the transfer once the awaiting task is
+        cancelled.
+
+        :param function:          The blocking function to run.
+        :param file:              The file being transferred by the function.
+        :param progress_callback: A progress callback to call with the file and each transferred bytes amount.
+        :param retry_config:      The retry settings to retry the function with. Default: None (a single attempt).
+        :param kwargs:            The function's keyword arguments.
+
+        :returns: The function's returned value.
+        """
+        # Initialize the threads pool and the concurrency limit:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_concurrency)
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        loop = asyncio.get_running_loop()
+
+        # Prepare the transfer callback:
+        cancel_event = threading.Event()
+        if file is not None:
+
+            def callback(bytes_amount: int):
+                if cancel_event.is_set():
+                    raise TransferCancelledError(
+                        f"The transfer of '{file}' was cancelled"
+                    )
+                if progress_callback is not None:
+                    loop.call_soon_threadsafe(progress_callback, file, bytes_amount)
+
+            kwargs["callback"] = callback
+
+        # Run once a slot is free, a cancellation while waiting simply drops the call:
+        async with self._semaphore:
+            try:
+                return await loop.run_in_executor(
+                    self._executor,
+                    functools.partial(
+                        S3Client._call_with_retries,
+                        function=functools.partial(function, **kwargs),
+                        retry_config=retry_config,
+                    ),
+                )
+            except asyncio.CancelledError:
+                cancel_event.set()
+                raise
+
+    async def _peek_files(
+        self, bucket: str, s3_path: str, amount: int = 2
+    ) -> Tuple[List[str], AsyncIterator[str]]:
+        """
+        Start listing the files beginning with the given key, getting the first ones to tell a file from a directory.
+
+        :param bucket:  The bucket to list.
+        :param s3_path: The key prefix to list.
+        :param amount:  The amount of files to peek.
+
+        :returns: The peeked files and a lazy iterator of all the files (the peeked ones included).
+        """
+        files = self.list_files(bucket=bucket, s3_path=s3_path)
+        first_files = []
+        async for file in files:
+            first_files.append(file["Key"])
+            if len(first_files) == amount:
+                break
+
+        async def iterate_files():
+            for file in first_files:
+                yield file
+            async for file in files:
+                yield file["Key"]
+
+        return first_files, iterate_files()
+
+    async def _gather_as_listed(
+        self,
+        operation: str,
+        items: AsyncIterator[Union[str, List[str]]],
+        task: Callable[[Union[str, List[str]]], Awaitable],
+    ):
+        """
+        Run the given task on each of the items as they are listed, collecting their failures instead of stopping on
+        the first one. A bounded amount of tasks is started ahead of the free slots, so a huge listing will not be
+        materialized all at once.
+
+        An item may also be a batch (list) of files. A task running on a batch may return a dictionary of the files in
+        the batch that failed to their errors, and if the task raises, all the batch's files are failed.
+
+        :param operation: The operation the tasks are doing (for example: "Downloading").
+        :param items:     The files (or batches of files) to run the task on.
+        :param task:      The task to run on each item.
+
+        :raise S3TransferError: If some of the tasks failed.
+        """
+        errors = {}
+        tasks = {}
+
+        def collect(done_tasks):
+            for done_task in done_tasks:
+                item = tasks.pop(done_task)
+                batch = item if isinstance(item, list) else [item]
+                try:
+                    errors.update(done_task.result() or {})
+                except Exception as error:
+                    errors.update({file: error for file in batch})
+
+        try:
+            async for item in items:
+                if len(tasks) >= 2 * self._max_concurrency:
+                    done, _ = await asyncio.wait(
+                        tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    collect(done_tasks=done)
+                tasks[asyncio.ensure_future(task(item))] = item
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                collect(done_tasks=done)
+        except asyncio.CancelledError:
+            # Abort the running transfers and drop the queued ones:
+            for running_task in tasks:
+                running_task.cancel()
+            raise
+
+        # Raise all the collected errors:
+        if errors:
+            raise S3TransferError(operation=operation, errors=errors)
+
+    @staticmethod
+    async def _split_to_batches(
+        items: AsyncIterator[str], batch_size: int
+    ) -> AsyncIterator[List[str]]:
+        batch = []
+        async for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    async def _gather(operation: str, tasks: Dict[str, "asyncio.Future"]):
+        """
+        Await all the given files tasks, collecting their failures instead of stopping on the first one.
+
+        :param operation: The operation the tasks are doing (for example: "Uploading").
+        :param tasks:     A dictionary of file to its awaitable task.
+
+        :raise S3TransferError: If some of the tasks failed.
+        """
+        files: List[str] = list(tasks)
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        errors = {
+            file: result
+            for file, result in zip(files, results)
+            if isinstance(result, BaseException)
+        }
+        if errors:
+            raise S3TransferError(operation=operation, errors=errors)
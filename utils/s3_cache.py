@@ -0,0 +1,224 @@
+from typing import Callable, Dict, Union
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+class S3DownloadCache:
+    """
+    A local on-disk cache of downloaded S3 files, keyed by the file's bucket, key and ETag (the ETag changes whenever
+    the file's content changes), with a total size budget enforced by evicting the least recently used files.
+
+    On a cache hit the file is hard-linked into the requested local path (falling back to a copy when hard links are not
+    possible, for example across file systems). Files are validated to be fresh with a HEAD request of the S3 file, or
+    without any request at all if they were validated less than `ttl` seconds ago.
+
+    Notice that hard-linked files share their content with the cache, so modifying a downloaded file in place modifies
+    the cached copy as well. Use `link=False` if downloaded files are modified.
+    """
+
+    # The name of the file storing the cache's index in the cache directory:
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(
+        self,
+        directory: str = os.path.join(os.path.expanduser("~"), ".cache", "s3_client"),
+        max_size: int = 10 * 1024**3,
+        ttl: float = None,
+        link: bool = True,
+    ):
+        """
+        Initialize a cache at the given directory, loading its index if it already exist.
+
+        :param directory: The directory to keep the cached files in. Default: "~/.cache/s3_client".
+        :param max_size:  The maximum total size in bytes of the cached files. Default: 10GB.
+        :param ttl:       The amount of seconds a validated file is considered fresh without validating it again with a
+                          HEAD request. Default: None, meaning every hit is validated.
+        :param link:      Whether to hard-link cached files to the requested local path instead of copying them.
+                          Default: True.
+        """
+        self._directory = directory
+        self._max_size = max_size
+        self._ttl = ttl
+        self._link = link
+        self._lock = threading.Lock()
+
+        # Load the index, a dictionary of entry id to its bucket, key, ETag, size, last access and last validation:
+        os.makedirs(os.path.join(self._directory, "objects"), exist_ok=True)
+        self._index: Dict[str, Dict[str, Union[str, int, float]]] = {}
+        index_path = os.path.join(self._directory, self.INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as index_file:
+                self._index = json.load(index_file)
+
+    @property
+    def size(self) -> int:
+        """
+        The total size in bytes of the cached files.
+        """
+        return sum(entry["size"] for entry in self._index.values())
+
+    def download(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        local_path: str,
+        download_function: Callable[[], None],
+    ) -> bool:
+        """
+        Get the given S3 file into the local path from the cache if it is cached and fresh, otherwise download it using
+        the given download function and store it in the cache.
+
+        :param s3_client:         The boto3 S3 client to validate the file with.
+        :param bucket:            The bucket of the file.
+        :param key:               The key of the file.
+        :param local_path:        The local path to get the file to.
+        :param download_function: A function downloading the file to the local path.
+
+        :returns: True if the file was taken from the cache and False if it was downloaded.
+        """
+        # Look for a fresh entry within the TTL, skipping the validation request:
+        entry_id = self._get_fresh_entry_id(bucket=bucket, key=key)
+
+        # Validate the latest ETag with a HEAD request:
+        head = None
+        if entry_id is None:
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            entry_id = self._get_entry_id(bucket=bucket, key=key, etag=head["ETag"])
+            with self._lock:
+                if entry_id in self._index:
+                    self._index[entry_id]["validated_at"] = time.time()
+                else:
+                    entry_id = None
+
+        # Cache hit (unless the entry was evicted meanwhile):
+        if entry_id is not None and self._materialize(
+            entry_id=entry_id, local_path=local_path
+        ):
+            return True
+
+        # Cache miss, download the file and store it (only if it was not replaced in S3 while downloading):
+        if head is None:
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+        download_function()
+        if os.path.getsize(local_path) == head["ContentLength"]:
+            self._store(
+                bucket=bucket, key=key, etag=head["ETag"], local_path=local_path
+            )
+        return False
+
+    def clear(self):
+        """
+        Remove all the cached files.
+        """
+        with self._lock:
+            for entry_id in list(self._index):
+                self._remove(entry_id=entry_id)
+            self._save_index()
+
+    def _get_fresh_entry_id(self, bucket: str, key: str) -> Union[str, None]:
+        if self._ttl is None:
+            return None
+        now = time.time()
+        with self._lock:
+            for entry_id, entry in self._index.items():
+                if (
+                    entry["bucket"] == bucket
+                    and entry["key"] == key
+                    and now - entry["validated_at"] < self._ttl
+                ):
+                    return entry_id
+        return None
+
+    def _materialize(self, entry_id: str, local_path: str) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+        # Link (or copy) the cached file into the local path while holding the lock, so it won't be evicted meanwhile:
+        cached_path = self._get_object_path(entry_id=entry_id)
+        with self._lock:
+            if entry_id not in self._index:
+                return False
+            try:
+                if not self._link:
+                    raise OSError("Linking is disabled")
+                os.link(cached_path, local_path)
+            except OSError:
+                shutil.copyfile(cached_path, local_path)
+
+            # Mark as recently used:
+            self._index[entry_id]["last_access"] = time.time()
+            self._save_index()
+        return True
+
+    def _store(self, bucket: str, key: str, etag: str, local_path: str):
+        entry_id = self._get_entry_id(bucket=bucket, key=key, etag=etag)
+        size = os.path.getsize(local_path)
+        if size > self._max_size:
+            return
+
+        # Copy the file into the cache through a temporary file, so a partially copied file is never in the cache:
+        temporary_file, temporary_path = tempfile.mkstemp(
+            dir=os.path.join(self._directory, "objects")
+        )
+        os.close(temporary_file)
+        shutil.copyfile(local_path, temporary_path)
+        os.replace(temporary_path, self._get_object_path(entry_id=entry_id))
+
+        with self._lock:
+            # Older versions of the file will never be hit again:
+            for stale_entry_id, entry in list(self._index.items()):
+                if (
+                    entry["bucket"] == bucket
+                    and entry["key"] == key
+                    and stale_entry_id != entry_id
+                ):
+                    self._remove(entry_id=stale_entry_id)
+
+            # Add the entry:
+            now = time.time()
+            self._index[entry_id] = {
+                "bucket": bucket,
+                "key": key,
+                "etag": etag,
+                "size": size,
+                "last_access": now,
+                "validated_at": now,
+            }
+
+            # Evict the least recently used entries until the cache is within its budget:
+            total_size = self.size
+            for lru_entry_id in sorted(
+                self._index, key=lambda entry_id: self._index[entry_id]["last_access"]
+            ):
+                if total_size <= self._max_size:
+                    break
+                total_size -= self._index[lru_entry_id]["size"]
+                self._remove(entry_id=lru_entry_id)
+            self._save_index()
+
+    def _remove(self, entry_id: str):
+        self._index.pop(entry_id, None)
+        cached_path = self._get_object_path(entry_id=entry_id)
+        if os.path.exists(cached_path):
+            os.remove(cached_path)
+
+    def _save_index(self):
+        # Write to a temporary file and replace, so the index is never left partially written:
+        index_path = os.path.join(self._directory, self.INDEX_FILE_NAME)
+        with open(f"{index_path}.tmp", "w") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def _get_object_path(self, entry_id: str) -> str:
+        return os.path.join(self._directory, "objects", entry_id)
+
+    @staticmethod
+    def _get_entry_id(bucket: str, key: str, etag: str) -> str:
+        return hashlib.sha256(f"{bucket}/{key}/{etag}".encode()).hexdigest()
@@ -1,9 +1,31 @@
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
 import os
 import glob
+import functools
+import hashlib
+import io
+import random
+import threading
+import time
 import warnings
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from boto3.exceptions import RetriesExceededError
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+from .s3_cache import S3DownloadCache
+from .s3_journal import S3TransferJournal
+from .s3_streams import S3ObjectReader, S3ObjectWriter, S3TextWriter
 
 # Import tqdm progressbar according to the running environment (jupyter or cli):
 try:
@@ -20,6 +42,28 @@ except ModuleNotFoundError:
     from tqdm import tqdm
 
 
+class S3TransferError(Exception):
+    """
+    Raised when some of the files of a directory transfer failed. The transfer is not stopped on the first failure, all
+    the files are processed and the failures are collected into the `errors` dictionary of file to exception.
+    """
+
+    def __init__(self, operation: str, errors: Dict[str, Exception]):
+        """
+        Initialize the error with the failed operation and the collected errors.
+
+        :param operation: The operation that failed (for example: "Uploading").
+        :param errors:    A dictionary of file path to the exception raised while transferring it.
+        """
+        self.operation = operation
+        self.errors = errors
+        failures = "\n".join(
+            f"  - {file}: {type(error).__name__}: {error}"
+            for file, error in errors.items()
+        )
+        super().__init__(f"{operation} failed for {len(errors)} file(s):\n{failures}")
+
+
 class S3Client:
     """
     An easy to use S3 client for uploading, downloading and deleting single files or directories.
@@ -28,19 +72,110 @@ class S3Client:
     shows it as a directory. This client handles these kind of directories.
     """
 
+    # The maximum amount of keys S3 accepts in a single `DeleteObjects` request:
+    DELETE_BATCH_SIZE = 1000
+
+    # The S3 error codes of throttling and temporary server errors, a transfer failing on them is retried:
+    RETRYABLE_ERROR_CODES = [
+        "SlowDown",
+        "Throttling",
+        "ThrottlingException",
+        "RequestTimeout",
+        "RequestTimeTooSkewed",
+        "InternalError",
+        "ServiceUnavailable",
+    ]
+
+    # Presets of boto3's `TransferConfig` arguments for the common transfer workloads:
+    # * "default" - boto3's defaults (8MB parts, multipart from 8MB and 10 threads per object).
+    # * "small_files" - Many small files: the files are transferred in a single request on the worker's own thread, the
+    #   concurrency comes from transferring many files at once (`max_workers`).
+    # * "large_files" - Few huge files (multi-GB datasets and checkpoints): big parts transferred by many threads per
+    #   object to saturate the network.
+    TRANSFER_PROFILES = {
+        "default": {},
+        "small_files": {
+            "multipart_threshold": 64 * 1024 * 1024,
+            "multipart_chunksize": 64 * 1024 * 1024,
+            "use_threads": False,
+        },
+        "large_files": {
+            "multipart_threshold": 64 * 1024 * 1024,
+            "multipart_chunksize": 64 * 1024 * 1024,
+            "max_concurrency": 32,
+            "max_io_queue": 1000,
+        },
+    }
+
     def __init__(
         self,
         aws_access_key_id: str = None,
         aws_secret_access_key: str = None,
+        max_workers: int = 10,
+        transfer_profile: str = "default",
+        multipart_threshold: int = None,
+        multipart_chunksize: int = None,
+        max_concurrency: int = None,
+        max_bandwidth: int = None,
+        endpoint_url: str = None,
+        max_pool_connections: int = None,
+        cache: S3DownloadCache = None,
+        max_attempts: int = 5,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 30.0,
     ):
         """
-        Initialize a S3 client object (not opening a session yet) with the given credentials.
+        Initialize a S3 client object (not opening a session yet) with the given credentials. The boto3 client is
+        created once, on the first use, and reused by all the following calls.
 
         :param aws_access_key_id:     The AWS access key id.
         :param aws_secret_access_key: The AWS secret access key.
+        :param max_workers:           The maximum amount of files to transfer concurrently when uploading, downloading
+                                      or deleting a directory. Default: 10.
+        :param transfer_profile:      The transfer settings preset to use, one of `S3Client.TRANSFER_PROFILES`:
+                                      "default", "small_files" or "large_files". The following parameters override the
+                                      profile's settings. Default: "default".
+        :param multipart_threshold:   The file size in bytes from which files are transferred in multiple parts.
+        :param multipart_chunksize:   The size in bytes of each part in a multipart transfer.
+        :param max_concurrency:       The maximum amount of threads transferring the parts of a single file.
+        :param max_bandwidth:         The maximum bandwidth in bytes per second of a single file's transfer.
+        :param endpoint_url:          A custom S3 endpoint to use instead of AWS (for example a MinIO server).
+        :param max_pool_connections:  The maximum amount of connections to keep open in the client's connection pool.
+                                      Default: The amount of threads the transfers may use (`max_workers` times
+                                      `max_concurrency` when files are transferred using threads).
+        :param cache:                 A local download cache to get unchanged files from instead of downloading them
+                                      again. Default: None (no caching).
+        :param max_attempts:          The maximum amount of attempts to transfer a file failing on throttling
+                                      ("SlowDown") or temporary server (5xx) and connection errors. Default: 5.
+        :param retry_base_delay:      The base delay in seconds between attempts. The delay is doubled every attempt
+                                      and a random jitter is applied (a random delay between 0 and the doubled delay).
+                                      Default: 0.5.
+        :param retry_max_delay:       The maximum delay in seconds between attempts. Default: 30.
+
+        :raise ValueError: If the given transfer profile is not one of the available profiles.
         """
         self._aws_access_key_id = aws_access_key_id
         self._aws_secret_access_key = aws_secret_access_key
+        self._max_workers = max_workers
+        self._transfer_config = self._init_transfer_config(
+            transfer_profile=transfer_profile,
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            max_bandwidth=max_bandwidth,
+        )
+        self._endpoint_url = endpoint_url
+        self._max_pool_connections = max_pool_connections
+        self._cache = cache
+        self._retry_config = {
+            "max_attempts": max_attempts,
+            "base_delay": retry_base_delay,
+            "max_delay": retry_max_delay,
+        }
+
+        # The boto3 client is initialized lazily on first use (see `_get_client`):
+        self._client = None
+        self._client_lock = threading.Lock()
 
     def upload(
         self,
@@ -49,19 +184,24 @@ class S3Client:
         s3_path: str,
         replace: bool = True,
         verbose: bool = True,
+        journal_path: str = None,
     ):
         """
         Upload a given file or directory to S3.
 
         Please notice to not put a '/' prefix in the `s3_path` as S3 will interpreate the '/' as a directory named '/'.
 
-        :param bucket:     The bucket to upload to.
-        :param local_path: The path to the local file or directory to upload.
-        :param s3_path:    The path to upload to in the S3 bucket.
-        :param replace:    Whether to replace the files when uploading or skip if they already exist. Default: True.
-        :param verbose:    Whether to log uploading information. Default: True.
+        :param bucket:       The bucket to upload to.
+        :param local_path:   The path to the local file or directory to upload.
+        :param s3_path:      The path to upload to in the S3 bucket.
+        :param replace:      Whether to replace the files when uploading or skip if they already exist. Default: True.
+        :param verbose:      Whether to log uploading information. Default: True.
+        :param journal_path: A path to a local journal file to record the completed files and multipart upload parts
+                             in. Rerunning a stopped upload with the same journal skips the completed files and
+                             continues the unfinished multipart uploads. Default: None (not resumable).
 
-        :raise ValueError: If the given local path do not exist, or it is a path of an empty directory.
+        :raise ValueError:      If the given local path do not exist, or it is a path of an empty directory.
+        :raise S3TransferError: If some of the files of the directory failed to upload.
 
         Example:
             >>> s3_client = S3Client()
@@ -72,8 +212,8 @@ class S3Client:
             ...     replace=False,
             ... )
         """
-        # Initialize a S3 client:
-        s3 = self._init_client()
+        # Get the S3 client (initialized on first use):
+        s3 = self._get_client()
 
         # Check if the given S3 path is starting with a '/':
         if s3_path[0] == "/":
@@ -88,24 +228,38 @@ class S3Client:
             raise ValueError(f"The given local path '{local_path}' do not exist")
 
         # Check if it's a single file or directory:
-        if os.path.isfile(local_path):
-            self._upload_file(
-                s3_client=s3,
-                local_path=local_path,
-                s3_path=s3_path,
-                bucket=bucket,
-                replace=replace,
-                verbose=verbose,
-            )
-        else:
-            self._upload_directory(
-                s3_client=s3,
-                local_path=local_path,
-                s3_path=s3_path,
-                bucket=bucket,
-                replace=replace,
-                verbose=verbose,
-            )
+        journal = S3TransferJournal(path=journal_path) if journal_path else None
+        try:
+            if os.path.isfile(local_path):
+                self._call_with_retries(
+                    function=lambda: self._upload_file(
+                        s3_client=s3,
+                        local_path=local_path,
+                        s3_path=s3_path,
+                        bucket=bucket,
+                        replace=replace,
+                        verbose=verbose,
+                        transfer_config=self._transfer_config,
+                        journal=journal,
+                    ),
+                    retry_config=self._retry_config,
+                )
+            else:
+                self._upload_directory(
+                    s3_client=s3,
+                    local_path=local_path,
+                    s3_path=s3_path,
+                    bucket=bucket,
+                    replace=replace,
+                    verbose=verbose,
+                    max_workers=self._max_workers,
+                    transfer_config=self._transfer_config,
+                    retry_config=self._retry_config,
+                    journal=journal,
+                )
+        finally:
+            if journal is not None:
+                journal.close()
         if verbose:
             print("Done!")
 
@@ -116,17 +270,22 @@ class S3Client:
         s3_path: str,
         replace: bool = True,
         verbose: bool = True,
+        journal_path: str = None,
     ):
         """
         Download a given file or directory from S3.
 
-        :param bucket:     The bucket to download from.
-        :param local_path: The path to the local file or directory to download to.
-        :param s3_path:    The path to the file or directory to download in the S3 bucket.
-        :param replace:    Whether to replace the files when downloading or skip if they already exist. Default: True.
-        :param verbose:    Whether to log downloading information. Default: True.
+        :param bucket:       The bucket to download from.
+        :param local_path:   The path to the local file or directory to download to.
+        :param s3_path:      The path to the file or directory to download in the S3 bucket.
+        :param replace:      Whether to replace the files when downloading or skip if they already exist. Default: True.
+        :param verbose:      Whether to log downloading information. Default: True.
+        :param journal_path: A path to a local journal file to record the completed files and the downloaded bytes of
+                             large files in. Rerunning a stopped download with the same journal skips the completed
+                             files and continues the unfinished large files. Default: None (not resumable).
 
         :raise FileNotFoundError: If the given S3 path do not exist.
+        :raise S3TransferError:   If some of the files of the directory failed to download.
 
         Example:
             >>> s3_client = S3Client()
@@ -137,42 +296,65 @@ class S3Client:
             ...     replace=False,
             ... )
         """
-        # Initialize a S3 client:
-        s3 = self._init_client()
+        # Get the S3 client (initialized on first use):
+        s3 = self._get_client()
 
-        # Look for all files beginning with the given key (`s3_path`):
-        files = self._get_files(s3_client=s3, s3_path=s3_path, bucket=bucket)
+        # Look for all files beginning with the given key (`s3_path`), the files are listed lazily page by page so the
+        # work can start on the first page while the rest are still listed:
+        files = (
+            file["Key"]
+            for file in self._iter_files(s3_client=s3, s3_path=s3_path, bucket=bucket)
+        )
 
-        # If the list is empty, there is no such file:
-        if len(files) == 0:
+        # Peek the first two files, if there are none, there is no such file:
+        first_files = list(islice(files, 2))
+        if len(first_files) == 0:
             raise FileNotFoundError(
                 f"There is no file at the bucket '{bucket}' named '{s3_path}'."
             )
 
         # Check if it's a single file or directory:
-        if len(files) == 1:
-            self._download_file(
-                s3_client=s3,
-                local_path=local_path,
-                s3_path=s3_path,
-                bucket=bucket,
-                replace=replace,
-                verbose=verbose,
-            )
-        else:
-            self._download_directory(
-                s3_client=s3,
-                local_path=local_path,
-                s3_directory_path=s3_path,
-                s3_files_paths=files,
-                bucket=bucket,
-                replace=replace,
-                verbose=verbose,
-            )
+        journal = S3TransferJournal(path=journal_path) if journal_path else None
+        try:
+            if len(first_files) == 1:
+                self._call_with_retries(
+                    function=lambda: self._download_file(
+                        s3_client=s3,
+                        local_path=local_path,
+                        s3_path=s3_path,
+                        bucket=bucket,
+                        replace=replace,
+                        verbose=verbose,
+                        transfer_config=self._transfer_config,
+                        cache=self._cache,
+                        journal=journal,
+                    ),
+                    retry_config=self._retry_config,
+                )
+            else:
+                self._download_directory(
+                    s3_client=s3,
+                    local_path=local_path,
+                    s3_directory_path=s3_path,
+                    s3_files_paths=chain(first_files, files),
+                    bucket=bucket,
+                    replace=replace,
+                    verbose=verbose,
+                    max_workers=self._max_workers,
+                    transfer_config=self._transfer_config,
+                    cache=self._cache,
+                    retry_config=self._retry_config,
+                    journal=journal,
+                )
+        finally:
+            if journal is not None:
+                journal.close()
         if verbose:
             print("Done!")
 
-    def delete(self, bucket: str, s3_path: str, verbose: bool = True):
+    def delete(
+        self, bucket: str, s3_path: str, verbose: bool = True, bulk: bool = True
+    ):
         """
         Delete a given file or directory from S3.
 
@@ -182,8 +364,12 @@ class S3Client:
         :param bucket:  The bucket to delete from.
         :param s3_path: The path to the file or directory to delete in the S3 bucket.
         :param verbose: Whether to log deletion information. Default: True.
+        :param bulk:    Whether to delete a directory in batches of up to 1000 keys per request (`DeleteObjects`)
+                        instead of a request per file. The batches are deleted concurrently by the client's workers.
+                        Default: True.
 
         :raise FileNotFoundError: If the given S3 path do not exist.
+        :raise S3TransferError:   If some of the files of the directory failed to be deleted.
 
         Example:
             >>> s3_client = S3Client()
@@ -192,51 +378,485 @@ class S3Client:
             ...     s3_path="path/to/a/s3/directory",
             ... )
         """
-        # Initialize a S3 client:
-        s3 = self._init_client()
+        # Get the S3 client (initialized on first use):
+        s3 = self._get_client()
 
-        # Look for all files beginning with the given key (`s3_path`):
-        files = self._get_files(s3_client=s3, s3_path=s3_path, bucket=bucket)
+        # Look for all files beginning with the given key (`s3_path`), the files are listed lazily page by page so the
+        # work can start on the first page while the rest are still listed:
+        files = (
+            file["Key"]
+            for file in self._iter_files(s3_client=s3, s3_path=s3_path, bucket=bucket)
+        )
 
-        # If the list is empty, there is no such file:
-        if len(files) == 0:
+        # Peek the first two files, if there are none, there is no such file:
+        first_files = list(islice(files, 2))
+        if len(first_files) == 0:
             raise FileNotFoundError(
                 f"There is no file at the bucket '{bucket}' named '{s3_path}'."
             )
 
         # Check if it's a single file or directory:
-        if len(files) == 1:
-            self._delete_file(
+        if len(first_files) == 1:
+            self._call_with_retries(
+                function=lambda: self._delete_file(
+                    s3_client=s3,
+                    s3_path=s3_path,
+                    bucket=bucket,
+                    verbose=verbose,
+                ),
+                retry_config=self._retry_config,
+            )
+        else:
+            self._delete_directory(
                 s3_client=s3,
-                s3_path=s3_path,
+                s3_files_paths=chain(first_files, files),
                 bucket=bucket,
                 verbose=verbose,
+                max_workers=self._max_workers,
+                bulk=bulk,
+                retry_config=self._retry_config,
+            )
+        if verbose:
+            print("Done!")
+
+    def open(
+        self,
+        bucket: str,
+        s3_path: str,
+        mode: str = "rb",
+        buffer_size: int = 8 * 1024 * 1024,
+        encoding: str = None,
+    ) -> Union[io.BufferedReader, S3ObjectWriter, io.TextIOWrapper]:
+        """
+        Open a S3 file for streaming read or write without a local temporary file.
+
+        Reading is done by ranged requests of at least `buffer_size` bytes each (the read-ahead) and reading the whole
+        file is a single request. The file is seekable so formats like Parquet can read only the parts they need.
+        Writing is done with a multipart upload of parts of the client's `multipart_chunksize`, keeping at most a single
+        part in memory. The file is created only when it is closed, or when its context manager block exits cleanly -
+        if the block raises or the file is garbage collected without being closed, the upload is aborted.
+
+        :param bucket:      The bucket of the file.
+        :param s3_path:     The path to the file in the S3 bucket.
+        :param mode:        The opening mode, one of "rb", "wb", "r" and "w". Default: "rb".
+        :param buffer_size: The minimum amount of bytes to get in each read request. Default: 8MB.
+        :param encoding:    The text encoding to use in text modes ("r" and "w").
+
+        :returns: A file-like object of the S3 file.
+
+        :raise ValueError: If the mode is not supported.
+
+        Example:
+            >>> s3_client = S3Client()
+            >>> with s3_client.open(bucket="my_bucket", s3_path="path/to/a/dataset.csv") as file:
+            ...     df = pd.read_csv(file)
+            >>> with s3_client.open(bucket="my_bucket", s3_path="path/to/a/dataset.parquet", mode="wb") as file:
+            ...     df.to_parquet(file)
+        """
+        if mode not in ["rb", "wb", "r", "w"]:
+            raise ValueError(
+                f"Unsupported mode '{mode}', "
+                "the supported modes are: 'rb', 'wb', 'r' and 'w'"
+            )
+
+        # Get the S3 client (initialized on first use):
+        s3 = self._get_client()
+
+        # Open the file:
+        if mode.startswith("r"):
+            file = io.BufferedReader(
+                S3ObjectReader(
+                    s3_client=s3, bucket=bucket, key=s3_path, buffer_size=buffer_size
+                )
+            )
+        else:
+            file = S3ObjectWriter(
+                s3_client=s3,
+                bucket=bucket,
+                key=s3_path,
+                part_size=self._transfer_config.multipart_chunksize,
+            )
+        if "b" not in mode:
+            if mode == "w":
+                return S3TextWriter(file, encoding=encoding)
+            return io.TextIOWrapper(file, encoding=encoding)
+        return file
+
+    def sync(
+        self,
+        bucket: str,
+        local_path: str,
+        s3_path: str,
+        direction: str = "upload",
+        delete: bool = False,
+        checksum: bool = False,
+        verbose: bool = True,
+    ) -> Dict[str, List[str]]:
+        """
+        Synchronize a local directory and a S3 directory, transferring only the files that changed (like `rsync`).
+
+        The S3 directory is listed once and compared to a scan of the local directory. A file is transferred if it is
+        missing in the destination, if its size is different or if the source is newer than the destination. If
+        `checksum` is set, the modification time is not used and instead the local file's MD5 (or multipart ETag) is
+        calculated and compared to the S3 ETag. Multipart ETags can only match if the S3 file was uploaded with the
+        same part size as this client's `multipart_chunksize`.
+
+        :param bucket:     The bucket to synchronize with.
+        :param local_path: The path to the local directory.
+        :param s3_path:    The path to the directory in the S3 bucket.
+        :param direction:  "upload" to synchronize the S3 directory to the local one or "download" for the other way
+                           around. Default: "upload".
+        :param delete:     Whether to delete files in the destination that do not exist in the source. Default: False.
+        :param checksum:   Whether to compare the files by their content's checksum instead of their modification
+                           time. Default: False.
+        :param verbose:    Whether to log synchronizing information. Default: True.
+
+        :returns: A dictionary with the "transferred", "deleted" and "skipped" lists of relative files paths.
+
+        :raise ValueError:      If the direction is not "upload" or "download", or if uploading a local path that is not
+                                a directory.
+        :raise S3TransferError: If some of the files failed to transfer or to be deleted.
+
+        Example:
+            >>> s3_client = S3Client()
+            >>> s3_client.sync(
+            ...     bucket="my_bucket",
+            ...     local_path="/path/to/a/local/directory",
+            ...     s3_path="path/to/a/s3/directory",
+            ...     delete=True,
+            ... )
+        """
+        # Validate the direction:
+        if direction not in ["upload", "download"]:
+            raise ValueError(
+                f"The direction must be 'upload' or 'download', given: '{direction}'"
+            )
+        if direction == "upload" and not os.path.isdir(local_path):
+            raise ValueError(
+                f"The given local path '{local_path}' is not an existing directory"
+            )
+
+        # Get the S3 client (initialized on first use):
+        s3 = self._get_client()
+
+        # List the S3 directory once and scan the local one:
+        s3_directory_path = os.path.join(s3_path, "")
+        s3_files = {
+            os.path.relpath(file["Key"], s3_directory_path): file
+            for file in self._iter_files(
+                s3_client=s3, s3_path=s3_directory_path, bucket=bucket
+            )
+        }
+        local_files = {
+            os.path.relpath(path, local_path): os.stat(path)
+            for path in glob.iglob(os.path.join(local_path, "**"), recursive=True)
+            if os.path.isfile(path)
+        }
+
+        # Compare the source files to the destination ones:
+        source, destination = (
+            (local_files, s3_files)
+            if direction == "upload"
+            else (s3_files, local_files)
+        )
+        changed = []
+        skipped = []
+        for file in source:
+            local_stat = local_files.get(file)
+            s3_file = s3_files.get(file)
+            if local_stat is None or s3_file is None:
+                changed.append(file)
+            elif local_stat.st_size != s3_file["Size"]:
+                changed.append(file)
+            elif checksum:
+                etag = self._calculate_etag(
+                    path=os.path.join(local_path, file),
+                    s3_etag=s3_file["ETag"],
+                    chunk_size=self._transfer_config.multipart_chunksize,
+                )
+                (changed if etag != s3_file["ETag"] else skipped).append(file)
+            else:
+                # S3 modification times are in a seconds resolution, so the local one is truncated to seconds as well:
+                local_time = datetime.fromtimestamp(
+                    int(local_stat.st_mtime), tz=timezone.utc
+                )
+                source_is_newer = (
+                    local_time > s3_file["LastModified"]
+                    if direction == "upload"
+                    else s3_file["LastModified"] > local_time
+                )
+                (changed if source_is_newer else skipped).append(file)
+        orphans = [file for file in destination if file not in source] if delete else []
+
+        # Transfer the changed files:
+        if direction == "upload":
+            transfer = lambda file: self._upload_file(
+                s3_client=s3,
+                local_path=os.path.join(local_path, file),
+                s3_path=os.path.join(s3_directory_path, file),
+                bucket=bucket,
+                replace=True,
+                verbose=SHELL is not None and verbose,
+                transfer_config=self._transfer_config,
             )
         else:
+            transfer = lambda file: self._download_file(
+                s3_client=s3,
+                local_path=os.path.join(local_path, file),
+                s3_path=os.path.join(s3_directory_path, file),
+                bucket=bucket,
+                replace=True,
+                verbose=SHELL is not None and verbose,
+                transfer_config=self._transfer_config,
+                cache=self._cache,
+            )
+        if changed:
+            self._run_concurrently(
+                task=transfer,
+                files=changed,
+                max_workers=self._max_workers,
+                description="Uploading" if direction == "upload" else "Downloading",
+                verbose=verbose,
+                retry_config=self._retry_config,
+            )
+
+        # Delete the orphan files:
+        if orphans and direction == "upload":
             self._delete_directory(
                 s3_client=s3,
-                s3_files_paths=files,
+                s3_files_paths=[
+                    os.path.join(s3_directory_path, file) for file in orphans
+                ],
                 bucket=bucket,
                 verbose=verbose,
+                max_workers=self._max_workers,
+                bulk=True,
+                retry_config=self._retry_config,
             )
+        elif orphans:
+            for file in orphans:
+                if verbose and SHELL is not None:
+                    print(f"Deleting '{os.path.join(local_path, file)}'")
+                os.remove(os.path.join(local_path, file))
+
         if verbose:
-            print("Done!")
+            print(
+                f"Done! Transferred {len(changed)} file(s), "
+                f"skipped {len(skipped)} unchanged file(s) "
+                f"and deleted {len(orphans)} file(s)."
+            )
+        return {"transferred": changed, "deleted": orphans, "skipped": skipped}
+
+    def _get_client(self):
+        # Initialize the client only once, credentials, endpoint metadata and open connections are then reused by all
+        # the calls:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._init_client()
+        return self._client
 
     def _init_client(self):
+        # boto3 clients are thread-safe, so a single client is shared by all the transfer workers. By default, its
+        # connection pool is sized to the workers amount (times the threads each of them uses per file) so the workers
+        # will not wait on each other for a connection:
+        max_pool_connections = self._max_pool_connections
+        if max_pool_connections is None:
+            threads_per_file = (
+                self._transfer_config.max_request_concurrency
+                if self._transfer_config.use_threads
+                else 1
+            )
+            max_pool_connections = max(self._max_workers * threads_per_file, 10)
         return boto3.client(
             service_name="s3",
             aws_access_key_id=self._aws_access_key_id,
             aws_secret_access_key=self._aws_secret_access_key,
+            endpoint_url=self._endpoint_url,
+            config=Config(max_pool_connections=max_pool_connections),
         )
 
     @staticmethod
-    def _get_files(s3_client, s3_path: str, bucket: str) -> List[str]:
-        return [
-            file["Key"]
-            for file in s3_client.list_objects(Bucket=bucket, Prefix=s3_path).get(
-                "Contents", []
+    def _init_transfer_config(
+        transfer_profile: str, **overrides: Union[int, None]
+    ) -> TransferConfig:
+        if transfer_profile not in S3Client.TRANSFER_PROFILES:
+            raise ValueError(
+                f"Unknown transfer profile '{transfer_profile}', "
+                "the available profiles are: "
+                f"{', '.join(S3Client.TRANSFER_PROFILES)}"
             )
-        ]
+        transfer_config_kwargs: Dict[str, Any] = {
+            **S3Client.TRANSFER_PROFILES[transfer_profile],
+            **{key: value for key, value in overrides.items() if value is not None},
+        }
+        return TransferConfig(**transfer_config_kwargs)
+
+    @staticmethod
+    def _run_concurrently(
+        task: Callable[[Union[str, List[str]]], Union[Dict[str, Exception], None]],
+        files: Iterable[Union[str, List[str]]],
+        max_workers: int,
+        description: str,
+        verbose: bool,
+        total: int = None,
+        retry_config: Dict[str, Union[int, float]] = None,
+    ):
+        """
+        Run the given task on each of the files using a bounded pool of worker threads. A failure of a file is collected
+        and the rest of the files are still processed. Once all the files were processed, the collected failures are
+        raised together.
+
+        An item of `files` may also be a batch (list) of files. A task running on a batch may return a dictionary of
+        the files in the batch that failed to their errors, and if the task raises, all the batch's files are failed.
+
+        :param task:         The task to run on each file.
+        :param files:        The files to run the task on. Can be a lazy iterable, it is consumed only as workers free
+                             up.
+        :param max_workers:  The maximum amount of tasks to run concurrently.
+        :param description:  The progress bar description.
+        :param verbose:      Whether to show a progress bar.
+        :param total:        The total amount of files for the progress bar. Default: The length of `files` if known.
+        :param retry_config: The retry settings to retry each file's task with (see `_call_with_retries`).
+                             Default: None (no retries).
+
+        :raise S3TransferError: If the task failed for some of the files.
+        """
+        if total is None and hasattr(files, "__len__"):
+            total = len(files)
+        progress_bar = tqdm(total=total, desc=description) if verbose else None
+        errors = {}
+
+        def collect(done_futures):
+            for future in done_futures:
+                item = futures.pop(future)
+                batch = item if isinstance(item, list) else [item]
+                try:
+                    errors.update(future.result() or {})
+                except Exception as error:
+                    errors.update({file: error for file in batch})
+                if progress_bar is not None:
+                    progress_bar.update(len(batch))
+                    progress_bar.set_postfix({"file": batch[-1], "errors": len(errors)})
+
+        # Keep a bounded amount of submitted tasks so a huge files iterable will not be materialized all at once:
+        futures = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for item in files:
+                if len(futures) >= 2 * max_workers:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    collect(done_futures=done)
+                futures[
+                    executor.submit(
+                        S3Client._call_with_retries,
+                        function=functools.partial(task, item),
+                        retry_config=retry_config,
+                    )
+                ] = item
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                collect(done_futures=done)
+        if progress_bar is not None:
+            progress_bar.close()
+
+        # Raise all the collected errors:
+        if errors:
+            raise S3TransferError(operation=description, errors=errors)
+
+    @staticmethod
+    def _call_with_retries(
+        function: Callable[[], Any],
+        retry_config: Dict[str, Union[int, float]] = None,
+    ) -> Any:
+        """
+        Call the given function, retrying it with exponential backoff and full jitter (a random delay between 0 and the
+        exponential delay) if it fails on a retryable error (see `_is_retryable`).
+
+        :param function:     The function to call.
+        :param retry_config: A dictionary with the "max_attempts", "base_delay" and "max_delay" of the retries.
+                             Default: None (a single attempt).
+
+        :returns: The function's returned value.
+        """
+        max_attempts = retry_config["max_attempts"] if retry_config else 1
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return function()
+            except Exception as error:
+                if attempt == max_attempts or not S3Client._is_retryable(error=error):
+                    raise
+                time.sleep(
+                    random.uniform(
+                        0,
+                        S3Client._get_retry_delay(
+                            retry_config=retry_config, attempt=attempt
+                        ),
+                    )
+                )
+
+    @staticmethod
+    def _get_retry_delay(
+        retry_config: Dict[str, Union[int, float]], attempt: int
+    ) -> float:
+        # The exponential delay after the given attempt, the jitter is applied by the caller:
+        return min(
+            retry_config["max_delay"],
+            retry_config["base_delay"] * 2 ** (attempt - 1),
+        )
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        # Connection errors and timeouts:
+        if isinstance(
+            error,
+            (
+                EndpointConnectionError,
+                ConnectionClosedError,
+                ReadTimeoutError,
+                ConnectionError,
+                TimeoutError,
+            ),
+        ):
+            return True
+
+        # Throttling and server errors (the error may be wrapped by s3transfer, so look for its cause as well):
+        while error is not None:
+            if isinstance(error, ClientError):
+                code = error.response.get("Error", {}).get("Code")
+                status = error.response.get("ResponseMetadata", {}).get(
+                    "HTTPStatusCode", 0
+                )
+                return code in S3Client.RETRYABLE_ERROR_CODES or status >= 500
+            if isinstance(error, RetriesExceededError):
+                return True
+            error = error.__cause__
+        return False
+
+    @staticmethod
+    def _iter_files(
+        s3_client, s3_path: str, bucket: str, page_size: int = None
+    ) -> Iterator[Dict[str, Union[str, int, datetime]]]:
+        """
+        List all the files beginning with the given key, yielding them as each page of the listing arrives. Each file
+        is a dictionary with its "Key", "Size", "ETag" and "LastModified".
+
+        :param s3_client: The boto3 S3 client to use.
+        :param s3_path:   The key prefix to list.
+        :param bucket:    The bucket to list.
+        :param page_size: The maximum amount of files to get in each listing request. Default: S3's maximum (1000).
+        """
+        paginator = s3_client.get_paginator("list_objects_v2")
+        pagination_config = {"PageSize": page_size} if page_size else {}
+        for page in paginator.paginate(
+            Bucket=bucket, Prefix=s3_path, PaginationConfig=pagination_config
+        ):
+            for file in page.get("Contents", []):
+                yield {
+                    "Key": file["Key"],
+                    "Size": file["Size"],
+                    "ETag": file["ETag"],
+                    "LastModified": file["LastModified"],
+                }
 
     @staticmethod
     def _upload_file(
@@ -246,16 +866,36 @@ class S3Client:
         bucket: str,
         replace: bool,
         verbose: bool,
+        transfer_config: TransferConfig = None,
+        callback: Callable[[int], None] = None,
+        journal: S3TransferJournal = None,
     ):
+        # Check if the file was already uploaded by a previous run of the journal:
+        if journal is not None:
+            local_stat = os.stat(local_path)
+            version = f"{local_stat.st_size}:{local_stat.st_mtime_ns}"
+            if journal.is_completed(
+                operation="upload",
+                source=local_path,
+                destination=s3_path,
+                version=version,
+            ):
+                if verbose:
+                    print(
+                        f"Skipping '{local_path}' "
+                        f"as it was already uploaded to {s3_path}"
+                    )
+                return
+
         # Check if needed to upload:
         if replace:
             upload = True  # `replace` is set to True:
         else:
-            # Look for the file to know if its already exist:
-            files = S3Client._get_files(
-                s3_client=s3_client, s3_path=s3_path, bucket=bucket
+            # Look for the file to know if its already exist (listing only the first key is enough):
+            files = S3Client._iter_files(
+                s3_client=s3_client, s3_path=s3_path, bucket=bucket, page_size=1
             )
-            if files:
+            if next(files, None) is not None:
                 upload = False  # `replace` is set to False as the file was found.
             else:
                 upload = True  # The file was not found.
@@ -264,10 +904,142 @@ class S3Client:
         if upload:
             if verbose:
                 print(f"Uploading '{local_path}' to {s3_path}")
-            s3_client.upload_file(Filename=local_path, Bucket=bucket, Key=s3_path)
+            transfer_config = transfer_config or TransferConfig()
+            if (
+                journal is not None
+                and local_stat.st_size >= transfer_config.multipart_threshold
+            ):
+                S3Client._upload_file_resumable(
+                    s3_client=s3_client,
+                    local_path=local_path,
+                    s3_path=s3_path,
+                    bucket=bucket,
+                    transfer_config=transfer_config,
+                    journal=journal,
+                    version=version,
+                    callback=callback,
+                )
+            else:
+                s3_client.upload_file(
+                    Filename=local_path,
+                    Bucket=bucket,
+                    Key=s3_path,
+                    Config=transfer_config,
+                    Callback=callback,
+                )
+            if journal is not None:
+                journal.record_completed(
+                    operation="upload",
+                    source=local_path,
+                    destination=s3_path,
+                    version=version,
+                )
         elif verbose:
             print(f"Skipping '{local_path}' as {s3_path} already exist")
 
+    @staticmethod
+    def _upload_file_resumable(
+        s3_client,
+        local_path: str,
+        s3_path: str,
+        bucket: str,
+        transfer_config: TransferConfig,
+        journal: S3TransferJournal,
+        version: str,
+        callback: Callable[[int], None] = None,
+    ):
+        part_size = max(
+            transfer_config.multipart_chunksize, S3ObjectWriter.MIN_PART_SIZE
+        )
+
+        # Look for an unfinished upload of a previous run, keeping only its parts S3 still has (the upload may have been
+        # aborted or expired meanwhile):
+        upload_id = None
+        parts = {}
+        multipart_upload = journal.get_multipart_upload(
+            local_path=local_path, s3_path=s3_path, version=version, part_size=part_size
+        )
+        if multipart_upload is not None:
+            upload_id, parts = multipart_upload
+            try:
+                uploaded_parts = {
+                    part["PartNumber"]: part["ETag"]
+                    for page in s3_client.get_paginator("list_parts").paginate(
+                        Bucket=bucket, Key=s3_path, UploadId=upload_id
+                    )
+                    for part in page.get("Parts", [])
+                }
+                parts = {
+                    part_number: etag
+                    for part_number, etag in parts.items()
+                    if uploaded_parts.get(part_number) == etag
+                }
+            except ClientError as error:
+                if error.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                    raise
+                upload_id = None
+                parts = {}
+
+        # Start a new upload if there is no unfinished one:
+        if upload_id is None:
+            upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=s3_path)[
+                "UploadId"
+            ]
+            journal.record_multipart_upload(
+                local_path=local_path,
+                s3_path=s3_path,
+                version=version,
+                part_size=part_size,
+                upload_id=upload_id,
+            )
+
+        # Upload the missing parts concurrently, recording each part once uploaded:
+        def upload_part(part_number: int) -> str:
+            with open(local_path, "rb") as file:
+                file.seek((part_number - 1) * part_size)
+                data = file.read(part_size)
+            etag = s3_client.upload_part(
+                Bucket=bucket,
+                Key=s3_path,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data,
+            )["ETag"]
+            journal.record_part(upload_id=upload_id, part_number=part_number, etag=etag)
+            if callback is not None:
+                callback(len(data))
+            return etag
+
+        parts_amount = max(-(-os.path.getsize(local_path) // part_size), 1)
+        missing_parts = [
+            part_number
+            for part_number in range(1, parts_amount + 1)
+            if part_number not in parts
+        ]
+        threads = (
+            transfer_config.max_request_concurrency
+            if transfer_config.use_threads
+            else 1
+        )
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for part_number, etag in zip(
+                missing_parts, executor.map(upload_part, missing_parts)
+            ):
+                parts[part_number] = etag
+
+        # Complete the upload:
+        s3_client.complete_multipart_upload(
+            Bucket=bucket,
+            Key=s3_path,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": part_number, "ETag": parts[part_number]}
+                    for part_number in sorted(parts)
+                ]
+            },
+        )
+
     @staticmethod
     def _upload_directory(
         s3_client,
@@ -276,6 +1048,10 @@ class S3Client:
         bucket: str,
         replace: bool,
         verbose: bool,
+        max_workers: int = 1,
+        transfer_config: TransferConfig = None,
+        retry_config: Dict[str, Union[int, float]] = None,
+        journal: S3TransferJournal = None,
     ):
         # List all files in directory:
         files = [
@@ -289,18 +1065,23 @@ class S3Client:
             )
 
         # Upload the files:
-        files_iterator = tqdm(files, desc="Uploading") if verbose else files
-        for file in files_iterator:
-            if verbose:
-                files_iterator.set_postfix({"file": file})
-            S3Client._upload_file(
+        S3Client._run_concurrently(
+            task=lambda file: S3Client._upload_file(
                 s3_client=s3_client,
                 local_path=file,
                 s3_path=os.path.join(s3_path, os.path.relpath(file, local_path)),
                 bucket=bucket,
                 replace=replace,
                 verbose=SHELL is not None and verbose,
-            )
+                transfer_config=transfer_config,
+                journal=journal,
+            ),
+            files=files,
+            max_workers=max_workers,
+            description="Uploading",
+            verbose=verbose,
+            retry_config=retry_config,
+        )
 
     @staticmethod
     def _download_file(
@@ -310,6 +1091,10 @@ class S3Client:
         bucket: str,
         replace: bool,
         verbose: bool,
+        transfer_config: TransferConfig = None,
+        callback: Callable[[int], None] = None,
+        cache: S3DownloadCache = None,
+        journal: S3TransferJournal = None,
     ):
         # Check if needed to download:
         if replace:
@@ -318,33 +1103,141 @@ class S3Client:
             # Look for the file to know if its already exist:
             download = not os.path.exists(local_path)
 
+        # Check if the file was already downloaded by a previous run of the journal:
+        if download and journal is not None:
+            head = s3_client.head_object(Bucket=bucket, Key=s3_path)
+            if os.path.exists(local_path) and journal.is_completed(
+                operation="download",
+                source=s3_path,
+                destination=local_path,
+                version=head["ETag"],
+            ):
+                if verbose:
+                    print(
+                        f"Skipping '{s3_path}' "
+                        f"as it was already downloaded to {local_path}"
+                    )
+                return
+
         # Download only if needed:
         if download:
             if verbose:
                 print(f"Downloading '{s3_path}' to {local_path}")
             os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            s3_client.download_file(Filename=local_path, Bucket=bucket, Key=s3_path)
+            transfer_config = transfer_config or TransferConfig()
+            download_function = lambda: s3_client.download_file(
+                Filename=local_path,
+                Bucket=bucket,
+                Key=s3_path,
+                Config=transfer_config,
+                Callback=callback,
+            )
+            if (
+                journal is not None
+                and head["ContentLength"] >= transfer_config.multipart_threshold
+            ):
+                S3Client._download_file_resumable(
+                    s3_client=s3_client,
+                    local_path=local_path,
+                    s3_path=s3_path,
+                    bucket=bucket,
+                    transfer_config=transfer_config,
+                    journal=journal,
+                    head=head,
+                    callback=callback,
+                )
+            elif cache is None:
+                download_function()
+            elif cache.download(
+                s3_client=s3_client,
+                bucket=bucket,
+                key=s3_path,
+                local_path=local_path,
+                download_function=download_function,
+            ):
+                if verbose:
+                    print(f"Took '{s3_path}' from the cache")
+            if journal is not None:
+                journal.record_completed(
+                    operation="download",
+                    source=s3_path,
+                    destination=local_path,
+                    version=head["ETag"],
+                )
         elif verbose:
             print(f"Skipping '{s3_path}' as {local_path} already exist")
 
+    @staticmethod
+    def _download_file_resumable(
+        s3_client,
+        local_path: str,
+        s3_path: str,
+        bucket: str,
+        transfer_config: TransferConfig,
+        journal: S3TransferJournal,
+        head: Dict[str, Any],
+        callback: Callable[[int], None] = None,
+    ):
+        # Continue from the bytes downloaded by a previous run into the partial file (if it's of the same S3 version):
+        partial_path = f"{local_path}.part"
+        etag = head["ETag"]
+        downloaded_bytes = (
+            journal.get_downloaded_bytes(
+                s3_path=s3_path, local_path=local_path, etag=etag
+            )
+            if os.path.exists(partial_path)
+            else 0
+        )
+
+        # Download the rest in ranged requests of a part size each, recording the progress after each part:
+        with open(partial_path, "r+b" if downloaded_bytes else "wb") as partial_file:
+            partial_file.truncate(downloaded_bytes)
+            partial_file.seek(downloaded_bytes)
+            while downloaded_bytes < head["ContentLength"]:
+                end = (
+                    min(
+                        downloaded_bytes + transfer_config.multipart_chunksize,
+                        head["ContentLength"],
+                    )
+                    - 1
+                )
+                data = s3_client.get_object(
+                    Bucket=bucket,
+                    Key=s3_path,
+                    Range=f"bytes={downloaded_bytes}-{end}",
+                    IfMatch=etag,
+                )["Body"].read()
+                partial_file.write(data)
+                partial_file.flush()
+                downloaded_bytes += len(data)
+                journal.record_downloaded_bytes(
+                    s3_path=s3_path,
+                    local_path=local_path,
+                    etag=etag,
+                    downloaded_bytes=downloaded_bytes,
+                )
+                if callback is not None:
+                    callback(len(data))
+        os.replace(partial_path, local_path)
+
     @staticmethod
     def _download_directory(
         s3_client,
         local_path: str,
         s3_directory_path: str,
         bucket: str,
-        s3_files_paths: List[str],
+        s3_files_paths: Iterable[str],
         replace: bool,
         verbose: bool,
+        max_workers: int = 1,
+        transfer_config: TransferConfig = None,
+        cache: S3DownloadCache = None,
+        retry_config: Dict[str, Union[int, float]] = None,
+        journal: S3TransferJournal = None,
     ):
         # Download the files:
-        files_iterator = (
-            tqdm(s3_files_paths, desc="Downloading") if verbose else s3_files_paths
-        )
-        for file in files_iterator:
-            if verbose:
-                files_iterator.set_postfix({"file": file})
-            S3Client._download_file(
+        S3Client._run_concurrently(
+            task=lambda file: S3Client._download_file(
                 s3_client=s3_client,
                 local_path=os.path.join(
                     local_path, os.path.relpath(file, s3_directory_path)
@@ -353,7 +1246,16 @@ class S3Client:
                 bucket=bucket,
                 replace=replace,
                 verbose=SHELL is not None and verbose,
-            )
+                transfer_config=transfer_config,
+                cache=cache,
+                journal=journal,
+            ),
+            files=s3_files_paths,
+            max_workers=max_workers,
+            description="Downloading",
+            verbose=verbose,
+            retry_config=retry_config,
+        )
 
     @staticmethod
     def _delete_file(
@@ -370,20 +1272,135 @@ class S3Client:
     @staticmethod
     def _delete_directory(
         s3_client,
-        s3_files_paths: List[str],
+        s3_files_paths: Iterable[str],
         bucket: str,
         verbose: bool,
+        max_workers: int = 1,
+        bulk: bool = False,
+        retry_config: Dict[str, Union[int, float]] = None,
     ):
-        # Delete the files:
-        files_iterator = (
-            tqdm(s3_files_paths, desc="Deleting") if verbose else s3_files_paths
-        )
-        for file in files_iterator:
-            if verbose:
-                files_iterator.set_postfix({"file": file})
-            S3Client._delete_file(
+        # Delete the files in batches of `DeleteObjects` requests:
+        if bulk:
+            S3Client._run_concurrently(
+                task=lambda batch: S3Client._delete_files_batch(
+                    s3_client=s3_client,
+                    s3_files_paths=batch,
+                    bucket=bucket,
+                    retry_config=retry_config,
+                ),
+                files=S3Client._split_to_batches(
+                    items=s3_files_paths, batch_size=S3Client.DELETE_BATCH_SIZE
+                ),
+                max_workers=max_workers,
+                description="Deleting",
+                verbose=verbose,
+                retry_config=retry_config,
+            )
+            return
+
+        # Delete the files one by one:
+        S3Client._run_concurrently(
+            task=lambda file: S3Client._delete_file(
                 s3_client=s3_client,
                 s3_path=file,
                 bucket=bucket,
                 verbose=SHELL is not None and verbose,
+            ),
+            files=s3_files_paths,
+            max_workers=max_workers,
+            description="Deleting",
+            verbose=verbose,
+            retry_config=retry_config,
+        )
+
+    @staticmethod
+    def _delete_files_batch(
+        s3_client,
+        s3_files_paths: List[str],
+        bucket: str,
+        retry_config: Dict[str, Union[int, float]] = None,
+    ) -> Dict[str, Exception]:
+        max_attempts = retry_config["max_attempts"] if retry_config else 1
+        errors = {}
+        for attempt in range(1, max_attempts + 1):
+            # Delete the batch in a single request, in quiet mode S3 responds only with the keys it failed to delete:
+            response = s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    "Objects": [{"Key": file} for file in s3_files_paths],
+                    "Quiet": True,
+                },
             )
+
+            # Collect the failed keys as the same error a single `DeleteObject` request would have raised:
+            errors.update(
+                {
+                    error["Key"]: ClientError(
+                        error_response={
+                            "Error": {
+                                "Code": error.get("Code"),
+                                "Message": error.get("Message"),
+                            }
+                        },
+                        operation_name="DeleteObjects",
+                    )
+                    for error in response.get("Errors", [])
+                }
+            )
+
+            # Resubmit the keys that failed on throttling or a temporary server error after a backoff delay:
+            s3_files_paths = [
+                file
+                for file, error in errors.items()
+                if S3Client._is_retryable(error=error)
+            ]
+            if not s3_files_paths or attempt == max_attempts:
+                break
+            for file in s3_files_paths:
+                del errors[file]
+            time.sleep(
+                random.uniform(
+                    0,
+                    S3Client._get_retry_delay(
+                        retry_config=retry_config, attempt=attempt
+                    ),
+                )
+            )
+        return errors
+
+    @staticmethod
+    def _split_to_batches(items: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+        iterator = iter(items)
+        batch = list(islice(iterator, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(iterator, batch_size))
+
+    @staticmethod
+    def _calculate_etag(path: str, s3_etag: str, chunk_size: int) -> str:
+        """
+        Calculate the ETag S3 would give the local file. A file uploaded in a single request has its MD5 as ETag, and a
+        file uploaded in multiple parts has the MD5 of its parts' MD5s followed by the amount of parts. The S3 ETag is
+        used to know which of the two to calculate.
+
+        :param path:       The local file path.
+        :param s3_etag:    The ETag of the S3 file to compare to.
+        :param chunk_size: The multipart part size the S3 file was uploaded with.
+
+        :returns: The calculated ETag, quoted like the ETags S3 returns.
+        """
+        # Calculate both the whole file's MD5 and the MD5 of each part in a single read:
+        file_md5 = hashlib.md5()
+        parts_md5s = []
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                file_md5.update(chunk)
+                parts_md5s.append(hashlib.md5(chunk).digest())
+
+        # A single part upload:
+        if "-" not in s3_etag:
+            return f'"{file_md5.hexdigest()}"'
+
+        # A multipart upload:
+        multipart_md5 = hashlib.md5(b"".join(parts_md5s))
+        return f'"{multipart_md5.hexdigest()}-{len(parts_md5s)}"'
@@ -0,0 +1,179 @@
+from typing import Dict, Tuple, Union
+import json
+import os
+import threading
+
+
+class S3TransferJournal:
+    """
+    A local append-only journal of the progress of S3 transfers, so a transfer that stopped in the middle (a crash, a
+    killed job or too many failures) can be rerun with the same journal and continue where it stopped.
+
+    The journal records:
+
+    * Completed files - a rerun skips them, as long as the source was not changed since (the source's version is its
+      size and modification time for uploads and its ETag for downloads).
+    * Multipart uploads and their completed parts - a rerun continues the upload, uploading only the missing parts.
+    * The amount of downloaded bytes of large files - a rerun continues downloading from that offset.
+
+    Each record is a JSON line appended and flushed as soon as it happens, so a crash loses at most the record being
+    written (which is then ignored when loading).
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the journal, loading the records of a previous run if the journal file exist.
+
+        :param path: The path to the journal file.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+        # The journal's state:
+        self._completed: Dict[Tuple[str, str, str], str] = {}
+        self._multipart_uploads: Dict[Tuple[str, str, str, int], str] = {}
+        self._parts: Dict[str, Dict[int, str]] = {}
+        self._downloads: Dict[Tuple[str, str, str], int] = {}
+
+        # Load the previous run's records:
+        if os.path.exists(self._path):
+            with open(self._path, "r") as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A partially written line of a crashed run.
+                    self._apply(record=record)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._file = open(self._path, "a")
+
+    def is_completed(
+        self, operation: str, source: str, destination: str, version: str
+    ) -> bool:
+        """
+        Check whether the given file transfer was completed.
+
+        :param operation:   The transfer operation - "upload" or "download".
+        :param source:      The source file (local path or S3 key).
+        :param destination: The destination file (S3 key or local path).
+        :param version:     The version of the source file the transfer should be of.
+
+        :returns: True if the transfer of this source version was completed.
+        """
+        return self._completed.get((operation, source, destination)) == version
+
+    def record_completed(
+        self, operation: str, source: str, destination: str, version: str
+    ):
+        self._record(
+            type="completed",
+            operation=operation,
+            source=source,
+            destination=destination,
+            version=version,
+        )
+
+    def get_multipart_upload(
+        self, local_path: str, s3_path: str, version: str, part_size: int
+    ) -> Union[Tuple[str, Dict[int, str]], None]:
+        """
+        Get the unfinished multipart upload of the given file.
+
+        :param local_path: The uploaded local file.
+        :param s3_path:    The key the file is uploaded to.
+        :param version:    The version of the local file.
+        :param part_size:  The upload's part size.
+
+        :returns: The upload id and a dictionary of the completed parts numbers to their ETags, or None if there is no
+                  such upload.
+        """
+        upload_id = self._multipart_uploads.get(
+            (local_path, s3_path, version, part_size)
+        )
+        if upload_id is None:
+            return None
+        return upload_id, dict(self._parts.get(upload_id, {}))
+
+    def record_multipart_upload(
+        self,
+        local_path: str,
+        s3_path: str,
+        version: str,
+        part_size: int,
+        upload_id: str,
+    ):
+        self._record(
+            type="multipart_upload",
+            local_path=local_path,
+            s3_path=s3_path,
+            version=version,
+            part_size=part_size,
+            upload_id=upload_id,
+        )
+
+    def record_part(self, upload_id: str, part_number: int, etag: str):
+        self._record(
+            type="part", upload_id=upload_id, part_number=part_number, etag=etag
+        )
+
+    def get_downloaded_bytes(self, s3_path: str, local_path: str, etag: str) -> int:
+        """
+        Get the amount of bytes already downloaded of the given S3 file version.
+
+        :param s3_path:    The downloaded key.
+        :param local_path: The local path the file is downloaded to.
+        :param etag:       The ETag of the downloaded file.
+
+        :returns: The amount of downloaded bytes (0 if the download did not start).
+        """
+        return self._downloads.get((s3_path, local_path, etag), 0)
+
+    def record_downloaded_bytes(
+        self, s3_path: str, local_path: str, etag: str, downloaded_bytes: int
+    ):
+        self._record(
+            type="download",
+            s3_path=s3_path,
+            local_path=local_path,
+            etag=etag,
+            downloaded_bytes=downloaded_bytes,
+        )
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _record(self, **record: Union[str, int]):
+        with self._lock:
+            self._apply(record=record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def _apply(self, record: Dict[str, Union[str, int]]):
+        if record["type"] == "completed":
+            self._completed[
+                (record["operation"], record["source"], record["destination"])
+            ] = record["version"]
+        elif record["type"] == "multipart_upload":
+            self._multipart_uploads[
+                (
+                    record["local_path"],
+                    record["s3_path"],
+                    record["version"],
+                    record["part_size"],
+                )
+            ] = record["upload_id"]
+        elif record["type"] == "part":
+            self._parts.setdefault(record["upload_id"], {})[record["part_number"]] = (
+                record["etag"]
+            )
+        elif record["type"] == "download":
+            self._downloads[
+                (record["s3_path"], record["local_path"], record["etag"])
+            ] = record["downloaded_bytes"]
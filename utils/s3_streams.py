@@ -0,0 +1,261 @@
+import io
+
+
+class S3ObjectReader(io.RawIOBase):
+    """
+    A seekable file-like reader of a S3 object. Reads are served from an internal buffer filled by ranged GETs of at
+    least `buffer_size` bytes (the read-ahead), so small reads don't cost a request each, and reading the rest of the
+    object (`read()`) is a single GET. All the reads are pinned to the object's ETag at open time, so an object
+    replaced while reading fails the read instead of mixing two versions.
+    """
+
+    def __init__(
+        self, s3_client, bucket: str, key: str, buffer_size: int = 8 * 1024 * 1024
+    ):
+        """
+        Initialize the reader, getting the object's size and ETag.
+
+        :param s3_client:   The boto3 S3 client to use.
+        :param bucket:      The bucket of the object.
+        :param key:         The key of the object to read.
+        :param buffer_size: The minimum amount of bytes to get in each read request. Default: 8MB.
+        """
+        super().__init__()
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._buffer_size = buffer_size
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+        self._size = head["ContentLength"]
+        self._etag = head["ETag"]
+        self._position = 0
+
+        # The read-ahead bytes and the object's offset they start at:
+        self._buffer = b""
+        self._buffer_start = 0
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        # Check if reached the end of the object:
+        if self._position >= self._size or len(buffer) == 0:
+            return 0
+
+        # Fill the internal buffer if the position is not in it, getting at least the read-ahead size:
+        buffer = memoryview(buffer).cast("B")
+        offset = self._position - self._buffer_start
+        if not 0 <= offset < len(self._buffer):
+            self._buffer = self._get_range(
+                start=self._position, length=max(len(buffer), self._buffer_size)
+            )
+            self._buffer_start = self._position
+            offset = 0
+
+        # Serve the read from the internal buffer:
+        data = memoryview(self._buffer)[offset : offset + len(buffer)]
+        buffer[: len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def readall(self) -> bytes:
+        # Check if reached the end of the object:
+        if self._position >= self._size:
+            return b""
+
+        # Take what is already buffered and get all the rest with a single request:
+        offset = self._position - self._buffer_start
+        buffered = self._buffer[offset:] if 0 <= offset < len(self._buffer) else b""
+        start = self._position + len(buffered)
+        rest = self._get_range(start=start, length=self._size - start)
+        self._position = self._size
+        return buffered + rest
+
+    def _get_range(self, start: int, length: int) -> bytes:
+        # Nothing to get past the end of the object:
+        end = min(start + length, self._size)
+        if start >= end:
+            return b""
+
+        # Get the range (S3 ranges are inclusive):
+        response = self._s3_client.get_object(
+            Bucket=self._bucket,
+            Key=self._key,
+            Range=f"bytes={start}-{end - 1}",
+            IfMatch=self._etag,
+        )
+        return response["Body"].read()
+
+
+class S3ObjectWriter(io.RawIOBase):
+    """
+    A file-like writer of a S3 object. The written bytes are buffered in memory and uploaded as a multipart upload part
+    each time a part is filled, so the memory used is bounded by the part size regardless of the object's size. An
+    object smaller than a single part is uploaded with a single request on close.
+
+    The object is created only by an explicit `close` or a context manager block exiting cleanly. If the block raises,
+    a part fails to upload, or the writer is garbage collected without being closed, the multipart upload is aborted
+    and no object is created.
+    """
+
+    # The minimum part size S3 accepts for all the parts but the last one:
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, s3_client, bucket: str, key: str, part_size: int):
+        """
+        Initialize the writer (the multipart upload is created only once the first part is filled).
+
+        :param s3_client: The boto3 S3 client to use.
+        :param bucket:    The bucket to write to.
+        :param key:       The key of the object to write.
+        :param part_size: The size in bytes of each uploaded part. Raised to S3's minimum of 5MB if smaller.
+        """
+        super().__init__()
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, self.MIN_PART_SIZE)
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        self._buffer += data
+        try:
+            while len(self._buffer) >= self._part_size:
+                self._upload_part(data=bytes(self._buffer[: self._part_size]))
+                del self._buffer[: self._part_size]
+        except Exception:
+            # The object can't be completed without the part, so a later close must not commit it:
+            self.abort()
+            raise
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                # The object is smaller than a single part, upload it at once:
+                self._s3_client.put_object(
+                    Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer)
+                )
+            else:
+                # Upload the last part and complete the multipart upload:
+                if self._buffer:
+                    self._upload_part(data=bytes(self._buffer))
+                self._s3_client.complete_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def abort(self):
+        """
+        Abort the upload, dropping the written data without creating the object.
+        """
+        try:
+            if self._upload_id is not None:
+                upload_id, self._upload_id = self._upload_id, None
+                self._s3_client.abort_multipart_upload(
+                    Bucket=self._bucket, Key=self._key, UploadId=upload_id
+                )
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        # `io.IOBase` closes a dropped file, which would complete the upload of whatever was written so far, so a writer
+        # dropped without being closed is aborted instead:
+        if not self.closed:
+            try:
+                self.abort()
+            except Exception:
+                pass
+
+    def _upload_part(self, data: bytes):
+        # Start the multipart upload on the first part:
+        if self._upload_id is None:
+            self._upload_id = self._s3_client.create_multipart_upload(
+                Bucket=self._bucket, Key=self._key
+            )["UploadId"]
+
+        # Upload the part:
+        part_number = len(self._parts) + 1
+        response = self._s3_client.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+
+class S3TextWriter(io.TextIOWrapper):
+    """
+    A text writer of a S3 object over a `S3ObjectWriter`, aborting the upload like it does when the context manager
+    block raises or the writer is garbage collected without being closed (`io.TextIOWrapper` would close the object
+    writer, completing the upload).
+    """
+
+    def abort(self):
+        """
+        Abort the upload, dropping the written text without creating the object.
+        """
+        self.buffer.abort()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        if not self.closed:
+            try:
+                self.abort()
+            except Exception:
+                pass
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import AsyncS3Client, S3Client
+
+
+def slow_down(operation_name: str) -> ClientError:
+    return ClientError(
+        error_response={"Error": {"Code": "SlowDown", "Message": "Slow Down"}},
+        operation_name=operation_name,
+    )
+
+
+@pytest.fixture
+def s3_directory(s3_bucket):
+    s3_client = S3Client(retry_base_delay=0)
+    s3 = s3_client._get_client()
+    files = {f"directory/file_{i}": os.urandom(100) for i in range(25)}
+    for key, data in files.items():
+        s3.put_object(Bucket=s3_bucket, Key=key, Body=data)
+    return s3_client, files
+
+
+def test_download_directory(s3_directory, tmp_path):
+    s3_client, files = s3_directory
+    asyncio.run(
+        AsyncS3Client(s3_client=s3_client, max_concurrency=4).download(
+            bucket="bucket", local_path=str(tmp_path), s3_path="directory"
+        )
+    )
+    for key, data in files.items():
+        with open(tmp_path / os.path.relpath(key, "directory"), "rb") as f:
+            assert f.read() == data
+
+
+def test_download_retries(s3_directory, tmp_path, monkeypatch):
+    s3_client, files = s3_directory
+
+    # Throttle the first attempt of every file:
+    attempted = set()
+    download_file = S3Client._download_file
+
+    def throttled_download_file(s3_path, **kwargs):
+        if s3_path not in attempted:
+            attempted.add(s3_path)
+            raise slow_down(operation_name="GetObject")
+        return download_file(s3_path=s3_path, **kwargs)
+
+    monkeypatch.setattr(S3Client, "_download_file", throttled_download_file)
+    asyncio.run(
+        AsyncS3Client(s3_client=s3_client).download(
+            bucket="bucket", local_path=str(tmp_path), s3_path="directory"
+        )
+    )
+    assert attempted == set(files)
+    assert len(os.listdir(tmp_path)) == len(files)
+
+
+def test_delete_directory(s3_directory, monkeypatch):
+    s3_client, files = s3_directory
+    s3 = s3_client._get_client()
+
+    # Throttle the first batch request:
+    delete_objects = s3.delete_objects
+    calls = []
+
+    def throttled_delete_objects(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise slow_down(operation_name="DeleteObjects")
+        return delete_objects(**kwargs)
+
+    monkeypatch.setattr(s3, "delete_objects", throttled_delete_objects)
+    asyncio.run(
+        AsyncS3Client(s3_client=s3_client).delete(bucket="bucket", s3_path="directory")
+    )
+    assert len(calls) == 2
+    assert s3.list_objects_v2(Bucket="bucket").get("KeyCount") == 0
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(
+            AsyncS3Client(s3_client=s3_client).delete(
+                bucket="bucket", s3_path="directory"
+            )
+        )
+
+
+def test_download_starts_while_listing(monkeypatch, tmp_path):
+    # Two pages of files, the downloads of the first page should start before the listing ends:
+    events = []
+
+    def iter_files(**kwargs):
+        for i in range(1500):
+            yield {"Key": f"directory/file_{i}"}
+        events.append("listed all")
+
+    def download_file(s3_path, **kwargs):
+        events.append("downloading")
+
+    monkeypatch.setattr(S3Client, "_iter_files", staticmethod(iter_files))
+    monkeypatch.setattr(S3Client, "_download_file", staticmethod(download_file))
+    monkeypatch.setattr(S3Client, "_get_client", lambda self: None)
+    asyncio.run(
+        AsyncS3Client(max_concurrency=4).download(
+            bucket="bucket", local_path=str(tmp_path), s3_path="directory"
+        )
+    )
+    assert events.count("downloading") == 1500
+    assert events.index("downloading") < events.index("listed all")
@@ -0,0 +1,72 @@
+import pytest
+
+from utils import S3Client, S3TransferError
+
+
+@pytest.fixture
+def s3_client(s3_bucket):
+    s3_client = S3Client(max_attempts=3, retry_base_delay=0)
+    for i in range(10):
+        s3_client._get_client().put_object(
+            Bucket=s3_bucket, Key=f"directory/file_{i}", Body=b"data"
+        )
+    return s3_client
+
+
+def fail_keys(s3_client, monkeypatch, codes: dict, times: int):
+    # Make the `DeleteObjects` requests fail the given keys with the given error codes in their first responses:
+    s3 = s3_client._get_client()
+    delete_objects = s3.delete_objects
+    requests = []
+
+    def failing_delete_objects(Bucket, Delete):
+        requests.append([file["Key"] for file in Delete["Objects"]])
+        if len(requests) > times:
+            return delete_objects(Bucket=Bucket, Delete=Delete)
+        failed = [file for file in Delete["Objects"] if file["Key"] in codes]
+        deleted = [file for file in Delete["Objects"] if file not in failed]
+        if deleted:
+            delete_objects(Bucket=Bucket, Delete={"Objects": deleted})
+        return {
+            "Errors": [
+                {"Key": file["Key"], "Code": codes[file["Key"]], "Message": "Failed"}
+                for file in failed
+            ]
+        }
+
+    monkeypatch.setattr(s3, "delete_objects", failing_delete_objects)
+    return requests
+
+
+def list_keys(s3_client) -> list:
+    response = s3_client._get_client().list_objects_v2(Bucket="bucket")
+    return [file["Key"] for file in response.get("Contents", [])]
+
+
+def test_delete_retries_failed_keys(s3_client, monkeypatch):
+    requests = fail_keys(
+        s3_client,
+        monkeypatch,
+        codes={"directory/file_1": "SlowDown", "directory/file_2": "InternalError"},
+        times=1,
+    )
+    s3_client.delete(bucket="bucket", s3_path="directory", verbose=False)
+
+    # Only the failed keys are resubmitted:
+    assert requests[1] == ["directory/file_1", "directory/file_2"]
+    assert list_keys(s3_client) == []
+
+
+def test_delete_raises_on_failed_keys(s3_client, monkeypatch):
+    # A non retryable error fails the key right away, and a retryable one once the attempts run out:
+    requests = fail_keys(
+        s3_client,
+        monkeypatch,
+        codes={"directory/file_1": "SlowDown", "directory/file_2": "AccessDenied"},
+        times=3,
+    )
+    with pytest.raises(S3TransferError) as error:
+        s3_client.delete(bucket="bucket", s3_path="directory", verbose=False)
+    assert sorted(error.value.errors) == ["directory/file_1", "directory/file_2"]
+    assert requests[1:] == [["directory/file_1"], ["directory/file_1"]]
+    assert list_keys(s3_client) == ["directory/file_1", "directory/file_2"]
@@ -0,0 +1,157 @@
+import gc
+import os
+
+import pytest
+
+from utils import S3Client, S3ObjectWriter
+
+OBJECT_SIZE = 20 * 1024 * 1024
+BUFFER_SIZE = 4 * 1024 * 1024
+
+
+@pytest.fixture
+def s3_object(s3_bucket):
+    data = os.urandom(OBJECT_SIZE)
+    s3_client = S3Client()
+    s3_client._get_client().put_object(Bucket=s3_bucket, Key="object", Body=data)
+
+    # Count the GET requests made by the client:
+    requests = []
+    s3_client._get_client().meta.events.register(
+        "before-call.s3.GetObject",
+        lambda params, **kwargs: requests.append(params["headers"]["Range"]),
+    )
+    return s3_client, data, requests
+
+
+def test_read_all(s3_object):
+    s3_client, data, requests = s3_object
+    with s3_client.open(
+        bucket="bucket", s3_path="object", buffer_size=BUFFER_SIZE
+    ) as f:
+        assert f.read() == data
+    assert len(requests) == 1
+
+
+def test_read_all_after_partial_read(s3_object):
+    s3_client, data, requests = s3_object
+    with s3_client.open(
+        bucket="bucket", s3_path="object", buffer_size=BUFFER_SIZE
+    ) as f:
+        assert f.read(100) == data[:100]
+        assert f.read() == data[100:]
+    # The first read-ahead and a single request for the rest:
+    assert requests == [
+        f"bytes=0-{BUFFER_SIZE - 1}",
+        f"bytes={BUFFER_SIZE}-{OBJECT_SIZE - 1}",
+    ]
+
+
+def test_read_ahead(s3_object):
+    s3_client, data, requests = s3_object
+    with s3_client.open(
+        bucket="bucket", s3_path="object", buffer_size=BUFFER_SIZE
+    ) as f:
+        chunks = iter(lambda: f.read(64 * 1024), b"")
+        assert b"".join(chunks) == data
+    assert len(requests) == OBJECT_SIZE // BUFFER_SIZE
+
+
+def test_seek(s3_object):
+    s3_client, data, requests = s3_object
+    with s3_client.open(
+        bucket="bucket", s3_path="object", buffer_size=BUFFER_SIZE
+    ) as f:
+        f.seek(1000)
+        assert f.read(10) == data[1000:1010]
+        # Seeking inside the read-ahead doesn't get it again:
+        f.seek(BUFFER_SIZE // 2)
+        assert f.read(10) == data[BUFFER_SIZE // 2 : BUFFER_SIZE // 2 + 10]
+        f.seek(-1000, os.SEEK_END)
+        assert f.read(1000) == data[-1000:]
+    assert len(requests) == 2
+
+
+def test_text_mode(s3_bucket):
+    s3_client = S3Client()
+    with s3_client.open(bucket="bucket", s3_path="text", mode="w") as f:
+        f.write("a,b\n1,2\n")
+    with s3_client.open(bucket="bucket", s3_path="text", mode="r") as f:
+        assert f.readlines() == ["a,b\n", "1,2\n"]
+
+
+def get_keys_and_uploads(s3_client):
+    client = s3_client._get_client()
+    keys = [
+        item["Key"]
+        for item in client.list_objects_v2(Bucket="bucket").get("Contents", [])
+    ]
+    uploads = client.list_multipart_uploads(Bucket="bucket").get("Uploads", [])
+    return keys, uploads
+
+
+@pytest.mark.parametrize("size", [100, S3ObjectWriter.MIN_PART_SIZE + 100])
+def test_write_dropped_is_aborted(s3_bucket, size):
+    # A writer garbage collected without being closed doesn't commit what was written so far:
+    s3_client = S3Client()
+    file = s3_client.open(bucket="bucket", s3_path="object", mode="wb")
+    file.write(os.urandom(size))
+    del file
+    gc.collect()
+    assert get_keys_and_uploads(s3_client) == ([], [])
+
+    file = s3_client.open(bucket="bucket", s3_path="text", mode="w")
+    file.write("a" * size)
+    file.flush()
+    del file
+    gc.collect()
+    assert get_keys_and_uploads(s3_client) == ([], [])
+
+
+@pytest.mark.parametrize("mode", ["wb", "w"])
+def test_write_error_is_aborted(s3_bucket, mode):
+    s3_client = S3Client()
+    data = b"a" * (S3ObjectWriter.MIN_PART_SIZE + 100)
+    with pytest.raises(RuntimeError):
+        with s3_client.open(bucket="bucket", s3_path="object", mode=mode) as f:
+            f.write(data if mode == "wb" else data.decode())
+            raise RuntimeError("failed")
+    assert get_keys_and_uploads(s3_client) == ([], [])
+
+
+def test_write_part_error_is_aborted(s3_bucket):
+    # A failed part aborts the upload, so closing the writer afterwards doesn't commit the object:
+    s3_client = S3Client()
+    uploads = []
+
+    def fail_second_part(params, **kwargs):
+        uploads.append(params)
+        if len(uploads) == 2:
+            raise RuntimeError("failed")
+
+    s3_client._get_client().meta.events.register(
+        "before-call.s3.UploadPart", fail_second_part
+    )
+    file = S3ObjectWriter(
+        s3_client=s3_client._get_client(),
+        bucket="bucket",
+        key="object",
+        part_size=S3ObjectWriter.MIN_PART_SIZE,
+    )
+    file.write(b"a" * S3ObjectWriter.MIN_PART_SIZE)
+    with pytest.raises(RuntimeError):
+        file.write(b"a" * S3ObjectWriter.MIN_PART_SIZE)
+    assert file.closed
+    file.close()
+    assert get_keys_and_uploads(s3_client) == ([], [])
+
+
+def test_write_close(s3_bucket):
+    s3_client = S3Client()
+    data = os.urandom(S3ObjectWriter.MIN_PART_SIZE + 100)
+    file = s3_client.open(bucket="bucket", s3_path="object", mode="wb")
+    file.write(data)
+    file.close()
+    assert get_keys_and_uploads(s3_client) == (["object"], [])
+    with s3_client.open(bucket="bucket", s3_path="object") as f:
+        assert f.read() == data